@@ -1,12 +1,28 @@
 import sys, os
-from PyQt6.QtWidgets import QApplication
-from controller.main_controller import MainController
-from ui.main_window import MainWindow
 from util.paths import resource_path
 import sys, traceback, os, datetime
+import logging, time
+
+# Diese Befehle laufen ohne GUI (siehe slimstatistik.py) – z. B. aus der EXE per Aufgabenplanung
+CLI_COMMANDS = ("report", "export")
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS:
+        import slimstatistik
+        sys.exit(slimstatistik.main(sys.argv[1:]))
+
+    # Start-Zeitmessung im Debug-Log: SLIMSTATISTIK_DEBUG=1
+    t0 = time.perf_counter()
+    if os.environ.get("SLIMSTATISTIK_DEBUG"):
+        logging.basicConfig(level=logging.DEBUG, format="%(name)s: %(message)s")
+    log = logging.getLogger("slimstatistik.startup")
+
+    # Qt erst hier laden, damit der CLI-Pfad ohne Display/PyQt6 startet
+    from PyQt6.QtWidgets import QApplication
+    from controller.main_controller import MainController
+    from ui.main_window import MainWindow
+
     # Konfig extern neben der EXE anlegen/verwenden
     settings_path = os.path.join(os.getcwd(), "config", "settings.ini")
     os.makedirs(os.path.dirname(settings_path), exist_ok=True)
@@ -14,7 +30,9 @@ def main():
     # mapping.json kommt aus den App-Ressourcen (funktioniert auch in OneFile)
     mapping_path = resource_path("config/mapping.json")
 
+    log.debug("%8.1f ms  Module geladen", (time.perf_counter() - t0) * 1000)
     ctrl = MainController(settings_path, mapping_path)
+    log.debug("%8.1f ms  Controller bereit", (time.perf_counter() - t0) * 1000)
 
     app = QApplication(sys.argv)
     w = MainWindow(ctrl)
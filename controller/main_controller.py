@@ -1,17 +1,43 @@
 import configparser
+import csv
 import datetime as dt
+import heapq
 import os
-from typing import List, Tuple, Dict, Optional
-
-from models.repository import Repository
+import threading
+import time
+from typing import Callable, Iterator, List, Tuple, Dict, Optional
+
+from models.audit import AuditJournal
+from models.catalog import CatalogStore
+from models.repository import EXPORT_COLUMNS, SUSPECTED, Repository, mask_ids
+from models.rollup import RollupStore
+from models.schemas import AnalyteInfo
+from models.snapshot import SnapshotMirror
+from models.sql import load_mapping
+from logic.audit_service import AuditService
+from logic.catalog_service import AnalyteCatalog
+from logic.excel_export import SheetSpec, as_number, write_workbook
+from logic.housekeeping_service import HousekeepingService
+from logic.itemsets import exact_matrices, frequent_itemsets
+from logic.quantiles import sketches_by_key
+from logic.row_export import EXPORT_FORMATS, ExportStats, parquet_available, write_csv, write_parquet
+from logic.rollup_service import RollupService, TAT_SKETCH_K, WEEKDAYS
+from logic.stats_service import weekday_occurrences
+from logic.timeseries import TimeSeriesMatrix, bucket_starts
 
 
 class MainController:
     """
     Application-LOGIC (Use-Cases). Kein UI, kein SQL – nur Domänenlogik.
     """
-    def __init__(self, settings_path: Optional[str] = None, mapping_path: Optional[str] = None):
+    def __init__(self, settings_path: Optional[str] = None, mapping_path: Optional[str] = None,
+                 background: bool = True):
+        """
+        background=False (CLI): Hintergrund-Aktualisierungen (Rollups) laufen synchron mit,
+        weil der Prozess gleich nach der Antwort endet und Daemon-Threads dabei abbrechen.
+        """
         self.settings_path = settings_path or os.path.join("config", "settings.ini")
+        self.background = background
         os.makedirs(os.path.dirname(self.settings_path), exist_ok=True)
 
         cfg = configparser.ConfigParser()
@@ -23,9 +49,17 @@ class MainController:
             "database_path": "",
             "excel_file": os.path.join("export", "DeletedSuspects.xlsx"),
             "export_dir": "export",
+            "analytes_file": os.path.join("config", "analytes.txt"),
+            "catalog_path": os.path.join("cache", "analytes.sqlite"),
+            "audit_journal": os.path.join("export", "deleted_audit.sqlite"),
+            "monthly_file": os.path.join("export", "MonthlyStats.xlsx"),
         }
         if "paths" in cfg:
             self.paths.update(cfg["paths"])
+        # Ältere settings.ini: excel_file zeigte auf die Monatsdatei, die Audit-Datei stand in deleted_log
+        legacy_log = self.paths.pop("deleted_log", "")
+        if legacy_log and self._same_file(self.paths.get("excel_file", ""), self.paths.get("monthly_file", "")):
+            self.paths["excel_file"] = legacy_log
 
         # Analyten-Filter (aus Suche ausschließen)
         self._excluded = set()
@@ -33,25 +67,252 @@ class MainController:
             ex = cfg["filters"].get("exclude_analytes", "")
             self._excluded = set([x.strip() for x in ex.split(";") if x.strip()])
 
+        # Lokale Kopie (Snapshot) der geteilten DB für Lesezugriffe
+        self.mirror_settings: Dict[str, str] = {
+            "enabled": "false",
+            "local_dir": os.path.join("cache", "snapshot"),
+            "min_interval_minutes": "10",
+        }
+        if "mirror" in cfg:
+            self.mirror_settings.update(cfg["mirror"])
+
+        # Tages-Rollups (lokale Sidecar-DB) für die Zählungen
+        self.rollup_settings: Dict[str, str] = {
+            "enabled": "true",
+            "path": os.path.join("cache", "rollup.sqlite"),
+            "recompute_days": "14",
+            "min_interval_seconds": "60",
+        }
+        if "rollup" in cfg:
+            self.rollup_settings.update(cfg["rollup"])
+
+        # „Nicht entnommen?“-Liste: Rückblick-Fenster (Tage, 0 = alles) und Seitengröße
+        self.suspected_settings: Dict[str, str] = {
+            "lookback_days": "90",
+            "page_size": "500",
+        }
+        if "suspected" in cfg:
+            self.suspected_settings.update(cfg["suspected"])
+
         self._mapping_path = mapping_path
-        self.repo = Repository(self.paths.get("database_path", ""))
+        self.repo = Repository(self.paths.get("database_path", ""), mapping=load_mapping(mapping_path))
+        self.mirror: Optional[SnapshotMirror] = None
+        # Seit dem letzten Snapshot gelöschte Proben (bis zum nächsten Snapshot ausblenden)
+        self._deleted_since_snapshot: set = set()
+        self._setup_mirror()
+        self.rollups: Optional[RollupService] = None
+        self._setup_rollups()
+        self.catalog: Optional[AnalyteCatalog] = None
+        self._setup_catalog()
+        self._setup_audit()
+        self._monthly_lock = threading.Lock()
 
     # ---------------------- Settings
+    @staticmethod
+    def _same_file(a: str, b: str) -> bool:
+        return bool(a) and bool(b) and os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
     def save_settings(self):
         cfg = configparser.ConfigParser()
         cfg["paths"] = dict(self.paths)
         cfg["filters"] = {"exclude_analytes": ";".join(sorted(self._excluded))}
+        cfg["mirror"] = dict(self.mirror_settings)
+        cfg["rollup"] = dict(self.rollup_settings)
+        cfg["suspected"] = dict(self.suspected_settings)
         os.makedirs(os.path.dirname(self.settings_path), exist_ok=True)
         with open(self.settings_path, "w", encoding="utf-8") as f:
             cfg.write(f)
 
+    def set_database_path(self, path: str) -> None:
+        """Neuer DB-Pfad: Repository verwirft seine offenen Lese-Verbindungen."""
+        self.paths["database_path"] = path
+        self.repo.set_db_path(path)
+        self._setup_mirror()
+        self._setup_rollups()
+        self._setup_catalog()
+
+    # ---------------------- Tages-Rollups
+    def _setup_rollups(self) -> None:
+        enabled = str(self.rollup_settings.get("enabled", "")).strip().lower() in ("1", "true", "yes", "ja")
+        if not enabled or not self.paths.get("database_path"):
+            self.rollups = None
+            return
+        try:
+            store = RollupStore(self.rollup_settings.get("path") or os.path.join("cache", "rollup.sqlite"))
+            days = int(self.rollup_settings.get("recompute_days") or 14)
+            interval = float(self.rollup_settings.get("min_interval_seconds") or 60)
+        except Exception as ex:
+            print("Rollup store unavailable:", ex)
+            self.rollups = None
+            return
+        self.rollups = RollupService(self.repo, store, recompute_days=days, min_interval=interval)
+
+    def _counts_source(self):
+        """
+        RollupService, sobald die Rollups bereitstehen, sonst None -> direkt aus der DB.
+        Die Aktualisierung läuft gedrosselt im Hintergrund; die Abfrage wartet nie darauf.
+        Ohne Hintergrund (CLI) wird synchron aktualisiert, sonst ginge der Aufbau mit dem
+        Prozessende verloren.
+        """
+        rollups = self.rollups
+        if rollups is None:
+            return None
+        if not self.background:
+            try:
+                rollups.refresh()
+                return rollups if rollups.ready() else None
+            except Exception as ex:
+                print("Rollup refresh failed:", ex)
+                return None
+
+        def done(_recomputed, error):
+            if error is not None:
+                print("Rollup refresh failed:", error)
+
+        try:
+            rollups.refresh_async(done)
+            return rollups if rollups.ready() else None
+        except Exception as ex:
+            print("Rollup store unavailable:", ex)
+            return None
+
+    # ---------------------- Analyten-Katalog (Sidecar)
+    def _setup_catalog(self) -> None:
+        if not self.paths.get("database_path"):
+            self.catalog = None
+            return
+        try:
+            store = CatalogStore(self.paths.get("catalog_path") or os.path.join("cache", "analytes.sqlite"))
+        except Exception as ex:
+            print("Analyte catalog unavailable:", ex)
+            self.catalog = None
+            return
+        self.catalog = AnalyteCatalog(self.repo, store, self.paths.get("analytes_file"))
+
+    # ---------------------- Snapshot (lokale Kopie)
+    def mirror_enabled(self) -> bool:
+        return str(self.mirror_settings.get("enabled", "")).strip().lower() in ("1", "true", "yes", "ja")
+
+    def set_mirror(self, enabled: bool, local_dir: str) -> None:
+        self.mirror_settings["enabled"] = "true" if enabled else "false"
+        self.mirror_settings["local_dir"] = local_dir
+        self._setup_mirror()
+
+    def _setup_mirror(self) -> None:
+        db = self.paths.get("database_path", "")
+        if not self.mirror_enabled() or not db:
+            self.mirror = None
+            self.repo.set_read_path(None)
+            return
+        try:
+            interval = float(self.mirror_settings.get("min_interval_minutes") or 10) * 60
+        except ValueError:
+            interval = 600.0
+        self.mirror = SnapshotMirror(db, self.mirror_settings.get("local_dir") or os.path.join("cache", "snapshot"),
+                                     min_interval=interval)
+        # Vorhandenen Snapshot sofort nutzen; Aktualisierung läuft im Hintergrund
+        self.repo.set_read_path(self.mirror.current_path)
+
+    def refresh_snapshot_async(self, on_done: Optional[Callable[[bool, Optional[Exception]], None]] = None) -> None:
+        """
+        Prüft im Hintergrund die Quelle (mtime/Größe) und erstellt ggf. einen neuen Snapshot –
+        frühestens min_interval_minutes nach dem letzten Versuch.
+        """
+        mirror = self.mirror
+        if mirror is None or mirror.busy or not mirror.due():
+            return
+
+        def done(created: bool, error: Optional[Exception]):
+            if created and mirror is self.mirror:
+                self.repo.set_read_path(mirror.current_path)
+                if self._deleted_since_snapshot and self.catalog is not None:
+                    # Erst der neue Snapshot enthält die Löschungen
+                    self.catalog.request_reconcile()
+                self._deleted_since_snapshot.clear()
+                mirror.cleanup()
+            if on_done is not None:
+                on_done(created, error)
+
+        mirror.refresh_async(done)
+
+    def snapshot_status(self) -> str:
+        mirror = self.mirror
+        if mirror is None:
+            return ""
+        if mirror.busy:
+            return "Snapshot wird aktualisiert …"
+        age = mirror.age_seconds()
+        if mirror.last_error:
+            retry = max(1, int(mirror.seconds_until_due() // 60))
+            prefix = "Kein Snapshot" if age is None else "Snapshot veraltet"
+            return f"{prefix} – {mirror.last_error}; neuer Versuch in {retry} min"
+        if age is None:
+            return "Kein Snapshot – Zugriff direkt auf die Quelle"
+        created = time.strftime("%d.%m. %H:%M", time.localtime(mirror.created_at))
+        if age < 120:
+            return f"Snapshot von {created} (gerade eben)"
+        if age < 2 * 3600:
+            return f"Snapshot von {created} (vor {int(age // 60)} min)"
+        return f"Snapshot von {created} (vor {age / 3600:.1f} h)"
+
+    # ---------------------- Datenbank-Wartung
+    def optimize_database(self) -> Tuple[str, str]:
+        """
+        Opt-in: legt die Indizes für Zeitfilter/BefTag-Joins an.
+        Rückgabe: (Kurzfassung, Bericht mit EXPLAIN QUERY PLAN vorher/nachher).
+        """
+        end = dt.datetime.now()
+        start = end - dt.timedelta(days=365)
+        rep = self.repo.optimize_database(start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S"))
+
+        created = rep.get("created") or []
+        summary = (f"Neu angelegte Indizes: {', '.join(created)}" if created
+                   else "Alle Indizes waren bereits vorhanden (Statistiken aktualisiert).")
+        lines: List[str] = []
+        for name, before in rep.get("before", {}).items():
+            lines.append(f"== {name}")
+            lines += [f"  vorher:  {d}" for d in before]
+            lines += [f"  nachher: {d}" for d in rep.get("after", {}).get(name, [])]
+        return summary, "\n".join(lines)
+
+    # ---------------------- Ergebnis-Cache
+    def cache_stats(self) -> Dict[str, int]:
+        return self.repo.cache.stats()
+
+    def cache_status(self) -> str:
+        st = self.cache_stats()
+        lookups = st["hits"] + st["misses"]
+        rate = (100.0 * st["hits"] / lookups) if lookups else 0.0
+        return (f"Cache: {st['entries']} Einträge, {st['bytes'] / 1024:.0f} KiB von {st['max_bytes'] / 1048576:.0f} MiB – "
+                f"{st['hits']} Treffer / {st['misses']} Fehlgriffe ({rate:.0f} %), {st['evictions']} verdrängt")
+
+    def clear_cache(self) -> None:
+        self.repo.cache.clear()
+
     # ---------------------- Analyten-Listen
     def list_all_analytes(self) -> List[str]:
+        catalog = self.catalog
+        if catalog is not None:
+            try:
+                return catalog.codes()
+            except Exception as ex:
+                print("Analyte catalog failed:", ex)
         try:
             return self.repo.list_all_analytes()
         except Exception:
             return []
 
+    def analyte_catalog(self, force: bool = False) -> List[AnalyteInfo]:
+        """Katalog-Einträge (Code, Anzeigename, erstes/letztes Vorkommen); force = komplett neu einlesen."""
+        catalog = self.catalog
+        if catalog is not None:
+            try:
+                catalog.refresh(force=force)
+                return catalog.entries()
+            except Exception as ex:
+                print("Analyte catalog failed:", ex)
+        return [AnalyteInfo(code, None, None, None) for code in self.list_all_analytes()]
+
     def get_excluded_analytes(self) -> List[str]:
         return sorted(self._excluded)
 
@@ -63,9 +324,30 @@ class MainController:
         all_codes = set(self.list_all_analytes())
         return sorted([a for a in all_codes if a not in self._excluded])
 
-    # ---------------------- Monats-Export (Hook – aktuell als Platzhalter)
-    def monthly_export_if_first(self) -> None:
-        return
+    def analyte_lists(self, force: bool = False) -> Tuple[List[str], List[str], Dict[str, AnalyteInfo]]:
+        """(alle, nicht ausgeschlossene, Katalog je Code) aus einem Katalog-Zugriff – für das Laden im Hintergrund."""
+        entries = self.analyte_catalog(force=force)
+        all_codes = [e.code for e in entries]
+        return all_codes, [a for a in all_codes if a not in self._excluded], {e.code: e for e in entries}
+
+    # ---------------------- Monats-Export
+    def monthly_export_if_first(self, today: Optional[dt.date] = None) -> List[str]:
+        """
+        Monats-Export (GUI-Start im Hintergrund, CLI `export monthly`): am 1. der Vormonat,
+        an anderen Tagen werden verpasste Monate nachgeholt; bereits exportierte Monate
+        bleiben unberührt. Läuft schon ein Export, kehrt der Aufruf sofort zurück.
+        Die Datei wird neu aufgebaut: andere Blätter behalten nur Werte/Formeln, keine
+        Formate, Tabellen oder Spaltenbreiten (siehe write_workbook(keep_existing=True)).
+        Rückgabe: die neu geschriebenen Monate ('YYYY-MM').
+        """
+        path = self.paths.get("monthly_file", "")
+        if not path or not self.paths.get("database_path") or not self._monthly_lock.acquire(blocking=False):
+            return []
+        try:
+            svc = HousekeepingService(self.repo, path)
+            return svc.ensure_monthly_export(today, skip_analytes=self._excluded)
+        finally:
+            self._monthly_lock.release()
 
     # ---------------------- Zählungen
     def build_counts_rows_multi(
@@ -77,162 +359,249 @@ class MainController:
     ) -> List[Tuple[str, str, str, str]]:
         s = start.strftime("%Y-%m-%d %H:%M:%S")
         e = end.strftime("%Y-%m-%d %H:%M:%S")
+        rollups = self._counts_source()
 
         rows: List[Tuple[str, str, str, str]] = []
         if analytes:
-            for code, cnt in self.repo.count_requirements_per_analyte(analytes, s, e):
+            per_analyte = (rollups.count_requirements_per_analyte(analytes, start, end) if rollups
+                           else self.repo.count_requirements_per_analyte(analytes, s, e))
+            for code, cnt in per_analyte:
                 rows.append((f"Anforderungen {code}", str(cnt), "", ""))
 
-        total, open_cnt, done_cnt = self.repo.count_befund_status(s, e)
+        total, open_cnt, done_cnt = (rollups.count_befund_status(start, end) if rollups
+                                     else self.repo.count_befund_status(s, e))
         rows += [
             ("Befunde (offen)",  str(open_cnt), "", ""),
             ("Befunde (fertig)", str(done_cnt), "", ""),
             ("Befunde (alle)",   str(total),    "", ""),
         ]
 
-        wd = self.repo.count_befunde_per_weekday(s, e, only_open=only_open_weekdays, analytes=None)
-        avg = f"{(sum(wd.values())/7.0):.2f}" if wd else "0.00"
-        rows.append((f"Wochentage ({'nur offene' if only_open_weekdays else 'alle'})", "", "Durchschnitt", avg))
-        for day in ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]:
-            rows.append((f"  {day}", str(wd.get(day, 0)), "", ""))
+        wd = (rollups.count_befunde_per_weekday(start, end, only_open=only_open_weekdays) if rollups
+              else self.repo.count_befunde_per_weekday(s, e, only_open=only_open_weekdays, analytes=None))
+        # Durchschnitt je Kalendertag bzw. je Vorkommen des Wochentags im Zeitraum
+        occ = weekday_occurrences(start.date(), end.date())
+        n_days = sum(occ.values())
+        avg = f"{(sum(wd.values()) / n_days):.2f}" if n_days else "0.00"
+        rows.append((f"Wochentage ({'nur offene' if only_open_weekdays else 'alle'})", "", "Ø pro Tag", avg))
+        for i, day in enumerate(WEEKDAYS):
+            n = wd.get(day, 0)
+            rows.append((f"  {day}", str(n), "Ø pro Tag", f"{(n / occ[i]):.2f}" if occ[i] else "0.00"))
 
         return rows
 
+    def weekday_hour_heatmap(self, start: dt.datetime, end: dt.datetime, only_open: bool = False) -> Dict:
+        """
+        Probenaufkommen als 7×24-Matrix (Zeilen Mo–So, Spalten 0–23 Uhr):
+          {"counts": [[int]*24]*7, "avg": [[float]*24]*7, "occurrences": [Mo..So]}
+        avg = Anzahl / Vorkommen des Wochentags im Zeitraum (ganze Tage).
+        """
+        s = start.strftime("%Y-%m-%d %H:%M:%S")
+        e = end.strftime("%Y-%m-%d %H:%M:%S")
+        cells = self.repo.count_befunde_per_weekday_hour(s, e, only_open=only_open)
+        occ = weekday_occurrences(start.date(), end.date())
+        counts = [[cells.get((wd, hh), 0) for hh in range(24)] for wd in range(7)]
+        avg = [[(c / occ[wd]) if occ[wd] else 0.0 for c in counts[wd]] for wd in range(7)]
+        return {"counts": counts, "avg": avg, "occurrences": [occ[wd] for wd in range(7)]}
+
+    # ---------------------- Zeitreihen
+    def analyte_timeseries(self, analytes: List[str], start: dt.datetime, end: dt.datetime,
+                           granularity: str = "month") -> TimeSeriesMatrix:
+        """Dichte Matrix Analyt × Bucket (Tag/ISO-Woche/Monat), lückenlos mit 0 aufgefüllt."""
+        s = start.strftime("%Y-%m-%d %H:%M:%S")
+        e = end.strftime("%Y-%m-%d %H:%M:%S")
+        ts = TimeSeriesMatrix(sorted(analytes), bucket_starts(start.date(), end.date(), granularity), granularity)
+        for bucket, code, n in self.repo.count_requirements_per_bucket(analytes, s, e, granularity):
+            ts.add(code, dt.date.fromisoformat(bucket), n)
+        return ts
+
+    def timeseries_sheet(self, ts: TimeSeriesMatrix) -> SheetSpec:
+        rows = ts.to_rows()
+        return SheetSpec("Trends", rows[0], rows[1:])
+
+    def export_timeseries_csv(self, ts: TimeSeriesMatrix, path: str) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            csv.writer(f, delimiter=";").writerows(ts.to_rows())
+        return path
+
+    # ---------------------- Durchlaufzeiten (TAT)
+    def turnaround_stats(self, start: dt.datetime, end: dt.datetime,
+                         analytes: Optional[List[str]] = None) -> List[Tuple[str, int, float, float, float]]:
+        """
+        TAT Abnahme -> Ergebnis je Analyt: [(Code, Anzahl, Median, P90, P99)] in Stunden.
+        Quantile aus KLL-Sketches (Rollup-Tage gemergt, Rest live); Speicher je Analyt begrenzt.
+        """
+        analytes = analytes or self.list_included_analytes() or None
+        rollups = self._counts_source()
+        if rollups is not None:
+            sketches = rollups.turnaround_sketches(start, end, analytes)
+        else:
+            wanted = set(analytes) if analytes else None
+            rows = self.repo.iter_turnaround_minutes(start.strftime("%Y-%m-%d %H:%M:%S"),
+                                                     end.strftime("%Y-%m-%d %H:%M:%S"))
+            sketches = sketches_by_key(((c, tat) for _, c, tat in rows if wanted is None or c in wanted),
+                                       k=TAT_SKETCH_K)
+        out = []
+        for code in sorted(sketches):
+            sk = sketches[code]
+            med, p90, p99 = (q / 60.0 for q in sk.quantiles((0.5, 0.9, 0.99)))
+            out.append((code, sk.n, med, p90, p99))
+        return out
+
     # ---------------------- Offene Anforderungen
     def build_open_counts_since(self, analytes: List[str], since: dt.datetime) -> List[Tuple[str, int]]:
         s = since.strftime("%Y-%m-%d %H:%M:%S")
         return self.repo.count_open_requirements_per_analyte(analytes, s)
 
     # ---------------------- Nicht entnommen?
-    def suspected_missing_blood_draw(self) -> List[Dict]:
-        return self.repo.list_suspected_missing_draw(older_than_hours=24)
-
-    # === Excel-Audit Helpers ==================================================
-    @staticmethod
-    def _ensure_audit_ws(wb, desired_headers: List[str], sheet_name: str = "Deleted Suspects"):
+    def suspected_missing_page(self, after: Optional[Tuple] = None) -> Tuple[Tuple[List, List, List, List], Optional[Tuple]]:
         """
-        Sorgt dafür, dass es ein Worksheet mit Header **in Zeile 1** gibt
-        (ohne doppelte Header und ohne append() auf „leere Zeile 1“).
+        Eine Seite (Spalten ProbenNr, OrderTime, NumReq, Analytes) + Schlüssel der nächsten Seite.
+        Fenster und Seitengröße aus [suspected] der settings.ini.
         """
-        if sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-        else:
-            ws = wb.active if wb.active else wb.create_sheet(title=sheet_name)
-            ws.title = sheet_name
-
-        # Aktuelle Header aus Zeile 1 lesen
-        current = [c.value for c in ws[1]] if ws.max_row >= 1 else []
-        current = [str(h) for h in current if h is not None and str(h) != ""]
-
-        if not current:
-            # Neue Header EXPLIZIT in Row 1 setzen (kein append!)
-            for idx, name in enumerate(desired_headers, start=1):
-                ws.cell(row=1, column=idx, value=str(name))
-            current = desired_headers[:]
-        else:
-            # Upgrade: fehlende Spalten hinten anhängen (nur Row1 beschreiben)
-            for h in desired_headers:
-                if h not in current:
-                    current.append(h)
-            for idx, name in enumerate(current, start=1):
-                ws.cell(row=1, column=idx, value=str(name))
-
-        return ws, current
-
-    @staticmethod
-    def _ensure_table(ws, headers: List[str], table_name: str = "DeletedSuspectsTable"):
+        # Kopie VOR der Abfrage: wird der Snapshot währenddessen getauscht, bleibt der Filter korrekt
+        deleted = set(self._deleted_since_snapshot)
+        cols, after = self.repo.suspected_missing_draw_page(
+            after,
+            limit=int(self.suspected_settings.get("page_size") or 500),
+            lookback_days=int(self.suspected_settings.get("lookback_days") or 0),
+            older_than_hours=24,
+        )
+        if deleted and any(p in deleted for p in cols[0]):
+            # Snapshot kennt die Löschung noch nicht (Schlüssel bleibt der der ungefilterten Seite)
+            keep = [i for i, p in enumerate(cols[0]) if p not in deleted]
+            cols = tuple([c[i] for i in keep] for c in cols)
+        return cols, after
+
+    # === Zeilen-Export (Befund ⋈ BefTag für andere Werkzeuge) ================
+    def export_rows(self, path: str, start: dt.datetime, end: dt.datetime,
+                    analytes: Optional[List[str]] = None, status: str = "all", fmt: str = "csv",
+                    with_suspected: bool = False, part_rows: int = 0) -> ExportStats:
         """
-        Erstellt/aktualisiert eine Excel-Tabelle über dem Datenbereich.
-        Nur, wenn es mind. 1 Datenzeile gibt (>=2 Zeilen inkl. Header),
-        sonst wird KEINE Tabelle angelegt (vermeidet Excel-Reparatur).
+        Streamt die gefilterte Projektion blockweise in CSV (optional in Teildateien zu
+        part_rows Zeilen) oder Parquet (nur mit pyarrow). Zeitfilter und Exklusion wie bei
+        den Zählungen; with_suspected=True nimmt „Nicht entnommen?“-Proben mit auf.
         """
-        from openpyxl.utils import get_column_letter
-        from openpyxl.worksheet.table import Table, TableStyleInfo
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unbekanntes Format: {fmt}")
+        if fmt == "parquet" and not parquet_available():
+            raise RuntimeError("Parquet-Export benötigt pyarrow (pip install pyarrow).")
+        batches = self.repo.iter_export_batches(
+            start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S"),
+            analytes=analytes, status=status, excluded=None if with_suspected else SUSPECTED,
+        )
+        if fmt == "parquet":
+            return write_parquet(path, EXPORT_COLUMNS, batches)
+        return write_csv(path, EXPORT_COLUMNS, batches, part_rows=part_rows)
+
+    # === Excel-Exporte (write-only, gestreamt) ================================
+    def export_xlsx(self, path: str, sheets: List[SheetSpec]) -> str:
+        write_workbook(path, sheets)
+        return path
 
-        last_row = ws.max_row
-        last_col = len(headers)
-        if last_row < 2:
-            return
+    @staticmethod
+    def counts_sheet(rows: List[Tuple[str, str, str, str]]) -> SheetSpec:
+        return SheetSpec("Zählungen", ["Kategorie", "Wert", "Hinweis", "Details"],
+                         ((label.strip(), as_number(v), hint, as_number(d)) for label, v, hint, d in rows))
 
-        ref = f"A1:{get_column_letter(last_col)}{last_row}"
+    @staticmethod
+    def open_counts_sheet(rows: List[Tuple[str, int]]) -> SheetSpec:
+        return SheetSpec("Offene Anforderungen", ["Analyt", "Offene"], rows)
 
-        if table_name in ws.tables:
-            t = ws.tables[table_name]
-            t.ref = ref
-        else:
-            t = Table(displayName=table_name, ref=ref)
-            style = TableStyleInfo(name="TableStyleMedium2",
-                                   showFirstColumn=False,
-                                   showLastColumn=False,
-                                   showRowStripes=True,
-                                   showColumnStripes=False)
-            t.tableStyleInfo = style
-            ws.add_table(t)
-
-    def _append_audit_rows(self, infos: List[Dict]):
-        """Appendet mehrere Audit-Zeilen in EINEM Excel-Open/Save – ohne doppelte Header."""
+    @staticmethod
+    def combo_sheets(sing, pairs, trips, quads) -> List[SheetSpec]:
+        header = ["Kombination", "Anzahl Proben"]
+        return [SheetSpec(name, header, rows)
+                for name, rows in (("Singlets", sing), ("2er", pairs), ("3er", trips), ("4er", quads))]
+
+    @staticmethod
+    def itemsets_sheet(rows: List[Tuple[str, int, int]]) -> SheetSpec:
+        return SheetSpec("Kombinationen", ["Kombination", "Größe", "Anzahl Proben"], rows)
+
+    def iter_suspected_rows(self) -> Iterator[Tuple]:
+        """Alle „Nicht entnommen?“-Zeilen des Fensters, Seite für Seite (nie die ganze Liste im Speicher)."""
+        after = None
+        while True:
+            cols, after = self.suspected_missing_page(after)
+            yield from zip(*cols)
+            if after is None:
+                return
+
+    def suspected_sheet(self) -> SheetSpec:
+        return SheetSpec("Nicht entnommen", ["ProbenNr", "Order-Zeit", "Anzahl Anforderungen", "Analyte"],
+                         self.iter_suspected_rows())
+
+    # === Audit (Journal + Excel) ============================================
+    def _setup_audit(self) -> None:
+        path = self.paths.get("audit_journal") or os.path.join("export", "deleted_audit.sqlite")
+        self.audit = AuditService(AuditJournal(path))
+        self._resolve_pending_audit()
+
+    def _resolve_pending_audit(self) -> None:
+        """Nach einem Absturz offene Journal-Einträge (pending) anhand der Quell-DB abschließen."""
         try:
-            from openpyxl import Workbook, load_workbook
-        except Exception:
-            return
+            self.audit.resolve_pending(self.repo.existing_proben)
+        except Exception as ex:
+            print("Audit journal: pending entries not resolved:", ex)
 
-        os.makedirs(os.path.dirname(self.paths["excel_file"]), exist_ok=True)
-        desired_headers = [
-            "Zeitpunkt", "ProbenNr", "Name", "VName",
-            "GebDat", "PatID",
-            "Abnahme", "AuftragsNr", "Einsender", "Analyte"
-        ]
+    def refresh_audit_excel_async(self, on_done: Optional[Callable[[bool, Optional[Exception]], None]] = None) -> None:
+        """Excel-Datei aus dem Journal nachziehen, falls veraltet (Hintergrund; gesperrt -> später erneut)."""
+        def done(written: bool, error: Optional[Exception]):
+            if error is not None:
+                print("Excel audit save failed:", error)
+            if on_done is not None:
+                on_done(written, error)
 
-        if os.path.exists(self.paths["excel_file"]):
-            wb = load_workbook(self.paths["excel_file"])
-        else:
-            wb = Workbook()
-
-        ws, headers = self._ensure_audit_ws(wb, desired_headers)
-
-        # Zeilen anhängen – exakt in Header-Reihenfolge
-        now = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        for info in infos:
-            row_map = {
-                "Zeitpunkt": now,
-                "ProbenNr": info.get("ProbenNr", ""),
-                "Name": info.get("Name", ""),
-                "VName": info.get("Vname", ""),
-                "GebDat": info.get("GebDat", ""),
-                "PatID": info.get("PatID", ""),
-                "Abnahme": info.get("Abnahme", ""),
-                "AuftragsNr": info.get("AuftragsNr", ""),
-                "Einsender": info.get("Einsender", ""),
-                "Analyte": info.get("Analyte", ""),
-            }
-            ws.append([row_map.get(h, "") for h in headers])
-
-        # Tabelle nur anlegen/aktualisieren, wenn mindestens eine Datenzeile existiert
-        try:
-            self._ensure_table(ws, headers)
-        except Exception:
-            pass
+        self.audit.materialize_async(self.paths.get("excel_file", ""), done)
 
-        try:
-            wb.save(self.paths["excel_file"])
-        except Exception as ex:
-            print("Excel audit save failed:", ex)
+    def export_audit_excel(self) -> str:
+        """
+        Excel-Datei jetzt (neu) erzeugen; Exceptions (z. B. Datei in Excel geöffnet) an den Aufrufer.
+        Andere Blätter der Datei behalten nur Werte/Formeln (keine Formate, Tabellen, Spaltenbreiten).
+        """
+        path = self.paths.get("excel_file", "")
+        self.audit.materialize(path, force=True)
+        return path
 
     # === Delete-APIs ==========================================================
     def delete_sample_with_audit(self, proben_nr: str) -> int:
         """Einzelner Datensatz (Kompatibilität)."""
         return self.delete_samples_with_audit([proben_nr])
 
-    def delete_samples_with_audit(self, proben_nrs: List[str]) -> int:
-        """Loggt ALLE gegebenen Proben und löscht sie danach."""
-        infos = []
-        for pnr in proben_nrs:
-            info = self.repo.get_sample_audit_info(pnr)
-            if info:
-                infos.append(info)
-        if infos:
-            self._append_audit_rows(infos)
-        return self.repo.delete_samples(proben_nrs)
+    def delete_samples_with_audit(self, proben_nrs: List[str],
+                                  progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        Loggt ALLE gegebenen Proben und löscht sie danach – eine Transaktion in der Quell-DB,
+        Audit-Details aus einem Join, Löschen blockweise; progress(erledigt, gesamt) je Block.
+        Das Journal bekommt die Einträge vorab als 'pending' und erst nach COMMIT als gelöscht.
+        """
+        infos: List[Dict] = []
+        ids = (0, 0)
+
+        def audit(rows: List[Dict]) -> None:
+            # Ins Journal (fsync) VOR dem ersten DELETE; schlägt das fehl, wird nichts gelöscht
+            nonlocal ids
+            infos.extend(rows)
+            ids = self.audit.begin(rows)
+
+        # Löschen immer in der Quell-DB; der Snapshot zieht im Hintergrund nach
+        self._resolve_pending_audit()
+        try:
+            deleted = self.repo.delete_samples(proben_nrs, audit=audit, progress=progress)
+        except BaseException:
+            self.audit.finish(ids, committed=False)
+            raise
+        self.audit.finish(ids, committed=True)
+        if self.rollups is not None:
+            self.rollups.mark_dirty_timestamps(i.get("Abnahme") for i in infos)
+        if self.catalog is not None:
+            # Gelöschte Codes beim nächsten Katalog-Refresh per Zeilenzahl-Abgleich erkennen
+            self.catalog.request_reconcile()
+        if self.mirror is not None:
+            self._deleted_since_snapshot.update(proben_nrs)
+            self.refresh_snapshot_async()
+        self.refresh_audit_excel_async()
+        return deleted
 
     # ---------------------- Singlets / Kombinationen
     def combo_stats_since(self, since: dt.datetime, top: int = 10):
@@ -243,12 +612,37 @@ class MainController:
         """
         s = since.strftime("%Y-%m-%d %H:%M:%S")
         # KEIN excluded hier – wir wollen die echte offene Matrix, nicht gefiltert
-        singles, pairs, trips, quads = self.repo.open_combo_stats(s, excluded=None, max_k=4)
+        codes, counts = self.repo.open_combo_stats(s, max_k=4)
+
+        # Nach Größe gruppieren; sortiert wird auf Id-Tupeln (Ids sind alphabetisch vergeben)
+        by_size: Dict[int, List[Tuple[int, Tuple[int, ...]]]] = {1: [], 2: [], 3: [], 4: []}
+        for mask, n in counts.items():
+            ids = mask_ids(mask)
+            if len(ids) in by_size:
+                by_size[len(ids)].append((n, ids))
+
+        def top_rows(items: List[Tuple[int, Tuple[int, ...]]]) -> List[Tuple[str, int]]:
+            key = lambda x: (-x[0], x[1])
+            best = heapq.nsmallest(top, items, key=key) if top and top > 0 else sorted(items, key=key)
+            # Strings erst hier – nur für die angezeigten Zeilen
+            return [(" + ".join(codes[i] for i in ids), n) for n, ids in best]
+
+        srt1, srt2, srt3, srt4 = (top_rows(by_size[k]) for k in (1, 2, 3, 4))
+        return srt1, srt2, srt3, srt4
 
-        def sort_desc(d: Dict) -> List[Tuple[str, int]]:
-            return sorted(d.items(), key=lambda x: (-x[1], x[0]))
+    COMBO_MODES = {"exact": "Exakte Matrix (alle Größen)", "subset": "Enthält Teilmenge (häufige Itemsets)"}
 
-        srt1, srt2, srt3, srt4 = map(sort_desc, (singles, pairs, trips, quads))
-        if top and top > 0:
-            srt1, srt2, srt3, srt4 = srt1[:top], srt2[:top], srt3[:top], srt4[:top]
-        return srt1, srt2, srt3, srt4
+    def combo_itemsets_since(self, since: dt.datetime, mode: str = "subset", top: int = 50,
+                             min_support: int = 2, max_len: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """
+        Häufige offene Kombinationen beliebiger Größe: [(Kombination, Größe, Anzahl Proben)].
+          - exact:  Proben mit genau dieser offenen Matrix
+          - subset: Proben, deren offene Matrix die Kombination enthält (FP-growth, Top-N)
+        """
+        s = since.strftime("%Y-%m-%d %H:%M:%S")
+        codes, masks = self.repo.open_combo_stats(s, max_k=None)
+        if mode == "exact":
+            rows = exact_matrices(masks, min_support=min_support, limit=top)
+        else:
+            rows = frequent_itemsets(masks, min_support=min_support, limit=top, max_len=max_len or None)
+        return [(" + ".join(codes[i] for i in ids), len(ids), n) for ids, n in rows]
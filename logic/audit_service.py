@@ -1,40 +1,179 @@
-from pathlib import Path
-from typing import Dict
-from openpyxl import Workbook, load_workbook
-from datetime import datetime
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from models.audit import AUDIT_FIELDS, AuditJournal
+from logic.excel_export import SheetSpec, write_workbook
+
+AUDIT_SHEET = "Deleted Suspects"
+AUDIT_TABLE = "DeletedSuspectsTable"
+# Blattname der früher direkt fortgeschriebenen Audit-Dateien (nur für den Import)
+LEGACY_SHEET = "DeletedSamples"
+
+# Nach einem fehlgeschlagenen Schreiben (Datei in Excel geöffnet): Wartezeit bis zum
+# nächsten Hintergrund-Versuch in s, verdoppelt sich bis RETRY_MAX
+RETRY_MIN = 30
+RETRY_MAX = 600
+
 
 class AuditService:
     """
-    Hängt gelöschte „Nicht entnommen?“-Proben an eine Excel-Datei an.
+    Audit gelöschter „Nicht entnommen?“-Proben: record() schreibt nur ins Journal
+    (AuditJournal), die Excel-Datei erzeugt materialize() daraus – im Hintergrund, bei
+    Bedarf oder zeitgesteuert. Ist die Datei in Excel geöffnet (gesperrt), bleibt sie
+    einfach veraltet; das Journal geht nie verloren und ein späterer Lauf holt nach
+    (zeitgesteuert erst nach RETRY_MIN, bei weiteren Fehlschlägen seltener).
+    Das Blatt AUDIT_SHEET wird ersetzt, andere Blätter der Datei bleiben erhalten.
     """
-    def __init__(self, excel_path: str):
-        self.excel_path = Path(excel_path)
-
-    def _ensure_wb(self):
-        if self.excel_path.exists():
-            return load_workbook(self.excel_path)
-        self.excel_path.parent.mkdir(parents=True, exist_ok=True)
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "DeletedSamples"
-        ws.append([
-            "DeletedAt", "ProbenNr", "Name", "VName", "EntnahmeTag",
-            "AuftragsNr", "Einsender", "Analyte"
-        ])
-        wb.save(self.excel_path)
-        return wb
+    def __init__(self, journal: AuditJournal):
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._busy = False
+        self._retry_delay = 0.0
+        self._retry_at = 0.0        # time.monotonic(); davor kein Hintergrund-Versuch
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    # --------- Schreiben
+    def record(self, infos: List[Dict]) -> int:
+        return self.journal.append(infos)
+
+    def begin(self, infos: List[Dict]) -> Tuple[int, int]:
+        """Vor dem DELETE: Einträge als 'pending' sichern (fsync). Rückgabe für finish()."""
+        return self.journal.begin(infos)
+
+    def finish(self, ids: Tuple[int, int], committed: bool) -> None:
+        """Nach COMMIT (committed=True) bzw. ROLLBACK die Einträge aus begin() abschließen."""
+        self.journal.finish(ids, committed)
+
+    def resolve_pending(self, still_present: Callable[[List[str]], Set[str]]) -> int:
+        """
+        Nach einem Absturz offen gebliebene Einträge abschließen: Proben, die es in der
+        Quell-DB nicht mehr gibt, gelten als gelöscht, die übrigen als zurückgerollt.
+        still_present(ProbenNr-Liste) -> vorhandene ProbenNr. Rückgabe: Anzahl erledigt.
+        """
+        pending = self.journal.pending()
+        if not pending:
+            return 0
+        present = still_present(sorted({p for _, p in pending}))
+        self.journal.resolve([i for i, p in pending if p not in present],
+                             [i for i, p in pending if p in present])
+        return len(pending)
 
     def append_deleted(self, details: Dict[str, str]) -> None:
-        wb = self._ensure_wb()
-        ws = wb.active
-        ws.append([
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            details.get("ProbenNr", ""),
-            details.get("Name", ""),
-            details.get("VName", ""),
-            details.get("EntnahmeTag", ""),
-            details.get("AuftragsNr", ""),
-            details.get("Einsender", ""),
-            details.get("AnalyteList", "")
-        ])
-        wb.save(self.excel_path)
+        """Ein Eintrag im Format von Repository.get_deleted_sample_details (Kompatibilität)."""
+        self.journal.append([{
+            "ProbenNr": details.get("ProbenNr", ""),
+            "Name": details.get("Name", ""),
+            "VName": details.get("VName", ""),
+            "Abnahme": details.get("EntnahmeTag", ""),
+            "AuftragsNr": details.get("AuftragsNr", ""),
+            "Einsender": details.get("Einsender", ""),
+            "Analyte": details.get("AnalyteList", ""),
+        }])
+
+    # --------- Excel
+    @staticmethod
+    def _key(excel_path: str) -> str:
+        return os.path.normcase(os.path.abspath(excel_path))
+
+    def is_stale(self, excel_path: str) -> bool:
+        """True, wenn das Journal Einträge hat, die in der Excel-Datei noch fehlen."""
+        if not excel_path:
+            return False
+        revision = self.journal.revision()
+        if not revision:
+            return False
+        done = self.journal.get_meta(f"xlsx:{self._key(excel_path)}")
+        return done != revision or not os.path.exists(excel_path)
+
+    def _import_workbook(self, excel_path: str) -> None:
+        """
+        Einmalig je Datei: Zeilen einer vorhandenen (früher direkt fortgeschriebenen)
+        Audit-Excel ins Journal übernehmen, damit die Neuerzeugung keine Historie verliert.
+        Nur aus dem Audit-Blatt (AUDIT_SHEET bzw. LEGACY_SHEET); fehlt es, gibt es nichts zu übernehmen.
+        """
+        key = f"imported:{self._key(excel_path)}"
+        if self.journal.get_meta(key) or not os.path.exists(excel_path):
+            self.journal.set_meta({key: "1"})
+            return
+        from openpyxl import load_workbook
+        wb = load_workbook(excel_path, read_only=True)
+        try:
+            name = next((n for n in (AUDIT_SHEET, LEGACY_SHEET) if n in wb.sheetnames), None)
+            if name is None:
+                self.journal.set_meta({key: "1"})
+                return
+            rows = wb[name].iter_rows(values_only=True)
+            header = [str(h) if h is not None else "" for h in next(rows, ())]
+            # Ältere Dateien (AuditService früher): DeletedAt/EntnahmeTag/AnalyteList
+            alias = {"DeletedAt": "Zeitpunkt", "EntnahmeTag": "Abnahme", "AnalyteList": "Analyte"}
+            header = [alias.get(h, h) for h in header]
+            entries = []
+            for values in rows:
+                if not values or all(v in (None, "") for v in values):
+                    continue
+                entries.append({h: v for h, v in zip(header, values) if h in AUDIT_FIELDS})
+            self.journal.append(entries)
+        finally:
+            wb.close()
+        self.journal.set_meta({key: "1"})
+
+    def materialize(self, excel_path: str, force: bool = False) -> bool:
+        """
+        Schreibt die Excel-Datei komplett aus dem Journal neu (write-only: Zeilen werden
+        gestreamt, Speicher konstant), erst in eine Temp-Datei, dann atomar ersetzt.
+        True = geschrieben; False = nichts zu tun. PermissionError, wenn die Datei gesperrt ist.
+        """
+        if not excel_path:
+            return False
+        with self._lock:
+            self._busy = True
+            try:
+                self._import_workbook(excel_path)
+                if not force and not self.is_stale(excel_path):
+                    return False
+                revision = self.journal.revision()
+                try:
+                    self._write(excel_path, self.journal.last_id())
+                except Exception:
+                    self._retry_delay = min(RETRY_MAX, max(RETRY_MIN, self._retry_delay * 2))
+                    self._retry_at = time.monotonic() + self._retry_delay
+                    raise
+                self._retry_delay, self._retry_at = 0.0, 0.0
+                self.journal.set_meta({f"xlsx:{self._key(excel_path)}": revision})
+                return True
+            finally:
+                self._busy = False
+
+    def _write(self, excel_path: str, upto_id: int) -> None:
+        # Audit-Blatt aus dem Journal (gestreamt), übrige Blätter bleiben (nur Werte);
+        # gesperrt (in Excel geöffnet) -> PermissionError
+        write_workbook(excel_path, [SheetSpec(AUDIT_SHEET, AUDIT_FIELDS, self.journal.iter_rows(upto_id),
+                                              table=AUDIT_TABLE)], keep_existing=True)
+
+    def materialize_async(self, excel_path: str,
+                          on_done: Optional[Callable[[bool, Optional[Exception]], None]] = None) -> None:
+        """
+        Wie materialize(), aber im Hintergrund-Thread (auch die Prüfung is_stale(), die die
+        Datei per stat anfasst); on_done(written, error) danach. Nach einem Fehlschlag erst
+        wieder, wenn die Wartezeit (RETRY_MIN … RETRY_MAX) abgelaufen ist.
+        """
+        if not excel_path or self._busy or time.monotonic() < self._retry_at:
+            return
+        self._busy = True
+
+        def run():
+            written, error = False, None
+            try:
+                # materialize() ist per Lock serialisiert; ein zweiter Lauf findet nichts mehr zu tun
+                written = self.materialize(excel_path)
+            except Exception as ex:
+                error = ex
+            if on_done is not None:
+                on_done(written, error)
+
+        threading.Thread(target=run, name="audit-excel", daemon=True).start()
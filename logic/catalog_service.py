@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from models.catalog import CatalogStore
+from models.repository import Repository
+from models.schemas import AnalyteInfo
+
+
+def read_analyte_names(path: Optional[str]) -> Dict[str, str]:
+    """config/analytes.txt: eine Zeile je Analyt, `CODE;Optionaler Anzeigename` (# = Kommentar)."""
+    names: Dict[str, str] = {}
+    if not path or not os.path.exists(path):
+        return names
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            code, _, name = line.partition(";")
+            if code.strip():
+                names[code.strip()] = name.strip() or code.strip()
+    return names
+
+
+class AnalyteCatalog:
+    """
+    Analyten-Katalog aus dem CatalogStore. refresh() liest nur dann aus der DB, wenn sich
+    deren Version (Repository.data_version) geändert hat, und dann nur die BefTag-Zeilen
+    oberhalb des rowid-High-Water-Marks. Je Versionswechsel wird billig auf Löschungen
+    geprüft (MAX(rowid) kleiner oder eine andere Zeile unter der High-Water-rowid, weil
+    rowids wiederverwendet wurden); der Abgleich der Zeilenzahl (COUNT(*) über die ganze
+    BefTag) läuft nur alle reconcile_seconds oder nach request_reconcile() – etwa nach
+    eigenen Löschungen. Bei Abweichung wird komplett neu gelesen, so verschwinden auch
+    Codes, die es nicht mehr gibt.
+
+    Setzt eine BefTag mit rowid voraus; ohne (WITHOUT ROWID) wird gedrosselt komplett neu gelesen.
+    """
+    RECONCILE_SECONDS = 3600
+
+    def __init__(self, repo: Repository, store: CatalogStore, names_path: Optional[str] = None,
+                 reconcile_seconds: int = RECONCILE_SECONDS):
+        self.repo = repo
+        self.store = store
+        self.names_path = names_path
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.Lock()
+
+    def _names_signature(self) -> str:
+        try:
+            st = os.stat(self.names_path or "")
+            return f"{os.path.abspath(self.names_path)}|{st.st_mtime_ns}|{st.st_size}"
+        except OSError:
+            return ""
+
+    def request_reconcile(self) -> None:
+        """Nächstes refresh() gleicht die Zeilenzahl ab (z. B. nach delete_samples)."""
+        with self._lock:
+            self.store.set_meta({"reconciled_at": "0"})
+
+    def _reconcile_due(self, now: float) -> bool:
+        # Zeitstempel im Store: drosselt auch über mehrere CLI-Aufrufe hinweg
+        last = float(self.store.get_meta("reconciled_at", "0") or 0)
+        return now - last >= self.reconcile_seconds
+
+    def _rebuild(self, source: str, names_sig: str) -> None:
+        self.store.reset()
+        self.store.set_meta({"source": source, "names": names_sig})
+
+    def refresh(self, force: bool = False) -> bool:
+        """Bringt den Katalog auf Stand. True = es wurde aus der DB gelesen."""
+        with self._lock:
+            names_sig = self._names_signature()
+            if self.store.get_meta("names") != names_sig:
+                self.store.replace_names(read_analyte_names(self.names_path))
+                self.store.set_meta({"names": names_sig})
+
+            source = f"{self.repo.db_path or ''}|{self.repo.sql.mapping_hash}"
+            if force or self.store.get_meta("source") != source:
+                self._rebuild(source, names_sig)
+
+            version = repr(self.repo.data_version())
+            if self.store.get_meta("version") == version:
+                return False
+            now = time.time()
+            reconcile = self._reconcile_due(now)
+
+            if not self.repo.lines_have_rowid():
+                # Kein High-Water-Mark möglich: gedrosselt alles neu lesen
+                if self.store.get_meta("version") is not None and not reconcile:
+                    return False
+                self._rebuild(source, names_sig)
+                self.store.merge_seen(self.repo.analytes_seen_between(None, None))
+                self.store.set_meta({"version": version, "reconciled_at": repr(now)})
+                return True
+
+            hwm = int(self.store.get_meta("hwm_rowid", "0") or 0)
+            max_rowid = self.repo.max_line_rowid()
+            rebuild = max_rowid < hwm or self.repo.line_signature(hwm) != self.store.get_meta("hwm_row", "")
+            counted: Optional[Tuple[int, int]] = None
+            if not rebuild and reconcile:
+                rec_hwm = int(self.store.get_meta("rec_hwm", "0") or 0)
+                rec_rows = int(self.store.get_meta("rec_rows", "0") or 0)
+                snap_max, total, above = self.repo.line_rowid_stats(rec_hwm)
+                rebuild = total != rec_rows + above
+                counted = (snap_max, total)
+            if rebuild:
+                self._rebuild(source, names_sig)
+                hwm = 0
+                snap_max, total, _ = self.repo.line_rowid_stats(0)
+                counted = (snap_max, total)
+                max_rowid = max(max_rowid, snap_max)
+            if max_rowid > hwm:
+                self.store.merge_seen(self.repo.analytes_seen_between(hwm, max_rowid))
+            meta = {
+                "hwm_rowid": str(max_rowid),
+                "hwm_row": self.repo.line_signature(max_rowid),
+                "version": version,
+            }
+            if counted is not None:
+                # Zählstand aus eigenem Snapshot als Basis für den nächsten Abgleich
+                meta.update({"rec_hwm": str(counted[0]), "rec_rows": str(counted[1]),
+                             "reconciled_at": repr(now)})
+            self.store.set_meta(meta)
+            return True
+
+    def codes(self) -> List[str]:
+        self.refresh()
+        return self.store.codes()
+
+    def entries(self) -> List[AnalyteInfo]:
+        self.refresh()
+        return self.store.entries()
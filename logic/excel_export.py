@@ -0,0 +1,103 @@
+import os
+import warnings
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Sequence
+
+
+@dataclass
+class SheetSpec:
+    """Ein Arbeitsblatt für write_workbook(): rows darf ein Generator sein (wird einmal gestreamt)."""
+    name: str
+    header: Sequence[str]
+    rows: Iterable[Sequence]
+    table: Optional[str] = None   # Name einer Excel-Tabelle über den Daten (None = keine)
+
+
+def as_number(v):
+    """'12' -> 12, '3.50' -> 3.5, sonst unverändert (Anzeige-Strings der Tabellen als Zahlen exportieren)."""
+    if not isinstance(v, str):
+        return v
+    try:
+        return float(v) if "." in v else int(v)
+    except ValueError:
+        return v
+
+
+def _add_table(ws, name: str, header: Sequence[str], n_rows: int) -> None:
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+
+    # Tabelle nur mit mind. 1 Datenzeile (sonst „repariert“ Excel die Datei)
+    if not n_rows or not header:
+        return
+    t = Table(displayName=name, ref=f"A1:{get_column_letter(len(header))}{n_rows + 1}")
+    # write-only: Spaltenköpfe der Tabelle selbst angeben
+    t.tableColumns = [TableColumn(id=i, name=str(h)) for i, h in enumerate(header, start=1)]
+    t.tableStyleInfo = TableStyleInfo(name="TableStyleMedium2", showFirstColumn=False,
+                                      showLastColumn=False, showRowStripes=True, showColumnStripes=False)
+    with warnings.catch_warnings():
+        # Hinweis „Spalten manuell angeben“ kommt in write-only immer – ist erledigt
+        warnings.simplefilter("ignore", UserWarning)
+        ws.add_table(t)
+
+
+def _write_sheet(wb, spec: SheetSpec) -> int:
+    ws = wb.create_sheet(spec.name)
+    ws.append(list(spec.header))
+    n = 0
+    for row in spec.rows:
+        ws.append(list(row))
+        n += 1
+    if spec.table:
+        _add_table(ws, spec.table, spec.header, n)
+    return n
+
+
+def write_workbook(path: str, sheets: Iterable[SheetSpec], keep_existing: bool = False) -> Dict[str, int]:
+    """
+    Schreibt eine XLSX im write-only-Modus: Zeilen gehen direkt in die Datei, der Speicher
+    bleibt unabhängig von der Exportgröße konstant.
+    keep_existing=True: eine vorhandene Datei wird Blatt für Blatt neu aufgebaut – die
+    übergebenen Blätter ersetzen gleichnamige (an deren Position), alle anderen werden
+    zeilenweise aus der read-only geöffneten Datei übernommen statt die ganze Mappe zu laden.
+    Dabei bleiben nur Zellwerte und Formeln erhalten; Formate, Spaltenbreiten, Tabellen,
+    verbundene Zellen, Diagramme und Bilder dieser Blätter gehen verloren – Aufrufer weisen
+    an der Stelle des Exports darauf hin. Geschrieben wird in eine Temp-Datei, die dann atomar ersetzt
+    (PermissionError, wenn die Datei z. B. in Excel geöffnet ist).
+    Rückgabe: Datenzeilen je neu geschriebenem Blatt.
+    """
+    from openpyxl import Workbook, load_workbook
+
+    pending = {s.name: s for s in sheets}
+    written: Dict[str, int] = {}
+    os.makedirs(os.path.dirname(os.path.abspath(path)) or ".", exist_ok=True)
+    wb = Workbook(write_only=True)
+    src = load_workbook(path, read_only=True) if keep_existing and os.path.exists(path) else None
+    tmp = f"{path}.tmp"
+    try:
+        if src is not None:
+            for name in src.sheetnames:
+                if name in pending:
+                    written[name] = _write_sheet(wb, pending.pop(name))
+                    continue
+                ws = wb.create_sheet(name)
+                for values in src[name].iter_rows(values_only=True):
+                    ws.append(list(values))
+        for spec in pending.values():
+            written[spec.name] = _write_sheet(wb, spec)
+        if not wb.worksheets:
+            wb.create_sheet("Sheet")
+        wb.save(tmp)
+        if src is not None:
+            src.close()     # Datei freigeben, bevor sie ersetzt wird
+            src = None
+        os.replace(tmp, path)
+    finally:
+        if src is not None:
+            src.close()
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+    return written
@@ -1,58 +1,80 @@
-from typing import Iterable, Dict, List
+import datetime
+import os
+import re
+from typing import Iterable, List, Optional
+
 from models.repository import Repository
-import datetime, os
-from openpyxl import Workbook, load_workbook
+from logic.excel_export import SheetSpec, write_workbook
+
+MONTHLY_HEADER = ["Analyt-Code", "Anzahl im Monat", "Erstellt am"]
+_MONTH_SHEET = re.compile(r"^(\d{4})-(\d{2})$")
+
+
+def _add_months(day: datetime.date, n: int) -> datetime.date:
+    m = day.year * 12 + day.month - 1 + n
+    return datetime.date(m // 12, m % 12 + 1, 1)
+
 
 class HousekeepingService:
     def __init__(self, repo: Repository, excel_file: str):
         self.repo = repo
         self.excel_file = excel_file
 
-    def ensure_monthly_export(self, analyte_codes: Iterable[str], today: datetime.date = None) -> str:
+    def exported_months(self) -> List[datetime.date]:
+        """Monate (jeweils der 1.), für die die Excel-Datei schon ein Blatt 'YYYY-MM' hat."""
+        if not os.path.exists(self.excel_file):
+            return []
+        from openpyxl import load_workbook
+        wb = load_workbook(self.excel_file, read_only=True)
+        try:
+            names = list(wb.sheetnames)
+        finally:
+            wb.close()
+        out = []
+        for name in names:
+            m = _MONTH_SHEET.match(name)
+            if m and 1 <= int(m.group(2)) <= 12:
+                out.append(datetime.date(int(m.group(1)), int(m.group(2)), 1))
+        return sorted(out)
+
+    def missing_months(self, today: Optional[datetime.date] = None) -> List[datetime.date]:
         """
-        Führt am 1. des Monats einen Export der *ZÄHLUNG SEIT MONATSBEGINN* durch.
-        Gibt den Pfad zur Excel zurück (oder existierende).
+        Abgeschlossene Monate ohne Blatt: nach dem letzten exportierten bis einschließlich
+        Vormonat (Nachholen verpasster Läufe). Ohne bisherigen Export nur der Vormonat.
         """
         today = today or datetime.date.today()
-        if today.day != 1:
-            return self.excel_file  # keine Aktion heute
-
-        # Zeitraum: aktueller Monat (1. bis heute)
-        start = today.replace(day=1)
-        end = today  # inkl. heute
-        # aggregieren
-        from logic.stats_service import StatsService
-        svc = StatsService(self.repo)
-
-        counts = {}
-        for code in analyte_codes:
-            n = svc.analyte_requests(code, datetime.datetime.combine(start, datetime.time.min), datetime.datetime.combine(end, datetime.time.max))
-            counts[code] = n
-
-        # Excel vorbereiten
-        if os.path.exists(self.excel_file):
-            wb = load_workbook(self.excel_file)
-        else:
-            wb = Workbook()
-        sheet_name = f"{today.year}-{today.month:02d}"
-        if sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            for row in list(ws.iter_rows(min_row=2)):
-                for cell in row:
-                    cell.value = None
-        else:
-            ws = wb.create_sheet(title=sheet_name)
-            ws.append(["Analyt-Code", "Anzahl seit Monatsanfang", "Erstellt am"])
-        for code, cnt in counts.items():
-            ws.append([code, cnt, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")])
-        # Workbook speichern
-        if "Sheet" in wb.sheetnames and len(wb.sheetnames) > 1:
-            # Default Sheet löschen, falls leer
-            try:
-                ws0 = wb["Sheet"]
-                if ws0.max_row == 1 and ws0.max_column == 1 and ws0["A1"].value is None:
-                    wb.remove(ws0)
-            except Exception:
-                pass
-        wb.save(self.excel_file)
-        return self.excel_file
+        last = _add_months(today.replace(day=1), -1)
+        done = self.exported_months()
+        first = _add_months(done[-1], 1) if done else last
+        months = []
+        while first <= last:
+            months.append(first)
+            first = _add_months(first, 1)
+        return months
+
+    def ensure_monthly_export(self, today: Optional[datetime.date] = None,
+                              skip_analytes: Iterable[str] = ()) -> List[str]:
+        """
+        Schreibt je fehlendem Monat ein Blatt 'YYYY-MM' mit der Anzahl je Analyt (ohne
+        „Nicht entnommen?“). Alle Monate kommen aus EINER gruppierten Abfrage; schon
+        vorhandene Blätter bleiben unverändert (idempotent je Monat).
+        Rückgabe: die neu geschriebenen Blattnamen (leer = nichts zu tun).
+        """
+        months = self.missing_months(today)
+        if not months:
+            return []
+        start = months[0].strftime("%Y-%m-%d 00:00:00")
+        end = _add_months(months[-1], 1).strftime("%Y-%m-%d 00:00:00")
+        per_month = self.repo.count_requirements_per_month(start, end)
+
+        skip = set(skip_analytes)
+        created = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        sheets = []
+        for month in months:
+            name = month.strftime("%Y-%m")
+            rows = [(code, cnt, created) for code, cnt in per_month.get(name, []) if code not in skip]
+            sheets.append(SheetSpec(name, MONTHLY_HEADER, rows))
+        # Nur die neuen Monatsblätter schreiben; übrige Blätter werden gestreamt übernommen –
+        # nur Werte/Formeln: Formate, Tabellen und Spaltenbreiten darin gehen verloren
+        write_workbook(self.excel_file, sheets, keep_existing=True)
+        return [s.name for s in sheets]
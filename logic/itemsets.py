@@ -0,0 +1,129 @@
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.repository import mask_ids
+
+Itemset = Tuple[int, ...]
+
+
+class _TopK:
+    """
+    Sammelt die `limit` Itemsets mit dem höchsten Support. Ist die Liste voll,
+    steigt die Schwelle auf den kleinsten gehaltenen Support + 1 – alles darunter
+    (und damit jede Obermenge, Support ist anti-monoton) wird nicht mehr verfolgt.
+    """
+    def __init__(self, min_support: int, limit: Optional[int], min_len: int):
+        self.min_support = max(1, int(min_support))
+        self.limit = limit if limit and limit > 0 else None
+        self.min_len = max(1, int(min_len))
+        self._heap: List[Tuple[int, Tuple[int, ...], Itemset]] = []   # (support, -ids, itemset)
+        self._all: List[Tuple[Itemset, int]] = []
+
+    @property
+    def threshold(self) -> int:
+        if self.limit is not None and len(self._heap) >= self.limit:
+            return max(self.min_support, self._heap[0][0] + 1)
+        return self.min_support
+
+    def offer(self, itemset: Itemset, support: int) -> None:
+        if len(itemset) < self.min_len or support < self.min_support:
+            return
+        if self.limit is None:
+            self._all.append((itemset, support))
+            return
+        entry = (support, tuple(-i for i in itemset), itemset)
+        if len(self._heap) < self.limit:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def result(self) -> List[Tuple[Itemset, int]]:
+        rows = self._all if self.limit is None else [(e[2], e[0]) for e in self._heap]
+        return sorted(rows, key=lambda x: (-x[1], len(x[0]), x[0]))
+
+
+def _grow(base: Dict[Itemset, int], suffix: Itemset, top: _TopK, max_len: Optional[int]) -> None:
+    """
+    FP-growth auf einer (bedingten) Musterbasis {Pfad: Gewicht}.
+    Identische Pfade sind im Dict zusammengefasst (entspricht den geteilten Präfixen des FP-Baums).
+    """
+    sup: Dict[int, int] = {}
+    for path, w in base.items():
+        for i in path:
+            sup[i] = sup.get(i, 0) + w
+
+    threshold = top.threshold
+    items = [i for i in sorted(sup, key=lambda i: (-sup[i], i)) if sup[i] >= threshold]
+    if not items:
+        return
+    rank = {i: r for r, i in enumerate(items)}
+
+    # Pfade auf häufige Items kürzen und in FP-Ordnung (absteigender Support) bringen
+    tree: Dict[Itemset, int] = {}
+    for path, w in base.items():
+        p = tuple(sorted((i for i in path if i in rank), key=rank.__getitem__))
+        if p:
+            tree[p] = tree.get(p, 0) + w
+
+    # Seltenste Items zuerst; deren bedingte Basis besteht aus den Präfixen davor
+    for i in reversed(items):
+        s = sup[i]
+        if s < top.threshold:
+            continue
+        itemset = suffix + (i,)
+        top.offer(tuple(sorted(itemset)), s)
+        if max_len is not None and len(itemset) >= max_len:
+            continue
+        cond: Dict[Itemset, int] = {}
+        for p, w in tree.items():
+            if i in p:
+                prefix = p[:p.index(i)]
+                if prefix:
+                    cond[prefix] = cond.get(prefix, 0) + w
+        if cond:
+            _grow(cond, itemset, top, max_len)
+
+
+def frequent_itemsets(
+    masks: Dict[int, int],
+    min_support: int = 2,
+    limit: Optional[int] = 100,
+    min_len: int = 1,
+    max_len: Optional[int] = None,
+) -> List[Tuple[Itemset, int]]:
+    """
+    Häufige Teilkombinationen („enthält Teilmenge“) aus gewichteten Transaktionen
+    {Analyt-Bitmaske: Anzahl Proben}, wie Repository.open_combo_stats sie liefert.
+
+    Support = Anzahl Proben, deren offene Matrix das Itemset enthält.
+    limit: nur die Top-N nach Support (Schwelle steigt während der Suche -> begrenzte Zeit/Speicher);
+    None = alle Itemsets mit Support >= min_support (nur mit max_len oder hohem min_support sinnvoll).
+    Rückgabe: [(ids, support)] absteigend nach Support, dann Größe, dann Ids.
+    """
+    top = _TopK(min_support, limit, min_len)
+    base: Dict[Itemset, int] = {}
+    for mask, n in masks.items():
+        ids = mask_ids(mask)
+        if ids and n > 0:
+            base[ids] = base.get(ids, 0) + n
+    _grow(base, (), top, max_len)
+    return top.result()
+
+
+def exact_matrices(
+    masks: Dict[int, int],
+    min_support: int = 1,
+    limit: Optional[int] = 100,
+    sizes: Optional[Iterable[int]] = None,
+) -> List[Tuple[Itemset, int]]:
+    """„Exakte Matrix“: Proben mit genau dieser offenen Kombination, beliebige Größe."""
+    wanted = set(sizes) if sizes is not None else None
+    rows = []
+    for mask, n in masks.items():
+        if n < min_support:
+            continue
+        ids = mask_ids(mask)
+        if ids and (wanted is None or len(ids) in wanted):
+            rows.append((ids, n))
+    key = lambda x: (-x[1], len(x[0]), x[0])
+    return heapq.nsmallest(limit, rows, key=key) if limit and limit > 0 else sorted(rows, key=key)
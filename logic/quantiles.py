@@ -0,0 +1,109 @@
+import json
+import math
+import random
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+class KllSketch:
+    """
+    KLL-Quantil-Sketch (Karnin/Lang/Liberty): mergebar, Speicher ~ O(k) unabhängig
+    von der Anzahl Werte. Ebene h hält Werte mit Gewicht 2^h; läuft eine Ebene über,
+    wird sie sortiert und jeder zweite Wert (zufälliger Versatz) eine Ebene höher gereicht.
+    Bis etwa k Werte ist das Ergebnis exakt.
+    """
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = max(8, int(k))
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+        self._rng = random.Random(seed)
+
+    # --------- Kapazität
+    def _capacity(self, h: int) -> int:
+        depth = len(self.levels) - h - 1
+        return int(math.ceil(self.k * (2.0 / 3.0) ** depth)) + 1
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def _size(self) -> int:
+        return sum(len(lv) for lv in self.levels)
+
+    def _compress(self) -> None:
+        while self._size() >= self._max_size():
+            for h, lv in enumerate(self.levels):
+                if len(lv) >= self._capacity(h):
+                    if h + 1 == len(self.levels):
+                        self.levels.append([])
+                    lv.sort()
+                    keep = [lv.pop()] if len(lv) % 2 else []
+                    self.levels[h + 1].extend(lv[self._rng.randint(0, 1)::2])
+                    self.levels[h] = keep
+                    break
+
+    # --------- Befüllen / Mergen
+    def update(self, x: float) -> None:
+        self.levels[0].append(float(x))
+        self.n += 1
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def extend(self, values: Iterable[float]) -> None:
+        for x in values:
+            self.update(x)
+
+    def merge(self, other: "KllSketch") -> "KllSketch":
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for h, lv in enumerate(other.levels):
+            self.levels[h].extend(lv)
+        self.n += other.n
+        self._compress()
+        return self
+
+    # --------- Abfragen
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """Näherungsweise Quantile (0..1); None, wenn der Sketch leer ist."""
+        items = sorted((x, 1 << h) for h, lv in enumerate(self.levels) for x in lv)
+        if not items:
+            return [None for _ in qs]
+        total = sum(w for _, w in items)
+        out: List[Optional[float]] = []
+        for q in qs:
+            target = min(max(q, 0.0), 1.0) * total
+            acc = 0
+            value = items[-1][0]
+            for x, w in items:
+                acc += w
+                if acc >= target:
+                    value = x
+                    break
+            out.append(value)
+        return out
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+
+    # --------- Serialisierung (für die Ablage je Tag im Rollup-Sidecar)
+    def to_json(self) -> str:
+        return json.dumps({"k": self.k, "n": self.n,
+                           "levels": [[round(x, 2) for x in lv] for lv in self.levels]},
+                          separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text: str) -> "KllSketch":
+        d = json.loads(text)
+        sk = cls(d.get("k", 200))
+        sk.n = int(d.get("n", 0))
+        sk.levels = [list(map(float, lv)) for lv in d.get("levels", [[]])] or [[]]
+        return sk
+
+
+def sketches_by_key(rows: Iterable, k: int = 200) -> Dict:
+    """(Schlüssel, Wert)-Zeilen in je einen Sketch pro Schlüssel streamen."""
+    out: Dict = {}
+    for key, value in rows:
+        sk = out.get(key)
+        if sk is None:
+            sk = out[key] = KllSketch(k)
+        sk.update(value)
+    return out
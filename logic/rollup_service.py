@@ -0,0 +1,246 @@
+import datetime
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models.repository import Repository
+from models.rollup import RollupStore
+from logic.quantiles import KllSketch, sketches_by_key
+
+WEEKDAYS = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
+_WD_MAP = {"0": "So", "1": "Mo", "2": "Di", "3": "Mi", "4": "Do", "5": "Fr", "6": "Sa"}
+
+# Durchlaufzeiten: Sketch-Genauigkeit und Blockgröße beim Aufbau
+TAT_SKETCH_K = 200
+TAT_CHUNK_DAYS = 31
+
+# Frühestens alle n Sekunden prüfen, ob die DB sich geändert hat (data_version: stat auf db/-wal)
+MIN_CHECK_INTERVAL = 60
+
+# Status-Gruppen (siehe Repository._SAMPLE_STATUS). 'none' fehlt bewusst: Rollup-Tage
+# liegen vor gestern, dort ist jede 'none'-Probe älter als 24h, also „Nicht entnommen?“.
+_OPEN_STATUSES = ("open",)
+_ALL_STATUSES = ("empty", "open", "done")
+
+
+class RollupService:
+    """
+    Beantwortet die Zählstatistiken aus Tages-Rollups (RollupStore) und fragt nur
+    den jüngsten Rand live in der DB ab.
+
+    - Rollups decken alle Tage < heute-1 ab; heute und gestern kommen live.
+    - refresh() rechnet inkrementell: die letzten `recompute_days` Tage (späte
+      Ergebnisse), Tage mit neuen Proben seit dem rowid-High-Water-Mark und als
+      „dirty“ markierte Tage (z. B. nach Löschungen).
+    - refresh_async() rechnet im Hintergrund und höchstens alle `min_interval` Sekunden;
+      bis ready() gilt, beantwortet der Aufrufer die Abfragen live aus der DB.
+    """
+    def __init__(self, repo: Repository, store: RollupStore, recompute_days: int = 14,
+                 min_interval: float = MIN_CHECK_INTERVAL):
+        self.repo = repo
+        self.store = store
+        self.recompute_days = max(1, int(recompute_days))
+        self.min_interval = max(0.0, float(min_interval))
+        self._lock = threading.Lock()
+        self._busy = False
+        self._last_check = 0.0      # time.monotonic() des letzten Starts; 0 = sofort fällig
+
+    # --------- Aktualisierung
+    @staticmethod
+    def _upper_day(today: Optional[datetime.date] = None) -> datetime.date:
+        today = today or datetime.date.today()
+        return today - datetime.timedelta(days=1)
+
+    def _source(self) -> str:
+        return f"{self.repo.db_path or ''}|{self.repo.sql.mapping_hash}"
+
+    def ready(self) -> bool:
+        """Rollups passen zur aktuellen DB/Mapping und haben keine vorgemerkten Tage."""
+        return (self.store.get_meta("source") == self._source()
+                and self.store.get_meta("covered_until") is not None
+                and not self.store.dirty_days())
+
+    def refresh(self, today: Optional[datetime.date] = None) -> bool:
+        """Bringt die Rollups auf Stand. True = es wurde neu gerechnet."""
+        with self._lock:
+            upper = self._upper_day(today)
+            upper_s = upper.isoformat()
+            # Anderes Mapping = andere Spalten/Zeitbasis -> Rollups neu aufbauen
+            source = self._source()
+            if self.store.get_meta("source") != source:
+                self.store.reset()
+                self.store.set_meta({"source": source})
+            if self.repo.first_befund_day() is None:
+                return False    # leere DB: nichts zu verdichten, Abfragen laufen live
+
+            covered = self.store.get_meta("covered_until")
+            version = repr(self.repo.data_version())
+            dirty = self.store.dirty_days()
+            if covered == upper_s and self.store.get_meta("version") == version and not dirty:
+                return False
+
+            hwm = int(self.store.get_meta("hwm_rowid", "0") or 0)
+            max_rowid = self.repo.max_befund_rowid()
+
+            if covered is None:
+                window_start = "0000-01-01"   # Erstaufbau: gesamte Historie
+                late_days: List[str] = []
+            else:
+                window_start = min(covered, (upper - datetime.timedelta(days=self.recompute_days)).isoformat())
+                late_days = self.repo.days_with_rows_after(hwm) if max_rowid > hwm else []
+
+            self._recompute(window_start, upper_s)
+            for day in sorted({d for d in late_days + dirty if d < window_start}):
+                nxt = (datetime.date.fromisoformat(day) + datetime.timedelta(days=1)).isoformat()
+                self._recompute(day, nxt)
+
+            if self._source() != source:
+                return False    # DB/Mapping während der Rechnung gewechselt: Stand nicht übernehmen
+            self.store.set_meta({
+                "covered_until": upper_s,
+                "hwm_rowid": str(max_rowid),
+                "version": version,
+            })
+            return True
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last_check >= self.min_interval
+
+    def refresh_async(self, on_done: Optional[Callable[[bool, Optional[Exception]], None]] = None) -> None:
+        """
+        refresh() im Hintergrund-Thread, wenn keiner läuft und min_interval seit dem letzten
+        Start vergangen ist; on_done(recomputed, error) danach.
+        """
+        if self._busy or not self.due():
+            return
+        self._busy = True
+        self._last_check = time.monotonic()
+
+        def run():
+            recomputed, error = False, None
+            try:
+                recomputed = self.refresh()
+            except Exception as ex:
+                error = ex
+            finally:
+                self._busy = False
+            if on_done is not None:
+                on_done(recomputed, error)
+
+        threading.Thread(target=run, name="rollup-refresh", daemon=True).start()
+
+    def _recompute(self, start_day: str, end_day: str) -> None:
+        first = self.repo.first_befund_day()
+        if first is None:
+            return
+        if first > start_day:
+            start_day = min(first, end_day)
+        self.store.replace_range(
+            start_day, end_day,
+            self.repo.daily_sample_status(start_day, end_day),
+            self.repo.daily_analyte_status(start_day, end_day),
+            self._tat_rows(start_day, end_day),
+        )
+
+    def _tat_rows(self, start_day: str, end_day: str) -> Iterator[Tuple[str, str, str]]:
+        """
+        KLL-Sketch je Tag × Analyt. Gestreamt in Blöcken von TAT_CHUNK_DAYS Tagen,
+        damit auch der Erstaufbau über Jahre nur einen Block im Speicher hält.
+        """
+        day = datetime.date.fromisoformat(start_day)
+        stop = datetime.date.fromisoformat(end_day)
+        while day < stop:
+            nxt = min(day + datetime.timedelta(days=TAT_CHUNK_DAYS), stop)
+            last = (nxt - datetime.timedelta(days=1)).isoformat() + " 23:59:59"
+            rows = self.repo.iter_turnaround_minutes(day.isoformat(), last)
+            sketches = sketches_by_key((((d, code), tat) for d, code, tat in rows), k=TAT_SKETCH_K)
+            for (d, code), sk in sorted(sketches.items()):
+                yield d, code, sk.to_json()
+            day = nxt
+
+    def mark_dirty_timestamps(self, timestamps: Iterable[Optional[str]]) -> None:
+        """Tage der übergebenen Zeitstempel ('YYYY-MM-DD …') neu berechnen lassen (beim nächsten Aufruf)."""
+        self.store.mark_dirty(str(ts)[:10] for ts in timestamps if ts)
+        self._last_check = 0.0
+
+    # --------- Zerlegung Zeitraum -> Rollup-Teil + Live-Teil
+    def _split(self, start: datetime.datetime, end: datetime.datetime
+               ) -> Tuple[Optional[Tuple[str, str]], Optional[Tuple[str, str]]]:
+        """
+        Rollup-Bereich [start_day, end_day) und Live-Bereich (start, end) als Strings.
+        Nur ganze Tage werden aus Rollups bedient; sonst alles live.
+        """
+        fmt = "%Y-%m-%d %H:%M:%S"
+        whole_days = start.time() == datetime.time.min and end.time() >= datetime.time(23, 59, 59)
+        upper = self.store.get_meta("covered_until")
+        if not whole_days or not upper or start.date().isoformat() >= upper:
+            return None, (start.strftime(fmt), end.strftime(fmt))
+
+        end_excl = (end.date() + datetime.timedelta(days=1)).isoformat()
+        rollup = (start.date().isoformat(), min(end_excl, upper))
+        live = (upper, end.strftime(fmt)) if end_excl > upper else None
+        return rollup, live
+
+    # --------- Abfragen (gleiche Rückgabeformen wie Repository)
+    def count_requirements_per_analyte(self, analytes: List[str], start: datetime.datetime,
+                                       end: datetime.datetime) -> List[Tuple[str, int]]:
+        if not analytes:
+            return []
+        rollup, live = self._split(start, end)
+        counts: Dict[str, int] = {}
+        if rollup:
+            counts.update(self.store.analyte_lines(analytes, *rollup, statuses=_ALL_STATUSES))
+        if live:
+            for code, n in self.repo.count_requirements_per_analyte(analytes, *live):
+                counts[code] = counts.get(code, 0) + n
+        return sorted((c, n) for c, n in counts.items() if n)
+
+    def count_befund_status(self, start: datetime.datetime, end: datetime.datetime) -> Tuple[int, int, int]:
+        rollup, live = self._split(start, end)
+        total = opened = done = 0
+        if rollup:
+            st = self.store.sample_status_totals(*rollup)
+            total += sum(st.get(s, 0) for s in _ALL_STATUSES)
+            opened += sum(st.get(s, 0) for s in _OPEN_STATUSES)
+            done += st.get("done", 0)
+        if live:
+            t, o, d = self.repo.count_befund_status(*live)
+            total, opened, done = total + t, opened + o, done + d
+        return total, opened, done
+
+    def count_befunde_per_weekday(self, start: datetime.datetime, end: datetime.datetime,
+                                  only_open: bool) -> Dict[str, int]:
+        rollup, live = self._split(start, end)
+        out: Dict[str, int] = {d: 0 for d in WEEKDAYS}
+        if rollup:
+            statuses = _OPEN_STATUSES if only_open else _ALL_STATUSES
+            for wd, n in self.store.sample_status_by_weekday(*rollup, statuses).items():
+                out[_WD_MAP[wd]] += n
+        if live:
+            for day, n in self.repo.count_befunde_per_weekday(*live, only_open=only_open).items():
+                if day in out:
+                    out[day] += n
+        return out
+
+    def turnaround_sketches(self, start: datetime.datetime, end: datetime.datetime,
+                            analytes: Optional[List[str]] = None) -> Dict[str, KllSketch]:
+        """Ein gemergter TAT-Sketch je Analyt: Rollup-Tage aus dem Sidecar, Rest live gestreamt."""
+        rollup, live = self._split(start, end)
+        out: Dict[str, KllSketch] = {}
+        if rollup:
+            for code, text in self.store.tat_sketches(*rollup, analytes=analytes):
+                sk = KllSketch.from_json(text)
+                if code in out:
+                    out[code].merge(sk)
+                else:
+                    out[code] = sk
+        if live:
+            wanted = set(analytes) if analytes else None
+            rows = self.repo.iter_turnaround_minutes(*live)
+            for code, sk in sketches_by_key(((c, tat) for _, c, tat in rows
+                                             if wanted is None or c in wanted), k=TAT_SKETCH_K).items():
+                if code in out:
+                    out[code].merge(sk)
+                else:
+                    out[code] = sk
+        return out
@@ -0,0 +1,151 @@
+import csv
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, List, Sequence, Tuple
+
+EXPORT_FORMATS = ("csv", "parquet")
+PARQUET_ROW_GROUP = 100000      # Zeilen je Parquet-Row-Group (als Arrow-Spalten gepuffert, dann geschrieben)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@dataclass
+class ExportStats:
+    """Ergebnis eines Zeilen-Exports: Umfang, Dauer und Durchsatz."""
+    rows: int = 0
+    seconds: float = 0.0
+    files: List[str] = field(default_factory=list)
+    invalid: int = 0        # Werte, die nicht in den Spaltentyp passten (Parquet: als leer geschrieben)
+
+    @property
+    def bytes(self) -> int:
+        return sum(os.path.getsize(f) for f in self.files if os.path.exists(f))
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        mb = self.bytes / 2**20
+        rate = mb / self.seconds if self.seconds > 0 else 0.0
+        text = (f"{self.rows} Zeilen in {self.seconds:.1f} s "
+                f"({self.rows_per_second:.0f} Zeilen/s, {mb:.1f} MB, {rate:.1f} MB/s)")
+        if self.invalid:
+            text += f"; {self.invalid} Zeitstempel nicht lesbar (leer geschrieben)"
+        return text
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _part_path(path: str, n: int) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{n:03d}{ext or '.csv'}"
+
+
+def write_csv(path: str, header: Sequence[str], batches: Iterable[Sequence[Tuple]],
+              part_rows: int = 0) -> ExportStats:
+    """
+    Blöcke als CSV (; + BOM wie die übrigen Exporte) schreiben, jeder Block sofort in die Datei.
+    part_rows > 0: neue Datei (name_001.csv, name_002.csv, …) nach je part_rows Zeilen.
+    """
+    stats = ExportStats()
+    t0 = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(path)) or ".", exist_ok=True)
+    f, w, in_part = None, None, 0
+
+    def next_file():
+        nonlocal f, w, in_part
+        if f is not None:
+            f.close()
+        name = _part_path(path, len(stats.files) + 1) if part_rows else path
+        f = open(name, "w", encoding="utf-8-sig", newline="")
+        w = csv.writer(f, delimiter=";")
+        w.writerow(header)
+        stats.files.append(name)
+        in_part = 0
+
+    try:
+        for rows in batches:
+            while rows:
+                if f is None or (part_rows and in_part >= part_rows):
+                    next_file()
+                n = min(len(rows), part_rows - in_part) if part_rows else len(rows)
+                w.writerows(rows[:n])
+                rows = rows[n:]
+                in_part += n
+                stats.rows += n
+        if f is None:
+            next_file()     # keine Treffer: Datei nur mit Kopfzeile
+    finally:
+        if f is not None:
+            f.close()
+    stats.seconds = time.perf_counter() - t0
+    return stats
+
+
+def write_parquet(path: str, header: Sequence[str], batches: Iterable[Sequence[Tuple]],
+                  dictionary: Sequence[str] = ("TestKB",), timestamps: Sequence[str] = ("Zeit", "ErgbDatum"),
+                  row_group: int = PARQUET_ROW_GROUP) -> ExportStats:
+    """
+    Blöcke als Parquet schreiben (benötigt pyarrow). Jeder Block wird sofort in typisierte
+    Arrow-Spalten umgesetzt: `timestamps` als timestamp[ms] (Text 'YYYY-MM-DD HH:MM:SS' aus
+    SQLite, Unlesbares wird leer und in ExportStats.invalid gezählt), `dictionary`
+    dictionary-kodiert (wenige, sich wiederholende Werte), übrige Spalten als Text.
+    Bis zu einer Row-Group werden nur diese Arrow-Blöcke gepuffert, keine Python-Tupel.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    dict_cols, ts_cols = set(dictionary), set(timestamps)
+    types = {h: (pa.timestamp("ms") if h in ts_cols
+                 else pa.dictionary(pa.int32(), pa.string()) if h in dict_cols else pa.string())
+             for h in header}
+    schema = pa.schema([pa.field(h, types[h]) for h in header])
+    stats = ExportStats()
+
+    def text_array(values: Sequence) -> "pa.Array":
+        try:
+            return pa.array(values, type=pa.string())
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # SQLite ist dynamisch typisiert: vereinzelte Zahlen in Textspalten
+            return pa.array([v if v is None or isinstance(v, str) else str(v) for v in values], type=pa.string())
+
+    def to_batch(rows: Sequence[Tuple]) -> "pa.RecordBatch":
+        arrays = []
+        for h, col in zip(header, zip(*rows)):
+            arr = text_array(col)
+            if h in ts_cols:
+                parsed = pc.strptime(arr, format=TIMESTAMP_FORMAT, unit="ms", error_is_null=True)
+                stats.invalid += parsed.null_count - arr.null_count
+                arr = parsed
+            elif h in dict_cols:
+                arr = arr.dictionary_encode()
+            arrays.append(arr)
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    t0 = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(path)) or ".", exist_ok=True)
+    pending: List["pa.RecordBatch"] = []
+    in_group = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in batches:
+            if not rows:
+                continue
+            pending.append(to_batch(rows))
+            in_group += len(rows)
+            stats.rows += len(rows)
+            if in_group >= row_group:
+                writer.write_table(pa.Table.from_batches(pending, schema=schema))
+                pending, in_group = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema=schema))
+    stats.files.append(path)
+    stats.seconds = time.perf_counter() - t0
+    return stats
@@ -1,9 +1,20 @@
 from typing import Dict, Iterable, Optional, List, Tuple
 from collections import Counter
-from itertools import combinations
 import datetime
 
-from models.repository import Repository
+from models.repository import Repository, SUSPECTED
+from logic.itemsets import exact_matrices, frequent_itemsets
+
+
+def weekday_occurrences(start: datetime.date, end: datetime.date) -> Dict[int, int]:
+    """Anzahl der Montage … Sonntage (0 … 6) in [start, end], arithmetisch statt Tag für Tag."""
+    n_days = (end - start).days + 1
+    if n_days <= 0:
+        return {i: 0 for i in range(7)}
+    weeks, rest = divmod(n_days, 7)
+    first = start.weekday()
+    return {wd: weeks + (1 if (wd - first) % 7 < rest else 0) for wd in range(7)}
+
 
 class StatsService:
     def __init__(self, repo: Repository):
@@ -13,7 +24,7 @@ class StatsService:
         return self.repo.suspected_missing_blood_draw_proben(now)
 
     def analyte_requests(self, analyte_code: str, start: datetime.datetime, end: datetime.datetime) -> int:
-        excl = self.suspected_missing_blood_draw()
+        excl = SUSPECTED
         return self.repo.count_analyte_requests(
             analyte_code,
             start.strftime("%Y-%m-%d %H:%M:%S"),
@@ -22,17 +33,13 @@ class StatsService:
         )
 
     def counts_by_status(self, start: datetime.datetime, end: datetime.datetime) -> Dict[str, int]:
-        excl = self.suspected_missing_blood_draw()
-        per = self.repo.per_sample_completion(
+        excl = SUSPECTED
+        # Nur Summen gebraucht -> in SQL zählen statt per_sample_completion() zu materialisieren
+        return self.repo.completion_totals(
             start.strftime("%Y-%m-%d %H:%M:%S"),
             end.strftime("%Y-%m-%d %H:%M:%S"),
             excl,
         )
-        out = {"open": 0, "done": 0, "all": 0}
-        for st in per.values():
-            out[st] += 1
-        out["all"] = len(per)
-        return out
 
     def weekday_stats_multi(
         self,
@@ -41,7 +48,7 @@ class StatsService:
         status: Optional[str],
         analytes: Iterable[str],
     ) -> Dict[int, Dict[str, float]]:
-        excl = self.suspected_missing_blood_draw()
+        excl = SUSPECTED
         counts = self.repo.weekday_counts_multi(
             status or "all",
             list(analytes),
@@ -50,32 +57,22 @@ class StatsService:
             excl,
         )
         # Mittelwerte auf Basis der Tage im Intervall
-        day = start.date()
-        end_date = end.date()
-        days_per_weekday = {i: 0 for i in range(7)}
-        while day <= end_date:
-            days_per_weekday[day.weekday()] += 1
-            day += datetime.timedelta(days=1)
+        days_per_weekday = weekday_occurrences(start.date(), end.date())
         return {wd: {"count": c, "avg": c / max(1, days_per_weekday.get(wd, 0))} for wd, c in counts.items()}
 
     def get_deleted_sample_details(self, proben_nr: str):
         return self.repo.get_deleted_sample_details(proben_nr)
 
     def combo_stats_since(self, since: datetime.datetime):
-        excl = self.suspected_missing_blood_draw()
-        per = self.repo.open_analytes_per_sample_since(since.strftime("%Y-%m-%d %H:%M:%S"), excl)
+        # Offene Matrizen als Bitmasken; Paare/Tripel als Teilmengen-Support per FP-growth
+        # statt itertools.combinations je Probe
+        codes, masks = self.repo.open_combo_stats(since.strftime("%Y-%m-%d %H:%M:%S"), max_k=None)
         sing = Counter()
-        pairs = Counter()
-        trips = Counter()
-        for codes in per:
-            if len(codes) == 1:
-                sing[codes[0]] += 1
-            if len(codes) >= 2:
-                for a, b in combinations(codes, 2):
-                    pairs[tuple(sorted((a, b)))] += 1
-            if len(codes) >= 3:
-                for a, b, c in combinations(codes, 3):
-                    trips[tuple(sorted((a, b, c)))] += 1
+        for ids, n in exact_matrices(masks, limit=None, sizes=(1,)):
+            sing[codes[ids[0]]] += n
+        subsets = frequent_itemsets(masks, min_support=1, limit=None, min_len=2, max_len=3)
+        pairs = {tuple(codes[i] for i in ids): n for ids, n in subsets if len(ids) == 2}
+        trips = {tuple(codes[i] for i in ids): n for ids, n in subsets if len(ids) == 3}
         sing_list = sorted(sing.items(), key=lambda x: (-x[1], x[0]))
         pair_list = [(" + ".join(k), v) for k, v in sorted(pairs.items(), key=lambda x: (-x[1], x[0]))]
         trip_list = [(" + ".join(k), v) for k, v in sorted(trips.items(), key=lambda x: (-x[1], x[0]))]
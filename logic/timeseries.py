@@ -0,0 +1,104 @@
+import datetime
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+GRANULARITIES = {"day": "Tag", "week": "ISO-Woche", "month": "Monat"}
+
+
+def bucket_start(d: datetime.date, granularity: str) -> datetime.date:
+    """Erster Tag des Buckets, in den d fällt (Woche beginnt Montag, wie ISO 8601)."""
+    if granularity == "day":
+        return d
+    if granularity == "week":
+        return d - datetime.timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    raise ValueError(f"Unbekannte Granularität: {granularity}")
+
+
+def bucket_label(start: datetime.date, granularity: str) -> str:
+    if granularity == "week":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == "month":
+        return start.strftime("%Y-%m")
+    return start.isoformat()
+
+
+def bucket_starts(start: datetime.date, end: datetime.date, granularity: str) -> List[datetime.date]:
+    """Alle Bucket-Anfänge, die [start, end] berühren (lückenlos, für das Auffüllen mit 0)."""
+    out: List[datetime.date] = []
+    cur = bucket_start(start, granularity)
+    while cur <= end:
+        out.append(cur)
+        if granularity == "day":
+            cur += datetime.timedelta(days=1)
+        elif granularity == "week":
+            cur += datetime.timedelta(days=7)
+        else:
+            cur = (cur.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return out
+
+
+class TimeSeriesMatrix:
+    """
+    Dichte Matrix Analyt × Zeit-Bucket, zeilenweise in einem flachen array('q').
+    Fehlende Kombinationen sind 0; Zugriff über Zeilen-/Spaltenindex oder Codes.
+    """
+    def __init__(self, analytes: Iterable[str], starts: List[datetime.date], granularity: str):
+        self.analytes: List[str] = list(analytes)
+        self.starts = starts
+        self.granularity = granularity
+        self.labels: List[str] = [bucket_label(s, granularity) for s in starts]
+        self._row: Dict[str, int] = {a: i for i, a in enumerate(self.analytes)}
+        self._col: Dict[datetime.date, int] = {s: j for j, s in enumerate(starts)}
+        self.data = array("q", bytes(8 * len(self.analytes) * len(starts)))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.analytes), len(self.starts)
+
+    def add(self, analyte: str, bucket: datetime.date, n: int) -> None:
+        i = self._row.get(analyte)
+        j = self._col.get(bucket)
+        if i is not None and j is not None:
+            self.data[i * len(self.starts) + j] += n
+
+    def value(self, i: int, j: int) -> int:
+        return self.data[i * len(self.starts) + j]
+
+    def row(self, analyte: str) -> array:
+        i = self._row[analyte]
+        w = len(self.starts)
+        return self.data[i * w:(i + 1) * w]
+
+    def row_totals(self) -> List[int]:
+        w = len(self.starts)
+        return [sum(self.data[i * w:(i + 1) * w]) for i in range(len(self.analytes))]
+
+    def column_totals(self) -> List[int]:
+        w = len(self.starts)
+        return [sum(self.data[j::w]) for j in range(w)] if self.analytes else [0] * w
+
+    def to_columns(self) -> Tuple[List[str], List[List]]:
+        """
+        (Kopf, Spalten) derselben Tabelle wie to_rows(), aber spaltenweise – jede Bucket-Spalte
+        ist ein Schritt-Slice des flachen Arrays (für ColumnarTableModel, ohne Zeilen-Umweg).
+        """
+        w = len(self.starts)
+        row_totals = self.row_totals()
+        col_totals = self.column_totals()
+        columns: List[List] = [self.analytes + ["Summe"]]
+        for j in range(w):
+            columns.append(self.data[j::w].tolist() + [col_totals[j]])
+        columns.append(row_totals + [sum(col_totals)])
+        return ["Analyt"] + self.labels + ["Summe"], columns
+
+    def to_rows(self) -> List[List]:
+        """Tabellenform für Export: Kopfzeile + eine Zeile je Analyt (+ Summe)."""
+        rows: List[List] = [["Analyt"] + self.labels + ["Summe"]]
+        for a, total in zip(self.analytes, self.row_totals()):
+            rows.append([a] + list(self.row(a)) + [total])
+        col = self.column_totals()
+        rows.append(["Summe"] + col + [sum(col)])
+        return rows
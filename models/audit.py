@@ -0,0 +1,165 @@
+import datetime
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Spalten des Audit-Protokolls (gleiche Namen wie die Kopfzeile der Excel-Datei)
+AUDIT_FIELDS = ("Zeitpunkt", "ProbenNr", "Name", "VName", "GebDat", "PatID",
+                "Abnahme", "AuftragsNr", "Einsender", "Analyte")
+
+# Status eines Eintrags: vor dem DELETE 'pending', nach COMMIT bzw. ROLLBACK endgültig
+PENDING, COMMITTED, ROLLED_BACK = "pending", "committed", "rolled_back"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+-- Gelöschte Proben, nur INSERT (nie DELETE); UPDATE nur für state pending -> committed/rolled_back
+CREATE TABLE IF NOT EXISTS deleted (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    Zeitpunkt  TEXT NOT NULL,
+    ProbenNr   TEXT,
+    Name       TEXT,
+    VName      TEXT,
+    GebDat     TEXT,
+    PatID      TEXT,
+    Abnahme    TEXT,
+    AuftragsNr TEXT,
+    Einsender  TEXT,
+    Analyte    TEXT,
+    state      TEXT NOT NULL DEFAULT 'committed'
+);
+"""
+
+
+def _text(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, datetime.datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(v, datetime.date):
+        return v.strftime("%Y-%m-%d")
+    return str(v)
+
+
+class AuditJournal:
+    """
+    Append-only Protokoll gelöschter Proben (lokale SQLite, synchronous=FULL: jeder
+    Eintrag ist nach append() auf der Platte). Ein Löschvorgang kostet O(gelöschte Proben),
+    unabhängig davon, wie lang die Historie ist; die Excel-Datei wird daraus erzeugt.
+    Löschungen werden vorab als 'pending' protokolliert und nach COMMIT/ROLLBACK per
+    finish() abgeschlossen; nur 'committed'-Einträge gelten als gelöscht.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        with closing(self._connect()) as con:
+            con.executescript(_SCHEMA)
+            if "state" not in {r[1] for r in con.execute("PRAGMA table_info(deleted)")}:
+                # Journale von vor dem Status: alle Einträge waren bereits gelöscht
+                con.execute("ALTER TABLE deleted ADD COLUMN state TEXT NOT NULL DEFAULT 'committed'")
+                con.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("PRAGMA journal_mode = WAL")
+        con.execute("PRAGMA synchronous = FULL")
+        return con
+
+    # --------- Meta
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with closing(self._connect()) as con:
+            r = con.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return r[0] if r else default
+
+    def set_meta(self, values: Dict[str, str]) -> None:
+        with self._lock, closing(self._connect()) as con:
+            con.executemany("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", list(values.items()))
+            con.commit()
+
+    # --------- Schreiben
+    def append(self, rows: Iterable[Dict], at: Optional[str] = None, state: str = COMMITTED) -> int:
+        """
+        Einträge anhängen (Schlüssel wie AUDIT_FIELDS; „Vname“ aus Repository wird akzeptiert).
+        Zeitpunkt = at bzw. jetzt, falls die Zeile keinen eigenen hat. Rückgabe: Anzahl.
+        """
+        return self._insert(rows, at, state)[1]
+
+    def begin(self, rows: Iterable[Dict]) -> Tuple[int, int]:
+        """Einträge als 'pending' anhängen (vor dem DELETE). Rückgabe: (erste, letzte) id, (0, 0) = keine."""
+        first, n = self._insert(rows, None, PENDING)
+        return (first, first + n - 1) if n else (0, 0)
+
+    def finish(self, ids: Tuple[int, int], committed: bool) -> None:
+        """Einträge aus begin() abschließen: COMMIT -> 'committed', ROLLBACK -> 'rolled_back'."""
+        if not ids[0]:
+            return
+        with self._lock, closing(self._connect()) as con:
+            con.execute("UPDATE deleted SET state = ? WHERE id BETWEEN ? AND ? AND state = ?",
+                        (COMMITTED if committed else ROLLED_BACK, ids[0], ids[1], PENDING))
+            con.commit()
+
+    def pending(self) -> List[Tuple[int, str]]:
+        """(id, ProbenNr) offener Einträge – bleiben nur nach einem Absturz zwischen DELETE und finish()."""
+        with closing(self._connect()) as con:
+            return [(r[0], r[1]) for r in con.execute("SELECT id, ProbenNr FROM deleted WHERE state = ? ORDER BY id",
+                                                      (PENDING,))]
+
+    def resolve(self, committed_ids: Iterable[int], rolled_back_ids: Iterable[int]) -> None:
+        """Offene Einträge nachträglich abschließen (siehe pending())."""
+        rows = [(COMMITTED, i) for i in committed_ids] + [(ROLLED_BACK, i) for i in rolled_back_ids]
+        if not rows:
+            return
+        with self._lock, closing(self._connect()) as con:
+            con.executemany(f"UPDATE deleted SET state = ? WHERE id = ? AND state = '{PENDING}'", rows)
+            con.commit()
+
+    def _insert(self, rows: Iterable[Dict], at: Optional[str], state: str) -> Tuple[int, int]:
+        """Einträge in einer Transaktion anhängen. Rückgabe: (erste id, Anzahl)."""
+        now = at or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        values = []
+        for r in rows:
+            r = dict(r)
+            if "VName" not in r and "Vname" in r:
+                r["VName"] = r["Vname"]
+            values.append(tuple(_text(r.get(f)) or (now if f == "Zeitpunkt" else "") for f in AUDIT_FIELDS))
+        if not values:
+            return 0, 0
+        q = (f"INSERT INTO deleted({', '.join(AUDIT_FIELDS)}, state) "
+             f"VALUES ({', '.join('?' * len(AUDIT_FIELDS))}, ?)")
+        with self._lock, closing(self._connect()) as con:
+            # Unter dem Lock und in einer Transaktion: die ids des Blocks sind lückenlos
+            first = con.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM deleted").fetchone()[0]
+            con.executemany(q, (v + (state,) for v in values))
+            con.commit()
+        return int(first), len(values)
+
+    # --------- Lesen
+    def last_id(self) -> int:
+        with closing(self._connect()) as con:
+            return int(con.execute("SELECT COALESCE(MAX(id), 0) FROM deleted").fetchone()[0])
+
+    def revision(self) -> str:
+        """Ändert sich mit jedem neuen oder abgeschlossenen Eintrag ('' = Journal leer)."""
+        with closing(self._connect()) as con:
+            last, done = con.execute(
+                "SELECT COALESCE(MAX(id), 0), COALESCE(SUM(state <> 'pending'), 0) FROM deleted").fetchone()
+        return f"{last}/{done}" if last else ""
+
+    def iter_rows(self, upto_id: Optional[int] = None, batch: int = 2000) -> Iterator[Tuple]:
+        """Alle gelöschten ('committed') Einträge (Spalten wie AUDIT_FIELDS) chronologisch, blockweise gelesen."""
+        q = (f"SELECT {', '.join(AUDIT_FIELDS)} FROM deleted WHERE id <= ? AND state = '{COMMITTED}' "
+             f"ORDER BY Zeitpunkt, id")
+        with closing(self._connect()) as con:
+            cur = con.execute(q, (upto_id if upto_id is not None else 2**62,))
+            while True:
+                chunk: List[Tuple] = cur.fetchmany(batch)
+                if not chunk:
+                    return
+                yield from chunk
@@ -0,0 +1,114 @@
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def _approx_size(obj: Any, _depth: int = 0) -> int:
+    """Grobe Speicherschätzung (rekursiv über Listen/Tupel/Dicts/Sets)."""
+    size = sys.getsizeof(obj)
+    if _depth > 4:
+        return size
+    if isinstance(obj, dict):
+        size += sum(_approx_size(k, _depth + 1) + _approx_size(v, _depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_approx_size(x, _depth + 1) for x in obj)
+    return size
+
+
+def _freeze(value: Any) -> Hashable:
+    """Macht Parameter hashbar (Listen/Sets -> Tupel), damit sie als Cache-Schlüssel taugen."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return ("__set__",) + tuple(sorted(_freeze(v) for v in value))
+    if isinstance(value, dict):
+        return ("__dict__",) + tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class ResultCache:
+    """
+    LRU-Cache für Abfrageergebnisse mit Speichergrenze.
+    Schlüssel enthalten die DB-Version; nach einer Änderung der DB laufen alte
+    Einträge einfach aus dem LRU heraus. Ergebnisse gelten als read-only.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, Tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, size, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+                self._bytes -= size
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        size = _approx_size(value)
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size, expires)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                _, (_, s, _) = self._data.popitem(last=False)
+                self._bytes -= s
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def cached(ttl: Optional[float] = None) -> Callable:
+    """
+    Dekorator für Repository-Lesemethoden. Schlüssel = (Methode, Parameter, DB-Version).
+    Erwartet am Objekt `cache` (ResultCache) und `data_version()`.
+    ttl: zusätzliche Lebensdauer in Sekunden für zeitabhängige Abfragen (z. B. „älter als 24h“).
+    """
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            cache: Optional[ResultCache] = getattr(self, "cache", None)
+            if cache is None:
+                return fn(self, *args, **kwargs)
+            key = (fn.__name__, _freeze(args), _freeze(kwargs), self.data_version())
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            value = fn(self, *args, **kwargs)
+            cache.put(key, value, ttl)
+            return value
+        return wrapper
+    return deco
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.schemas import AnalyteInfo
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+-- In der DB gesehene Analyt-Codes (BefTag) mit erstem/letztem Order-Zeitpunkt
+CREATE TABLE IF NOT EXISTS analyte (
+    code       TEXT PRIMARY KEY,
+    first_seen TEXT,
+    last_seen  TEXT
+) WITHOUT ROWID;
+-- Anzeigenamen aus config/analytes.txt (auch für Codes, die (noch) nicht in der DB vorkommen)
+CREATE TABLE IF NOT EXISTS analyte_name (
+    code TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class CatalogStore:
+    """
+    Lokale Sidecar-SQLite mit dem Analyten-Katalog (ersetzt SELECT DISTINCT TestKB
+    über die ganze BefTag bei jedem Aufruf).
+    """
+    SCHEMA_VERSION = "1"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        with closing(self._connect()) as con:
+            con.executescript(_SCHEMA)
+        if self.get_meta("schema") != self.SCHEMA_VERSION:
+            self.reset()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("PRAGMA journal_mode = WAL")
+        con.execute("PRAGMA synchronous = NORMAL")
+        return con
+
+    # --------- Meta
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with closing(self._connect()) as con:
+            r = con.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return r[0] if r else default
+
+    def set_meta(self, values: Dict[str, str]) -> None:
+        with self._lock, closing(self._connect()) as con:
+            con.executemany("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", list(values.items()))
+            con.commit()
+
+    def reset(self) -> None:
+        """Gesehene Codes und Meta verwerfen (Namen bleiben, sie hängen nur an analytes.txt)."""
+        with self._lock, closing(self._connect()) as con:
+            con.execute("DELETE FROM meta")
+            con.execute("DELETE FROM analyte")
+            con.execute("INSERT INTO meta(key, value) VALUES ('schema', ?)", (self.SCHEMA_VERSION,))
+            con.commit()
+
+    # --------- Schreiben
+    def merge_seen(self, rows: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> None:
+        """(code, first_seen, last_seen) einmischen: Zeitspannen werden erweitert, nie verkleinert."""
+        q = """
+        INSERT INTO analyte(code, first_seen, last_seen) VALUES (?, ?, ?)
+        ON CONFLICT(code) DO UPDATE SET
+            first_seen = CASE WHEN analyte.first_seen IS NULL OR excluded.first_seen < analyte.first_seen
+                              THEN COALESCE(excluded.first_seen, analyte.first_seen) ELSE analyte.first_seen END,
+            last_seen  = CASE WHEN analyte.last_seen IS NULL OR excluded.last_seen > analyte.last_seen
+                              THEN COALESCE(excluded.last_seen, analyte.last_seen) ELSE analyte.last_seen END
+        """
+        with self._lock, closing(self._connect()) as con:
+            con.executemany(q, rows)
+            con.commit()
+
+    def replace_names(self, names: Dict[str, str]) -> None:
+        with self._lock, closing(self._connect()) as con:
+            con.execute("DELETE FROM analyte_name")
+            con.executemany("INSERT INTO analyte_name(code, name) VALUES (?, ?)", list(names.items()))
+            con.commit()
+
+    # --------- Lesen
+    def codes(self) -> List[str]:
+        with closing(self._connect()) as con:
+            return [r[0] for r in con.execute("SELECT code FROM analyte ORDER BY code")]
+
+    def entries(self) -> List[AnalyteInfo]:
+        q = """
+        SELECT a.code, n.name, a.first_seen, a.last_seen
+        FROM analyte a
+        LEFT JOIN analyte_name n ON n.code = a.code
+        ORDER BY a.code
+        """
+        with closing(self._connect()) as con:
+            return [AnalyteInfo(*r) for r in con.execute(q)]
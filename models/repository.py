@@ -1,8 +1,15 @@
+import datetime
 import os
 import sqlite3
-from typing import List, Tuple, Dict, Optional
+import threading
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Sequence, Tuple, Dict, Optional
 import itertools
 
+from models.cache import ResultCache, cached
+from models.sql import SqlCompiler, compiler_for
+
 
 def _best_effort_decode(b):
     if b is None or isinstance(b, str):
@@ -15,263 +22,1191 @@ def _best_effort_decode(b):
     return b.decode("utf-8", errors="replace")
 
 
+def mask_ids(mask: int) -> Tuple[int, ...]:
+    """Gesetzte Bits einer Analyt-Maske (open_combo_stats) als aufsteigende Id-Tupel."""
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return tuple(out)
+
+
+# Lese-Verbindungen: langlebig, read-only (mode=ro), auf große Scans über Netzlaufwerke getrimmt.
+# Kein query_only: das würde auch TEMP-Tabellen (Exklusionsmengen) verbieten.
+_READ_PRAGMAS = (
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",     # 64 MiB Page-Cache je Verbindung
+    "PRAGMA mmap_size = 268435456",   # 256 MiB Memory-Mapping
+)
+_STATEMENT_CACHE = 256
+
+# SQL-Vorlagen: Tabellen/Spalten als Platzhalter, übersetzt durch models.sql.SqlCompiler
+# ({H}/{L} = Kopf-/Zeilentabelle mit Alias b/t, {TS} = Order-/Abnahmezeit inkl. aller Fallbacks).
+
+# Opt-in Indizes ("Datenbank optimieren"): (Name, DDL). Der Ausdrucksindex verwendet
+# exakt denselben Ausdruck wie {TS} (ohne Alias), sonst ignoriert SQLite ihn; sein Name
+# enthält einen Hash des Ausdrucks, damit ein geändertes Mapping einen neuen Index bekommt.
+_OPTIMIZE_INDEXES = [
+    ("ix_{h_name}_order_ts_{ts_hash}",
+     "CREATE INDEX IF NOT EXISTS \"{index}\" ON {H}({TS_BARE})"),
+    ("ix_{l_name}_probe_result_test",
+     "CREATE INDEX IF NOT EXISTS \"{index}\" ON {L}({sid}, {result}, {code})"),
+    ("ix_{l_name}_test_result",
+     "CREATE INDEX IF NOT EXISTS \"{index}\" ON {L}({code}, {result})"),
+]
+# Frühere Fassung des Zeitindex (ohne TransDatum-Fallback) – wird beim Optimieren entfernt
+_LEGACY_INDEXES = ("ix_befund_order_ts",)
+
+# Zeilen-Prädikate je Probe (Alias b) in zwei Formen, gewählt je Verbindung (Repository._lines):
+#   probe = korrelierte EXISTS-Probe – schnell nur mit Index auf {L}({sid}, …) (PK oder „optimieren“)
+#   scan  = unkorrelierte IN-Menge – {L} wird je Statement EINMAL gelesen statt einmal je Probe
+_LINE_PREDICATES = {
+    "probe": {
+        "HAS_LINES": "EXISTS(SELECT 1 FROM {L} t WHERE t.{sid} = b.{sid})",
+        "HAS_OPEN": "EXISTS(SELECT 1 FROM {L} t WHERE t.{sid} = b.{sid} AND t.{result} IS NULL)",
+        "HAS_RESULT": "EXISTS(SELECT 1 FROM {L} t WHERE t.{sid} = b.{sid} AND t.{result} IS NOT NULL)",
+    },
+    "scan": {
+        "HAS_LINES": "COALESCE(b.{sid} IN (SELECT t.{sid} FROM {L} t WHERE t.{sid} IS NOT NULL), 0)",
+        "HAS_OPEN": ("COALESCE(b.{sid} IN (SELECT t.{sid} FROM {L} t"
+                     " WHERE t.{sid} IS NOT NULL AND t.{result} IS NULL), 0)"),
+        "HAS_RESULT": ("COALESCE(b.{sid} IN (SELECT t.{sid} FROM {L} t"
+                       " WHERE t.{sid} IS NOT NULL AND t.{result} IS NOT NULL), 0)"),
+    },
+}
+# Probe hat mind. eine der Anforderungen {IN} (Vorlage für SqlCompiler.with_in)
+_HAS_CODE_IN = {
+    "probe": "EXISTS(SELECT 1 FROM {L} t WHERE t.{sid} = b.{sid} AND t.{code} IN ({IN}))",
+    "scan": "COALESCE(b.{sid} IN (SELECT t.{sid} FROM {L} t WHERE t.{sid} IS NOT NULL AND t.{code} IN ({IN})), 0)",
+}
+
+# Status einer Probe für Tages-Rollups:
+#   empty = keine BefTag-Zeilen, none = Zeilen, aber kein einziges Ergebnis,
+#   open  = mind. eine Zeile ohne Ergebnis, done = alle Zeilen mit Ergebnis
+_SAMPLE_STATUS = """
+            CASE
+              WHEN NOT {HAS_LINES} THEN 'empty'
+              WHEN NOT {HAS_RESULT} THEN 'none'
+              WHEN {HAS_OPEN} THEN 'open'
+              ELSE 'done'
+            END"""
+
+_SQL_DAILY_SAMPLE_STATUS = """
+        SELECT DATE({TS}) AS day, {SAMPLE_STATUS} AS status, COUNT(*) AS n
+        FROM {H} b
+        WHERE {TS} >= ?
+          AND {TS} < ?
+        GROUP BY day, status
+        """
+
+_SQL_DAILY_ANALYTE_STATUS = """
+        WITH s AS (
+            SELECT b.{sid} AS sid, DATE({TS}) AS day, {SAMPLE_STATUS} AS status
+            FROM {H} b
+            WHERE {TS} >= ?
+              AND {TS} < ?
+        )
+        SELECT s.day, t.{code} AS TestKB, s.status, COUNT(*) AS n
+        FROM s
+        JOIN {L} t ON t.{sid} = s.sid
+        WHERE t.{code} IS NOT NULL
+        GROUP BY s.day, t.{code}, s.status
+        """
+
+# „Nicht entnommen?“: Anforderungen vorhanden, aber in keiner Zeile ein Ergebnis
+SUSPECT_HOURS = 24
+_SUSPECT_COND = """{HAS_LINES}
+          AND NOT {HAS_RESULT}"""
+
+# Eine Seite der Liste: Keyset auf (Zeit, ProbenNr) statt OFFSET, Zeitfenster im WHERE
+# (nutzt den Zeitindex), Status je Probe per Zeilen-Prädikat; endet nach LIMIT Treffern.
+# Parameter: Keyset-Zeit, Grenze „älter als …“, Keyset (ts, ProbenNr), Seitengröße.
+# Nur EINE Untergrenze, damit der Index ab der Keyset-Zeit sucht statt ab Fensteranfang.
+_SQL_SUSPECTED_PAGE = """
+        SELECT b.{sid} AS ProbenNr,
+               {TS} AS ts
+        FROM {H} b
+        WHERE {TS} >= ?
+          AND {TS} <= ?
+          AND ({TS} > ? OR b.{sid} > ?)
+          AND {SUSPECT_COND}
+        ORDER BY ts, b.{sid}
+        LIMIT ?
+        """
+# Anforderungen nur für die Proben der angezeigten Seite
+_SQL_SUSPECTED_PAGE_ANALYTES = """
+        SELECT t.{sid} AS ProbenNr,
+               COUNT(t.{code}) AS num_req,
+               REPLACE(GROUP_CONCAT(DISTINCT t.{code}), ',', ', ') AS analytes
+        FROM {L} t
+        WHERE t.{sid} IN ({IN})
+        GROUP BY t.{sid}
+        """
+
+# Materialisierte Exklusionsmenge (TEMP-Tabelle je Lese-Verbindung).
+# Befüllt wird nur ein Zeitfenster (lower, cutoff]: beim Neuaufbau ab '' (alles),
+# danach nur die Proben, die seit dem letzten Stand die 24h-Grenze überschritten haben.
+_SQL_SUSPECTED_CREATE = (
+    "CREATE TEMP TABLE IF NOT EXISTS suspected(ProbenNr PRIMARY KEY, ts) WITHOUT ROWID"
+)
+_SQL_SUSPECTED_FILL = """
+        INSERT OR IGNORE INTO temp.suspected(ProbenNr, ts)
+        SELECT b.{sid}, {TS}
+        FROM {H} b
+        WHERE {TS} > ?
+          AND {TS} <= ?
+          AND {SUSPECT_COND}
+        """
+# Anti-Join für Abfragen mit Alias b
+_EXCL_SUSPECTED = "AND NOT EXISTS (SELECT 1 FROM temp.suspected x WHERE x.ProbenNr = b.{sid})"
+
+# Platzhalter für `excluded`: die materialisierte „Nicht entnommen?“-Menge statt einer ProbenNr-Liste
+SUSPECTED = object()
+
+# --------- Löschen (mit Audit)
+DELETE_CHUNK = 500          # Proben je DELETE-Block
+BUSY_TIMEOUT_MS = 30000     # Warten auf die Schreibsperre anderer SLIM-Clients
+
+_AUDIT_COLUMNS = """b.{sid} AS ProbenNr,
+               {TS} AS Abnahme,
+               b.{order_no} AS AuftragsNr,
+               COALESCE(NULLIF(b.{sender_info}, ''), b.{sender_id}) AS Einsender,
+               b.{last_name} AS Name, b.{first_name} AS Vname, b.{birth_date} AS GebDat, b.{patient_id} AS PatID"""
+# Audit-Details aller vorgemerkten Proben in EINEM Join (statt Abfrage + GROUP_CONCAT je Probe)
+_SQL_AUDIT_STAGED = """
+        SELECT {AUDIT_COLUMNS},
+               REPLACE(GROUP_CONCAT(DISTINCT t.{code}), ',', ', ') AS Analyte
+        FROM temp.del_ids d
+        JOIN {H} b ON b.{sid} = d.ProbenNr
+        LEFT JOIN {L} t ON t.{sid} = b.{sid}
+        GROUP BY d.seq
+        ORDER BY d.seq
+        """
+# Blockweise über die Reihenfolge der Vormerkung (seq), je Block ein kurzer Index-Lookup
+_SQL_DELETE_STAGED_LINES = "DELETE FROM {L} WHERE {sid} IN (SELECT ProbenNr FROM temp.del_ids WHERE seq > ? AND seq <= ?)"
+_SQL_DELETE_STAGED_HEADS = "DELETE FROM {H} WHERE {sid} IN (SELECT ProbenNr FROM temp.del_ids WHERE seq > ? AND seq <= ?)"
+
+
+# --------- Zeilen-Export (Befund ⋈ BefTag, gestreamt)
+EXPORT_BATCH = 10000        # Zeilen je fetchmany()
+EXPORT_COLUMNS = ("ProbenNr", "Zeit", "TestKB", "Analyt", "Ergebnis", "ErgbDatum")
+EXPORT_STATUS = {
+    "all": "",
+    "open": "AND t.{result} IS NULL",
+    "done": "AND t.{result} IS NOT NULL",
+}
+# Zeitraum über den Zeitindex, Zeilen je Probe über den Covering-Index; {ANALYTES} leer oder IN-Liste
+_SQL_EXPORT_LINES = """
+        SELECT b.{sid} AS ProbenNr,
+               {TS} AS Zeit,
+               t.{code} AS TestKB,
+               t.{name} AS Analyt,
+               t.{result} AS Ergebnis,
+               t.{result_ts} AS ErgbDatum
+        FROM {H} b
+        JOIN {L} t ON t.{sid} = b.{sid}
+        WHERE {TS} >= ?
+          AND {TS} <= ?
+          {ANALYTES}
+          {STATUS}
+          {EXCL}
+        """
+_EXPORT_ANALYTES_IN = "AND t.{code} IN ({IN})"
+
+
+# Zeit-Buckets als 'YYYY-MM-DD' des ersten Bucket-Tags (Woche beginnt Montag)
+_BUCKETS = {
+    "day": "DATE({TS})",
+    "week": "DATE({TS}, '-' || ((CAST(STRFTIME('%w', {TS}) AS INTEGER) + 6) % 7) || ' days')",
+    "month": "STRFTIME('%Y-%m-01', {TS})",
+}
+
+# Zeitraum zuerst (Zeitindex), danach BefTag über den Covering-Index je Probe.
+_SQL_REQUIREMENTS_PER_ANALYTE = """
+        SELECT t.{code} AS TestKB, COUNT(*) AS cnt
+        FROM {H} b
+        JOIN {L} t ON t.{sid} = b.{sid}
+        WHERE {TS} >= ?
+          AND {TS} <= ?
+          AND t.{code} IN ({IN})
+          {EXCL_SUSPECTED}
+        GROUP BY t.{code}
+        ORDER BY t.{code}
+        """
+
+# Monats-Export: alle Analyten und Monate des Zeitraums in einem Durchlauf (Ende exklusiv)
+_SQL_REQUIREMENTS_PER_MONTH = """
+        SELECT STRFTIME('%Y-%m', {TS}) AS month, t.{code} AS TestKB, COUNT(*) AS cnt
+        FROM {H} b
+        JOIN {L} t ON t.{sid} = b.{sid}
+        WHERE {TS} >= ?
+          AND {TS} < ?
+          {EXCL_SUSPECTED}
+        GROUP BY month, t.{code}
+        ORDER BY month, t.{code}
+        """
+
+# Ein Durchlauf über den Zeitindex; Status je Probe über die Zeilen-Prädikate
+# (mit Index: Covering-Index BefTag(ProbenNr, Ergebnis, TestKB)) statt GROUP BY über den Join.
+_SQL_BEFUND_STATUS = """
+        SELECT COUNT(*) AS total,
+               COALESCE(SUM(x.has_open), 0) AS opened,
+               COALESCE(SUM(x.has_lines AND NOT x.has_open), 0) AS done
+        FROM (
+            SELECT {HAS_OPEN} AS has_open,
+                   {HAS_LINES} AS has_lines
+            FROM {H} b
+            WHERE {TS} >= ?
+              AND {TS} <= ?
+              {EXCL_SUSPECTED}
+        ) x
+        """
+
+_SQL_WEEKDAY_ALL = """
+            SELECT STRFTIME('%w', {TS}) AS wd,
+                   COUNT(*) AS c
+            FROM {H} b
+            WHERE {TS} >= ?
+              AND {TS} <= ?
+              {EXCL_SUSPECTED}
+            GROUP BY wd
+            """
+
+_SQL_WEEKDAY_OPEN = """
+            SELECT STRFTIME('%w', {TS}) AS wd,
+                   COUNT(*) AS c
+            FROM {H} b
+            WHERE {TS} >= ?
+              AND {TS} <= ?
+              AND {HAS_OPEN}
+              {EXCL_SUSPECTED}
+            GROUP BY wd
+            """
+
 class Repository:
     """
     Dünne DB-Schicht (reine SQL-Queries).
-    Tabellen:
-      Befund(ProbenNr, TimeStamp, AbnahmeDatum, Name, Vname, GebDat, PatID, AuftragsNr,
+    Tabellen (Standard-Mapping, siehe config/mapping.json):
+      Befund(ProbenNr, TimeStamp, AbnahmeDatum, TransDatum, Name, Vname, GebDat, PatID, AuftragsNr,
              EinsenderInfo, EinsenderKennung, ...)
-      BefTag(ProbenNr, TestKB, Ergebnis, ...)
+      BefTag(ProbenNr, TestKB, Ergebnis, ErgbDatum, ...)
+    Alle Statements entstehen aus Vorlagen über self.sql (ein Compiler je Mapping-Hash).
     """
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, read_path: Optional[str] = None, mapping: Optional[Dict] = None):
         self.db_path = db_path
+        self.sql: SqlCompiler = compiler_for(mapping).register(
+            EXCL_SUSPECTED=_EXCL_SUSPECTED,
+            AUDIT_COLUMNS=_AUDIT_COLUMNS,
+        )
+        # Optional: lokale Kopie für Lesezugriffe (Snapshot); Schreiben geht immer an db_path
+        self.read_path = read_path
+        # Eine Lese-Verbindung pro Thread; _generation macht alte Verbindungen ungültig
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._line_slot_cache: Dict[str, Dict[str, str]] = {}
+        # Ergebnis-Cache der Lesemethoden (Schlüssel enthält data_version())
+        self.cache = ResultCache()
+        self._local_writes = 0
+
+    def _read_target(self) -> str:
+        return self.read_path or self.db_path
 
     def _available(self) -> bool:
+        path = self._read_target()
+        return bool(path) and os.path.exists(path)
+
+    def _source_available(self) -> bool:
         return bool(self.db_path) and os.path.exists(self.db_path)
 
+    def data_version(self) -> Tuple:
+        """
+        Versions-Token der gelesenen DB: Pfad + Mapping-Hash + mtime/Größe von DB und -wal
+        sowie ein Zähler eigener Schreibvorgänge (mtime ist auf Netzlaufwerken grob).
+        """
+        path = self._read_target()
+        sig: List[int] = []
+        for p in (path, path + "-wal"):
+            try:
+                st = os.stat(p)
+                sig += [st.st_mtime_ns, st.st_size]
+            except (OSError, TypeError):
+                sig += [0, 0]
+        return (path, self.sql.mapping_hash, self._local_writes, *sig)
+
+    # --------- Verbindungen
+    def set_db_path(self, db_path: str) -> None:
+        """Wechselt die Datenbank; bestehende Lese-Verbindungen werden verworfen."""
+        if db_path == self.db_path:
+            return
+        self.db_path = db_path
+        self.read_path = None
+        self.close()
+
+    def set_read_path(self, read_path: Optional[str]) -> None:
+        """Lesezugriffe auf eine andere Datei (Snapshot) umlenken bzw. zurück (None)."""
+        if read_path == self.read_path:
+            return
+        self.read_path = read_path
+        self.close()
+
+    def close(self) -> None:
+        """
+        Invalidiert alle Lese-Verbindungen. Die des aufrufenden Threads wird sofort
+        geschlossen, andere Threads öffnen beim nächsten Zugriff neu.
+        """
+        with self._lock:
+            self._generation += 1
+        self._drop_local()
+
+    def _drop_local(self) -> None:
+        con = getattr(self._local, "con", None)
+        self._local.con = None
+        self._local.suspected = None
+        self._local.lines = None
+        self._local.excl = None
+        if con is not None:
+            try:
+                con.close()
+            except Exception:
+                pass
+
+    def _open_read(self, path: Optional[str] = None) -> sqlite3.Connection:
+        uri = Path(path or self._read_target()).resolve().as_uri() + "?mode=ro"
+        con = sqlite3.connect(uri, uri=True, cached_statements=_STATEMENT_CACHE)
+        con.row_factory = sqlite3.Row
+        con.text_factory = _best_effort_decode
+        for pragma in _READ_PRAGMAS:
+            con.execute(pragma)
+        return con
+
     def _conn(self) -> sqlite3.Connection:
-        con = sqlite3.connect(self.db_path)
+        """
+        Langlebige Read-only-Verbindung des aktuellen Threads (mode=ro).
+        Gleiche SQL-Strings treffen so den Statement-Cache von sqlite3.
+        """
+        if getattr(self._local, "generation", None) != self._generation:
+            self._drop_local()
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._open_read()
+            self._local.con = con
+            self._local.generation = self._generation
+        return con
+
+    def _write_conn(self) -> sqlite3.Connection:
+        """Kurzlebige Schreib-Verbindung (Löschen, Indizes). Aufrufer schließt sie."""
+        con = sqlite3.connect(self.db_path, timeout=30)
         con.row_factory = sqlite3.Row
         con.text_factory = _best_effort_decode
         return con
 
+    # --------- Zeilen-Prädikate (je nach Index)
+    def _sid_indexed(self, con: sqlite3.Connection) -> bool:
+        """True, wenn ein Index (auch der des Primärschlüssels) der Zeilentabelle mit {sid} beginnt."""
+        sid = self.sql("{sid}").strip('"').replace('""', '"').lower()
+        for ix in con.execute(self.sql("PRAGMA index_list({L})")).fetchall():
+            name = '"' + str(ix[1]).replace('"', '""') + '"'
+            cols = [r[2] for r in con.execute(f"PRAGMA index_info({name})")]
+            if cols and str(cols[0]).lower() == sid:
+                return True
+        return False
+
+    def _line_mode(self, con: sqlite3.Connection) -> str:
+        """'probe' oder 'scan' (siehe _LINE_PREDICATES), einmal je Verbindung ermittelt."""
+        state = getattr(self._local, "lines", None)
+        if state is not None and state[0] is con:
+            return state[1]
+        mode = "probe" if self._sid_indexed(con) else "scan"
+        self._local.lines = (con, mode)
+        return mode
+
+    def _lines(self, con: sqlite3.Connection) -> Dict[str, str]:
+        """
+        Slots {HAS_LINES} {HAS_OPEN} {HAS_RESULT} {SAMPLE_STATUS} {SUSPECT_COND} passend zu den
+        Indizes der Verbindung: korrelierte Proben nur, wenn {L} einen Index auf {sid} hat –
+        sonst läse jede Probe die ganze Zeilentabelle.
+        """
+        mode = self._line_mode(con)
+        slots = self._line_slot_cache.get(mode)
+        if slots is None:
+            slots = {k: self.sql(v) for k, v in _LINE_PREDICATES[mode].items()}
+            slots["SAMPLE_STATUS"] = _SAMPLE_STATUS.format(**slots)
+            slots["SUSPECT_COND"] = _SUSPECT_COND.format(**slots)
+            self._line_slot_cache[mode] = slots
+        return slots
+
+    def _suspected(self, con: sqlite3.Connection) -> None:
+        """
+        Hält temp.suspected („Nicht entnommen?“) der Verbindung aktuell:
+        neu aufgebaut nur bei geänderter DB-Version, sonst kommen lediglich die Proben
+        hinzu, die seit dem letzten Aufruf älter als SUSPECT_HOURS geworden sind.
+        """
+        cutoff = (datetime.datetime.now() - datetime.timedelta(hours=SUSPECT_HOURS)).strftime("%Y-%m-%d %H:%M:%S")
+        version = self.data_version()
+        state = getattr(self._local, "suspected", None)
+        if state is not None and state[0] is con and state[1] == version:
+            lower = state[2]
+            if cutoff <= lower:
+                return
+        else:
+            con.execute(_SQL_SUSPECTED_CREATE)
+            con.execute("DELETE FROM temp.suspected")
+            lower = ""
+        con.execute(self.sql(_SQL_SUSPECTED_FILL, **self._lines(con)), (lower, cutoff))
+        con.commit()
+        self._local.suspected = (con, version, cutoff)
+
+    @contextmanager
+    def _exclusion(self, con: sqlite3.Connection, excluded: Optional[Iterable] = None) -> Iterator[str]:
+        """
+        Legt eine Exklusionsmenge (ProbenNr) in der TEMP-Tabelle temp.excl der Verbindung ab
+        und liefert die Anti-Join-Bedingung für Abfragen mit Alias b (leer, wenn nichts
+        auszuschließen ist). Die Tabelle bleibt bestehen und wird vor jeder Nutzung geleert,
+        damit die SQL-Texte gleich bleiben (SqlCompiler- und Statement-Cache). Nur solange ein
+        Generator temp.excl noch hält, weicht ein weiterer Aufruf auf excl_1, excl_2, … aus.
+        excluded=SUSPECTED nutzt die materialisierte „Nicht entnommen?“-Menge.
+        """
+        if excluded is SUSPECTED:
+            self._suspected(con)
+            yield self.sql(_EXCL_SUSPECTED)
+            return
+        if not excluded:
+            yield ""
+            return
+        state = getattr(self._local, "excl", None)
+        if state is None or state[0] is not con:
+            state = (con, set())
+            self._local.excl = state
+        in_use = state[1]
+        n = next(i for i in itertools.count() if i not in in_use)
+        name = "excl" if n == 0 else f"excl_{n}"
+        in_use.add(n)
+        try:
+            con.execute(f"CREATE TEMP TABLE IF NOT EXISTS {name}(ProbenNr PRIMARY KEY) WITHOUT ROWID")
+            con.execute(f"DELETE FROM temp.{name}")
+            con.executemany(f"INSERT OR IGNORE INTO temp.{name}(ProbenNr) VALUES (?)", ((p,) for p in excluded))
+            con.commit()
+            yield self.sql("AND NOT EXISTS (SELECT 1 FROM temp.{table} x WHERE x.ProbenNr = b.{sid})", table=name)
+        finally:
+            in_use.discard(n)
+            try:
+                con.execute(f"DELETE FROM temp.{name}")
+                con.commit()
+            except sqlite3.Error:
+                pass
+
+    # --------- Wartung: Indizes (opt-in, schreibt in die DB)
+    def _optimize_indexes(self) -> List[Tuple[str, str]]:
+        out = []
+        for name_tpl, ddl in _OPTIMIZE_INDEXES:
+            name = self.sql(name_tpl)
+            out.append((name, self.sql(ddl, index=name)))
+        return out
+
+    def _plan_queries(self, start: str, end: str, lines: Dict[str, str]) -> List[Tuple[str, str, tuple]]:
+        """Repräsentative Statements für den EXPLAIN-QUERY-PLAN-Bericht (lines = Repository._lines)."""
+        q_req, params_req = self.sql.with_in(_SQL_REQUIREMENTS_PER_ANALYTE, [""])
+        return [
+            ("Anforderungen pro Analyt", q_req, tuple([start, end] + params_req)),
+            ("Anforderungen pro Monat", self.sql(_SQL_REQUIREMENTS_PER_MONTH), (start, end)),
+            ("Zeilen-Export", self.sql(_SQL_EXPORT_LINES, ANALYTES="", STATUS="", EXCL=self.sql(_EXCL_SUSPECTED)),
+             (start, end)),
+            ("Befund-Status", self.sql(_SQL_BEFUND_STATUS, **lines), (start, end)),
+            ("Wochentage (alle)", self.sql(_SQL_WEEKDAY_ALL), (start, end)),
+            ("Wochentage (nur offene)", self.sql(_SQL_WEEKDAY_OPEN, **lines), (start, end)),
+            ("Nicht entnommen?", self.sql(_SQL_SUSPECTED_FILL, **lines), ("", end)),
+            ("Nicht entnommen? (Seite)", self.sql(_SQL_SUSPECTED_PAGE, **lines), (start, end, start, None, 500)),
+        ]
+
+    def explain_query_plans(self, start: str, end: str) -> Dict[str, List[str]]:
+        """Liefert je Statement die Zeilen aus EXPLAIN QUERY PLAN (Detail-Spalte) der Quell-DB."""
+        if not self._source_available():
+            return {}
+        out: Dict[str, List[str]] = {}
+        with closing(self._open_read(self.db_path)) as con:
+            con.execute(_SQL_SUSPECTED_CREATE)   # leer; nur für den Plan der Anti-Joins
+            for name, q, params in self._plan_queries(start, end, self._lines(con)):
+                out[name] = [r["detail"] for r in con.execute("EXPLAIN QUERY PLAN " + q, params)]
+        return out
+
+    def _index_names(self) -> set:
+        with closing(self._open_read(self.db_path)) as con:
+            return {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    def missing_indexes(self) -> List[str]:
+        if not self._source_available():
+            return []
+        have = self._index_names()
+        return [name for name, _ in self._optimize_indexes() if name not in have]
+
+    def optimize_database(self, start: str, end: str) -> Dict:
+        """
+        Legt die Indizes für Zeitfilter und BefTag-Joins an (IF NOT EXISTS), entfernt
+        überholte eigene Indizes, aktualisiert die Planer-Statistiken (ANALYZE) und liefert
+        die Query-Pläne vorher/nachher: {"created": [...], "dropped": [...], "before": {...}, "after": {...}}.
+        """
+        if not self._source_available():
+            raise FileNotFoundError(f"Datenbank nicht gefunden: {self.db_path}")
+        before = self.explain_query_plans(start, end)
+        created = self.missing_indexes()
+        wanted = {name for name, _ in self._optimize_indexes()}
+        dropped = [name for name in _LEGACY_INDEXES if name in self._index_names() and name not in wanted]
+        with closing(self._write_conn()) as con:
+            for name in dropped:
+                con.execute(f'DROP INDEX IF EXISTS "{name}"')
+            for _, ddl in self._optimize_indexes():
+                con.execute(ddl)
+            con.execute("ANALYZE")
+            con.commit()
+        self._local_writes += 1
+        # Lese-Verbindungen neu öffnen: sie wählen die Zeilen-Prädikate nach den neuen Indizes
+        self.close()
+        after = self.explain_query_plans(start, end)
+        return {"created": created, "dropped": dropped, "before": before, "after": after}
+
     # --------- Analyten
+    @cached()
     def list_all_analytes(self) -> List[str]:
         if not self._available():
             return []
-        q = "SELECT DISTINCT TestKB FROM BefTag WHERE TestKB IS NOT NULL AND TRIM(TestKB) <> '' ORDER BY TestKB"
+        q = self.sql("SELECT DISTINCT {code} FROM {L} WHERE {code} IS NOT NULL AND TRIM({code}) <> '' ORDER BY {code}")
         with self._conn() as con:
             return [r[0] for r in con.execute(q).fetchall()]
 
+    def lines_have_rowid(self) -> bool:
+        """
+        Hat die BefTag eine rowid? Bei WITHOUT-ROWID-Tabellen (oder Views) gibt es keine –
+        dann kann der Katalog nicht inkrementell über die rowid nachführen. Je Verbindung einmal geprüft.
+        """
+        if not self._available():
+            return False
+        with self._conn() as con:
+            state = getattr(self._local, "rowid", None)
+            if state is not None and state[0] is con:
+                return state[1]
+            try:
+                con.execute(self.sql("SELECT rowid FROM {L} LIMIT 0")).fetchall()
+                has = True
+            except sqlite3.OperationalError:
+                has = False
+            self._local.rowid = (con, has)
+        return has
+
+    def max_line_rowid(self) -> int:
+        """MAX(rowid) der BefTag – ein Sprung ans Ende des rowid-B-Baums, kein Scan."""
+        if not self._available():
+            return 0
+        with self._conn() as con:
+            return int(con.execute(self.sql("SELECT COALESCE(MAX(rowid), 0) FROM {L}")).fetchone()[0])
+
+    def line_rowid_stats(self, after_rowid: int) -> Tuple[int, int, int]:
+        """
+        (MAX(rowid), Anzahl Zeilen, davon mit rowid > after_rowid) der BefTag aus EINEM
+        Lese-Snapshot – für den Katalog: stimmt die Anzahl nicht mit Stand + Zuwachs
+        überein, wurden Zeilen gelöscht. Zählt die ganze Tabelle, daher nur gedrosselt aufrufen.
+        """
+        if not self._available():
+            return 0, 0, 0
+        with self._conn() as con:
+            con.execute("BEGIN")
+            try:
+                max_rowid = int(con.execute(self.sql("SELECT COALESCE(MAX(rowid), 0) FROM {L}")).fetchone()[0])
+                total = int(con.execute(self.sql("SELECT COUNT(*) FROM {L}")).fetchone()[0])
+                above = int(con.execute(self.sql("SELECT COUNT(*) FROM {L} WHERE rowid > ?"),
+                                        (after_rowid,)).fetchone()[0])
+            finally:
+                con.commit()
+        return max_rowid, total, above
+
+    def line_signature(self, rowid: int) -> str:
+        """'ProbenNr|TestKB' der BefTag-Zeile mit dieser rowid ('' = keine) – erkennt wiederverwendete rowids."""
+        if not self._available() or rowid <= 0:
+            return ""
+        with self._conn() as con:
+            r = con.execute(self.sql("SELECT {sid}, {code} FROM {L} WHERE rowid = ?"), (rowid,)).fetchone()
+        return "" if r is None else f"{r[0]}|{r[1] or ''}"
+
+    def analytes_seen_between(self, after_rowid: Optional[int],
+                              upto_rowid: Optional[int]) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        (code, erster, letzter Order-Zeitpunkt) für BefTag-Zeilen mit rowid in (after, upto] – für
+        den Katalog. after_rowid=None liest alle Zeilen (BefTag ohne rowid).
+        """
+        if not self._available():
+            return []
+        rows = "" if after_rowid is None else "t.rowid > ? AND t.rowid <= ? AND"
+        q = self.sql("""
+        SELECT t.{code}, MIN({TS}), MAX({TS})
+        FROM {L} t
+        LEFT JOIN {H} b ON b.{sid} = t.{sid}
+        WHERE {ROWS} t.{code} IS NOT NULL AND TRIM(t.{code}) <> ''
+        GROUP BY t.{code}
+        """, ROWS=rows)
+        params = () if after_rowid is None else (after_rowid, upto_rowid)
+        with self._conn() as con:
+            return [(r[0], r[1], r[2]) for r in con.execute(q, params)]
+
     # --------- Zählungen
+    @cached(ttl=60)  # Exklusion „Nicht entnommen?“ wächst mit der Uhrzeit
     def count_requirements_per_analyte(self, analytes: List[str], start: str, end: str) -> List[Tuple[str, int]]:
         if not self._available() or not analytes:
             return []
-        placeholders = ",".join("?" for _ in analytes)
-        q = f"""
-        SELECT t.TestKB, COUNT(*) AS cnt
-        FROM BefTag t
-        JOIN Befund b ON b.ProbenNr = t.ProbenNr
-        WHERE t.TestKB IN ({placeholders})
-          AND COALESCE(b.AbnahmeDatum, b.TimeStamp) >= ?
-          AND COALESCE(b.AbnahmeDatum, b.TimeStamp) <= ?
-        GROUP BY t.TestKB
-        ORDER BY t.TestKB
-        """
-        params = analytes + [start, end]
+        q, codes = self.sql.with_in(_SQL_REQUIREMENTS_PER_ANALYTE, analytes)
+        params = [start, end] + codes
         with self._conn() as con:
+            self._suspected(con)
             rows = con.execute(q, params).fetchall()
             return [(r["TestKB"], int(r["cnt"])) for r in rows]
 
+    def count_requirements_per_month(self, start: str, end: str) -> Dict[str, List[Tuple[str, int]]]:
+        """{'YYYY-MM': [(TestKB, Anzahl), …]} für start <= Zeit < end, ohne „Nicht entnommen?“."""
+        if not self._available():
+            return {}
+        out: Dict[str, List[Tuple[str, int]]] = {}
+        with self._conn() as con:
+            self._suspected(con)
+            for r in con.execute(self.sql(_SQL_REQUIREMENTS_PER_MONTH), (start, end)):
+                out.setdefault(r["month"], []).append((r["TestKB"], int(r["cnt"])))
+        return out
+
+    @cached(ttl=60)
     def count_befund_status(self, start: str, end: str) -> Tuple[int, int, int]:
         if not self._available():
             return 0, 0, 0
-        q_total = """
-        SELECT COUNT(*) AS c
-        FROM Befund b
-        WHERE COALESCE(b.AbnahmeDatum, b.TimeStamp) >= ?
-          AND COALESCE(b.AbnahmeDatum, b.TimeStamp) <= ?
-        """
-        q_open = """
-        SELECT COUNT(DISTINCT b.ProbenNr) AS c
-        FROM Befund b
-        JOIN BefTag t ON t.ProbenNr = b.ProbenNr
-        WHERE COALESCE(b.AbnahmeDatum, b.TimeStamp) >= ?
-          AND COALESCE(b.AbnahmeDatum, b.TimeStamp) <= ?
-          AND t.Ergebnis IS NULL
-        """
-        q_done = """
-        SELECT COUNT(*) AS c FROM (
-            SELECT b.ProbenNr
-            FROM Befund b
-            JOIN BefTag t ON t.ProbenNr = b.ProbenNr
-            WHERE COALESCE(b.AbnahmeDatum, b.TimeStamp) >= ?
-              AND COALESCE(b.AbnahmeDatum, b.TimeStamp) <= ?
-            GROUP BY b.ProbenNr
-            HAVING SUM(CASE WHEN t.Ergebnis IS NULL THEN 1 ELSE 0 END) = 0
-        ) x
-        """
         with self._conn() as con:
-            total = con.execute(q_total, (start, end)).fetchone()["c"]
-            opened = con.execute(q_open, (start, end)).fetchone()["c"]
-            done = con.execute(q_done, (start, end)).fetchone()["c"]
-        return int(total), int(opened), int(done)
+            self._suspected(con)
+            r = con.execute(self.sql(_SQL_BEFUND_STATUS, **self._lines(con)), (start, end)).fetchone()
+        return int(r["total"]), int(r["opened"]), int(r["done"])
 
+    @cached(ttl=60)
     def count_befunde_per_weekday(self, start: str, end: str, only_open: bool, analytes=None) -> Dict[str, int]:
         if not self._available():
             return {"Mo": 0, "Di": 0, "Mi": 0, "Do": 0, "Fr": 0, "Sa": 0, "So": 0}
-        if only_open:
-            q = """
-            SELECT STRFTIME('%w', COALESCE(b.AbnahmeDatum, b.TimeStamp)) AS wd,
-                   COUNT(DISTINCT b.ProbenNr) AS c
-            FROM Befund b
-            JOIN BefTag t ON t.ProbenNr = b.ProbenNr
-            WHERE COALESCE(b.AbnahmeDatum, b.TimeStamp) >= ?
-              AND COALESCE(b.AbnahmeDatum, b.TimeStamp) <= ?
-              AND t.Ergebnis IS NULL
-            GROUP BY wd
-            """
-            params = (start, end)
-        else:
-            q = """
-            SELECT STRFTIME('%w', COALESCE(b.AbnahmeDatum, b.TimeStamp)) AS wd,
-                   COUNT(*) AS c
-            FROM Befund b
-            WHERE COALESCE(b.AbnahmeDatum, b.TimeStamp) >= ?
-              AND COALESCE(b.AbnahmeDatum, b.TimeStamp) <= ?
-            GROUP BY wd
-            """
-            params = (start, end)
+        params = (start, end)
 
         wd_map = {"0": "So", "1": "Mo", "2": "Di", "3": "Mi", "4": "Do", "5": "Fr", "6": "Sa"}
         out: Dict[str, int] = {"Mo": 0, "Di": 0, "Mi": 0, "Do": 0, "Fr": 0, "Sa": 0, "So": 0}
         with self._conn() as con:
+            self._suspected(con)
+            q = self.sql(_SQL_WEEKDAY_OPEN if only_open else _SQL_WEEKDAY_ALL, **self._lines(con))
             for r in con.execute(q, params):
                 out[wd_map.get(r["wd"], "?")] = int(r["c"])
         return out
 
+    @cached(ttl=60)
+    def count_requirements_per_bucket(self, analytes: List[str], start: str, end: str,
+                                      granularity: str = "month") -> List[Tuple[str, str, int]]:
+        """Anforderungen je (Bucket-Anfang, Analyt) in einem gruppierten Durchlauf (dünn besetzt)."""
+        if not self._available() or not analytes:
+            return []
+        if granularity not in _BUCKETS:
+            raise ValueError(f"Unbekannte Granularität: {granularity}")
+        q, codes = self.sql.with_in("""
+        SELECT {BUCKET} AS bucket, t.{code} AS TestKB, COUNT(*) AS cnt
+        FROM {H} b
+        JOIN {L} t ON t.{sid} = b.{sid}
+        WHERE {TS} >= ?
+          AND {TS} <= ?
+          AND t.{code} IN ({IN})
+          {EXCL_SUSPECTED}
+        GROUP BY bucket, t.{code}
+        """, analytes, BUCKET=self.sql(_BUCKETS[granularity]))
+        with self._conn() as con:
+            self._suspected(con)
+            return [(r["bucket"], r["TestKB"], int(r["cnt"]))
+                    for r in con.execute(q, [start, end] + codes) if r["bucket"]]
+
+    @cached(ttl=60)
+    def count_befunde_per_weekday_hour(self, start: str, end: str, only_open: bool = False) -> Dict[Tuple[int, int], int]:
+        """
+        Proben je (Wochentag, Stunde) in einem gruppierten Durchlauf über den Zeitindex.
+        Wochentag 0 = Montag … 6 = Sonntag (wie datetime.weekday()), Stunde 0–23.
+        """
+        if not self._available():
+            return {}
+        out: Dict[Tuple[int, int], int] = {}
+        with self._conn() as con:
+            self._suspected(con)
+            lines = self._lines(con)
+            q = self.sql("""
+            SELECT CAST(STRFTIME('%w', {TS}) AS INTEGER) AS wd,
+                   CAST(STRFTIME('%H', {TS}) AS INTEGER) AS hh,
+                   COUNT(*) AS c
+            FROM {H} b
+            WHERE {TS} >= ?
+              AND {TS} <= ?
+              {OPEN}
+              {EXCL_SUSPECTED}
+            GROUP BY wd, hh
+            """, OPEN="AND " + lines["HAS_OPEN"] if only_open else "")
+            for r in con.execute(q, (start, end)):
+                if r["wd"] is not None and r["hh"] is not None:
+                    out[((int(r["wd"]) + 6) % 7, int(r["hh"]))] = int(r["c"])   # SQLite: 0 = Sonntag
+        return out
+
+    # --------- Tages-Rollups (Quelle für RollupStore; Tage als 'YYYY-MM-DD', Ende exklusiv)
+    def max_befund_rowid(self) -> int:
+        if not self._available():
+            return 0
+        with self._conn() as con:
+            return int(con.execute(self.sql("SELECT COALESCE(MAX(rowid), 0) FROM {H}")).fetchone()[0])
+
+    def first_befund_day(self) -> Optional[str]:
+        if not self._available():
+            return None
+        with self._conn() as con:
+            r = con.execute(self.sql("SELECT DATE(MIN({TS})) FROM {H} b")).fetchone()
+        return r[0] if r else None
+
+    def days_with_rows_after(self, rowid: int) -> List[str]:
+        """Tage, an denen seit dem High-Water-Mark (rowid) Proben hinzugekommen sind."""
+        if not self._available():
+            return []
+        q = self.sql("SELECT DISTINCT DATE({TS}) FROM {H} b WHERE b.rowid > ? AND {TS} IS NOT NULL")
+        with self._conn() as con:
+            return [r[0] for r in con.execute(q, (rowid,)) if r[0]]
+
+    def daily_sample_status(self, start_day: str, end_day: str) -> List[Tuple[str, str, int]]:
+        if not self._available():
+            return []
+        with self._conn() as con:
+            return [(r["day"], r["status"], int(r["n"]))
+                    for r in con.execute(self.sql(_SQL_DAILY_SAMPLE_STATUS, **self._lines(con)),
+                                         (start_day, end_day))]
+
+    def daily_analyte_status(self, start_day: str, end_day: str) -> List[Tuple[str, str, str, int]]:
+        if not self._available():
+            return []
+        with self._conn() as con:
+            return [(r["day"], r["TestKB"], r["status"], int(r["n"]))
+                    for r in con.execute(self.sql(_SQL_DAILY_ANALYTE_STATUS, **self._lines(con)),
+                                         (start_day, end_day))]
+
+    # --------- Durchlaufzeiten (TAT: Abnahme -> Ergebnis)
+    def iter_turnaround_minutes(self, start: str, end: str, batch: int = 5000) -> Iterator[Tuple[str, str, float]]:
+        """
+        Streamt (Tag der Abnahme, TestKB, TAT in Minuten) je Ergebniszeile mit ErgbDatum.
+        Tag 'YYYY-MM-DD', Bereich [start, end]; negative Zeiten (Uhrzeitfehler) werden übersprungen.
+        """
+        if not self._available():
+            return
+        q = self.sql("""
+        SELECT DATE({TS}) AS day, t.{code},
+               (JULIANDAY(t.{result_ts}) - JULIANDAY({TS})) * 1440.0 AS tat
+        FROM {H} b
+        JOIN {L} t ON t.{sid} = b.{sid}
+        WHERE {TS} >= ?
+          AND {TS} <= ?
+          AND t.{result} IS NOT NULL
+          AND t.{result_ts} IS NOT NULL
+          AND t.{code} IS NOT NULL
+        """)
+        with self._conn() as con:
+            cur = con.execute(q, (start, end))
+            try:
+                while True:
+                    rows = cur.fetchmany(batch)
+                    if not rows:
+                        break
+                    for day, code, tat in rows:
+                        if day and tat is not None and tat >= 0:
+                            yield day, code, tat
+            finally:
+                cur.close()
+
+    # --------- Zeilen-Export
+    def iter_export_batches(self, start: str, end: str, analytes: Optional[Sequence[str]] = None,
+                            status: str = "all", excluded: Optional[Iterable] = SUSPECTED,
+                            batch: int = EXPORT_BATCH) -> Iterator[List[Tuple]]:
+        """
+        Streamt Befund ⋈ BefTag (Spalten EXPORT_COLUMNS) für [start, end] in Blöcken zu
+        `batch` Zeilen (fetchmany) – der Speicher hängt nur von der Blockgröße ab.
+        analytes: TestKB-Codes (None = alle); status: Schlüssel von EXPORT_STATUS (je Zeile);
+        excluded: wie bei den Zählungen (Standard: ohne „Nicht entnommen?“, None = alles).
+        """
+        if status not in EXPORT_STATUS:
+            raise ValueError(f"Unbekannter Status: {status}")
+        if not self._available() or (analytes is not None and not analytes):
+            return
+        with self._conn() as con, self._exclusion(con, excluded) as excl:
+            slots = {"STATUS": self.sql(EXPORT_STATUS[status]), "EXCL": excl}
+            if analytes:
+                tpl = _SQL_EXPORT_LINES.replace("{ANALYTES}", _EXPORT_ANALYTES_IN)
+                q, codes = self.sql.with_in(tpl, analytes, **slots)
+            else:
+                q, codes = self.sql(_SQL_EXPORT_LINES, ANALYTES="", **slots), []
+            cur = con.execute(q, [start, end] + codes)
+            try:
+                while True:
+                    rows = cur.fetchmany(batch)
+                    if not rows:
+                        break
+                    yield [tuple(r) for r in rows]
+            finally:
+                cur.close()
+
+    # --------- StatsService-Vertrag (mengenbasiert; Exklusion als Anti-Join in SQL)
+    def count_analyte_requests(self, analyte_code: str, start: str, end: str,
+                               excluded: Optional[Iterable] = None) -> int:
+        if not self._available():
+            return 0
+        with self._conn() as con, self._exclusion(con, excluded) as excl:
+            q = self.sql("""
+            SELECT COUNT(*)
+            FROM {H} b
+            JOIN {L} t ON t.{sid} = b.{sid}
+            WHERE {TS} >= ?
+              AND {TS} <= ?
+              AND t.{code} = ?
+              {EXCL}
+            """, EXCL=excl)
+            return int(con.execute(q, (start, end, analyte_code)).fetchone()[0])
+
+    def completion_totals(self, start: str, end: str, excluded: Optional[Iterable] = None) -> Dict[str, int]:
+        """Offen/fertig/alle über Proben mit mind. einer Anforderung – nur Summen, keine Einzelproben."""
+        if not self._available():
+            return {"open": 0, "done": 0, "all": 0}
+        with self._conn() as con, self._exclusion(con, excluded) as excl:
+            q = self.sql("""
+            SELECT COUNT(*) AS total, COALESCE(SUM(x.has_open), 0) AS opened
+            FROM (
+                SELECT {HAS_OPEN} AS has_open
+                FROM {H} b
+                WHERE {TS} >= ?
+                  AND {TS} <= ?
+                  AND {HAS_LINES}
+                  {EXCL}
+            ) x
+            """, EXCL=excl, **self._lines(con))
+            r = con.execute(q, (start, end)).fetchone()
+        total, opened = int(r["total"]), int(r["opened"])
+        return {"open": opened, "done": total - opened, "all": total}
+
+    def per_sample_completion(self, start: str, end: str,
+                              excluded: Optional[Iterable] = None) -> Iterator[Tuple[str, str]]:
+        """Streamt (ProbenNr, 'open'|'done') je Probe mit Anforderungen (ohne Zwischen-Dict)."""
+        if not self._available():
+            return
+        with self._conn() as con, self._exclusion(con, excluded) as excl:
+            q = self.sql("""
+            SELECT b.{sid},
+                   CASE WHEN {HAS_OPEN} THEN 'open' ELSE 'done' END AS status
+            FROM {H} b
+            WHERE {TS} >= ?
+              AND {TS} <= ?
+              AND {HAS_LINES}
+              {EXCL}
+            """, EXCL=excl, **self._lines(con))
+            cur = con.execute(q, (start, end))
+            try:
+                for r in cur:
+                    yield r[0], r[1]
+            finally:
+                cur.close()
+
+    def weekday_counts_multi(self, status: str, analytes: List[str], start: str, end: str,
+                             excluded: Optional[Iterable] = None) -> Dict[int, int]:
+        """
+        Proben je Wochentag (0 = Montag … 6 = Sonntag, wie datetime.weekday()).
+        status: 'all' | 'open' | 'done'; analytes: nur Proben mit mind. einer dieser Anforderungen.
+        """
+        out = {i: 0 for i in range(7)}
+        if not self._available():
+            return out
+        params: List = [start, end]
+        with self._conn() as con, self._exclusion(con, excluded) as excl:
+            lines = self._lines(con)
+            cond_sql = {
+                "open": "AND " + lines["HAS_OPEN"],
+                "done": f"AND {lines['HAS_LINES']} AND NOT {lines['HAS_OPEN']}",
+            }.get(status, "")
+            if analytes:
+                cond_sql, codes = self.sql.with_in("{COND} AND " + _HAS_CODE_IN[self._line_mode(con)],
+                                                   analytes, COND=cond_sql)
+                params += codes
+            q = self.sql("""
+            SELECT CAST(STRFTIME('%w', {TS}) AS INTEGER) AS wd, COUNT(*) AS c
+            FROM {H} b
+            WHERE {TS} >= ?
+              AND {TS} <= ?
+              {COND}
+              {EXCL}
+            GROUP BY wd
+            """, COND=cond_sql, EXCL=excl)
+            for r in con.execute(q, params):
+                if r["wd"] is not None:
+                    out[(int(r["wd"]) + 6) % 7] = int(r["c"])   # SQLite: 0 = Sonntag
+        return out
+
+    def open_analytes_per_sample_since(self, since: str,
+                                       excluded: Optional[Iterable] = None) -> Iterator[Tuple[str, ...]]:
+        """Streamt je Probe die sortierten offenen Analyt-Codes (ohne GROUP_CONCAT-Strings)."""
+        if not self._available():
+            return
+        with self._conn() as con, self._exclusion(con, excluded) as excl:
+            q = self.sql("""
+            SELECT b.{sid}, t.{code}
+            FROM {H} b
+            JOIN {L} t ON t.{sid} = b.{sid}
+            WHERE t.{result} IS NULL
+              AND t.{code} IS NOT NULL
+              AND {TS} >= ?
+              {EXCL}
+            ORDER BY b.{sid}, t.{code}
+            """, EXCL=excl)
+            cur = con.execute(q, (since,))
+            try:
+                for _, grp in itertools.groupby(cur, key=lambda r: r[0]):
+                    codes = tuple(sorted({r[1].strip() for r in grp if r[1] and r[1].strip()}))
+                    if codes:
+                        yield codes
+            finally:
+                cur.close()
+
     # --------- Offene Anforderungen
     def count_open_requirements_per_analyte(self, analytes: List[str], since: str) -> List[Tuple[str, int]]:
         if not self._available() or not analytes:
             return []
-        placeholders = ",".join("?" for _ in analytes)
-        q = f"""
-        SELECT t.TestKB, COUNT(*) AS cnt
-        FROM BefTag t
-        JOIN Befund b ON b.ProbenNr = t.ProbenNr
-        WHERE t.TestKB IN ({placeholders})
-          AND t.Ergebnis IS NULL
-          AND COALESCE(b.AbnahmeDatum, b.TimeStamp) >= ?
-        GROUP BY t.TestKB
-        ORDER BY t.TestKB
-        """
-        params = analytes + [since]
+        q, codes = self.sql.with_in("""
+        SELECT t.{code} AS TestKB, COUNT(*) AS cnt
+        FROM {L} t
+        JOIN {H} b ON b.{sid} = t.{sid}
+        WHERE t.{code} IN ({IN})
+          AND t.{result} IS NULL
+          AND {TS} >= ?
+          {EXCL_SUSPECTED}
+        GROUP BY t.{code}
+        ORDER BY t.{code}
+        """, analytes)
+        params = codes + [since]
         with self._conn() as con:
+            self._suspected(con)
             rows = con.execute(q, params).fetchall()
             return [(r["TestKB"], int(r["cnt"])) for r in rows]
 
     # --------- Nicht entnommen?
-    def list_suspected_missing_draw(self, older_than_hours: int = 24) -> List[Dict]:
-        if not self._available():
-            return []
-        q = f"""
-        SELECT b.ProbenNr,
-               COALESCE(b.AbnahmeDatum, b.TimeStamp) AS ts,
-               COUNT(t.TestKB) AS num_req,
-               REPLACE(GROUP_CONCAT(DISTINCT t.TestKB), ',', ', ') AS analytes
-        FROM Befund b
-        JOIN BefTag t ON t.ProbenNr = b.ProbenNr
-        GROUP BY b.ProbenNr
-        HAVING num_req >= 1
-           AND SUM(CASE WHEN t.Ergebnis IS NULL THEN 0 ELSE 1 END) = 0
-           AND ts <= DATETIME('now', '-{older_than_hours} hours')
-        ORDER BY ts ASC
+    def suspected_missing_draw_page(self, after: Optional[Tuple[str, object]] = None, limit: int = 500,
+                                    lookback_days: int = 0, older_than_hours: int = SUSPECT_HOURS,
+                                    ) -> Tuple[Tuple[List, List, List, List], Optional[Tuple[str, object]]]:
+        """
+        Eine Seite der „Nicht entnommen?“-Liste, aufsteigend nach (Order-Zeit, ProbenNr).
+        after = Schlüssel (ts, ProbenNr) der letzten Zeile der Vorseite (None = erste Seite);
+        lookback_days > 0 begrenzt die Liste auf die letzten n Tage (0 = ohne Untergrenze).
+        Rückgabe: Spalten (ProbenNr, OrderTime, NumReq, Analytes) und Schlüssel der nächsten
+        Seite (None = letzte Seite).
         """
+        cols: Tuple[List, List, List, List] = ([], [], [], [])
+        if not self._available():
+            return cols, None
+        now = datetime.datetime.now()
+        cutoff = (now - datetime.timedelta(hours=int(older_than_hours))).strftime("%Y-%m-%d %H:%M:%S")
+        lower = ((now - datetime.timedelta(days=int(lookback_days))).strftime("%Y-%m-%d %H:%M:%S")
+                 if int(lookback_days) > 0 else "")
+        # Erste Seite: ProbenNr > NULL ist nie wahr -> nur ts > lower
+        after_ts, after_sid = after if after is not None else (lower, None)
+        after_ts = max(after_ts or "", lower)
+        limit = max(1, int(limit))
+        with self._conn() as con:
+            page = con.execute(self.sql(_SQL_SUSPECTED_PAGE, **self._lines(con)),
+                               (after_ts, cutoff, after_ts, after_sid, limit)).fetchall()
+            if not page:
+                return cols, None
+            q, ids = self.sql.with_in(_SQL_SUSPECTED_PAGE_ANALYTES, [r["ProbenNr"] for r in page])
+            detail = {r["ProbenNr"]: (int(r["num_req"]), r["analytes"] or "") for r in con.execute(q, ids)}
+        p, ts, n, a = cols
+        for r in page:
+            num, names = detail.get(r["ProbenNr"], (0, ""))
+            p.append(r["ProbenNr"]); ts.append(r["ts"]); n.append(num); a.append(names)
+        last = page[-1]
+        return cols, ((last["ts"], last["ProbenNr"]) if len(page) == limit else None)
+
+    @cached(ttl=60)
+    def suspected_missing_blood_draw_proben(self, now: Optional[datetime.datetime] = None,
+                                            older_than_hours: int = SUSPECT_HOURS) -> frozenset:
+        """ProbenNr aller „Nicht entnommen?“-Fälle (Grenze relativ zu now, Ortszeit)."""
+        if not self._available():
+            return frozenset()
         with self._conn() as con:
-            rows = con.execute(q).fetchall()
-            return [{
-                "ProbenNr": r["ProbenNr"],
-                "OrderTime": r["ts"],
-                "NumReq": int(r["num_req"]),
-                "Analytes": r["analytes"] or "",
-            } for r in rows]
+            if now is None and int(older_than_hours) == SUSPECT_HOURS:
+                self._suspected(con)
+                return frozenset(r[0] for r in con.execute("SELECT ProbenNr FROM temp.suspected"))
+            cutoff = (now or datetime.datetime.now()) - datetime.timedelta(hours=older_than_hours)
+            q = self.sql("SELECT b.{sid} FROM {H} b WHERE {TS} <= ? AND {SUSPECT_COND}", **self._lines(con))
+            return frozenset(r[0] for r in con.execute(q, (cutoff.strftime("%Y-%m-%d %H:%M:%S"),)))
+
+    @staticmethod
+    def _audit_info(r: sqlite3.Row) -> Dict:
+        return {
+            "ProbenNr": r["ProbenNr"],
+            "Abnahme": r["Abnahme"],
+            "AuftragsNr": r["AuftragsNr"],
+            "Einsender": r["Einsender"],
+            "Name": r["Name"],
+            "Vname": r["Vname"],
+            "GebDat": r["GebDat"],
+            "PatID": r["PatID"],
+            "Analyte": r["Analyte"] or "",
+        }
 
     def get_sample_audit_info(self, proben_nr: str) -> Optional[Dict]:
         if not self._available():
             return None
-        q = """
-        SELECT b.ProbenNr,
-               COALESCE(b.AbnahmeDatum, b.TimeStamp) AS Abnahme,
-               b.AuftragsNr,
-               COALESCE(NULLIF(b.EinsenderInfo, ''), b.EinsenderKennung) AS Einsender,
-               b.Name, b.Vname, b.GebDat, b.PatID,
+        q = self.sql("""
+        SELECT {AUDIT_COLUMNS},
                REPLACE(
-                   (SELECT GROUP_CONCAT(DISTINCT t.TestKB)
-                    FROM BefTag t WHERE t.ProbenNr=b.ProbenNr),
+                   (SELECT GROUP_CONCAT(DISTINCT t.{code})
+                    FROM {L} t WHERE t.{sid}=b.{sid}),
                    ',', ', '
                ) AS Analyte
-        FROM Befund b
-        WHERE b.ProbenNr = ?
-        """
+        FROM {H} b
+        WHERE b.{sid} = ?
+        """)
         with self._conn() as con:
             r = con.execute(q, (proben_nr,)).fetchone()
-            if not r:
-                return None
-            return {
-                "ProbenNr": r["ProbenNr"],
-                "Abnahme": r["Abnahme"],
-                "AuftragsNr": r["AuftragsNr"],
-                "Einsender": r["Einsender"],
-                "Name": r["Name"],
-                "Vname": r["Vname"],
-                "GebDat": r["GebDat"],
-                "PatID": r["PatID"],
-                "Analyte": r["Analyte"] or "",
-            }
+            return self._audit_info(r) if r else None
+
+    def existing_proben(self, proben_nrs: List[str]) -> set:
+        """Welche der ProbenNr es in der Quell-DB (nicht im Snapshot) noch gibt."""
+        if not self._source_available() or not proben_nrs:
+            return set()
+        out = set()
+        with closing(self._open_read(self.db_path)) as con:
+            for lo in range(0, len(proben_nrs), DELETE_CHUNK):
+                q, params = self.sql.with_in("SELECT b.{sid} FROM {H} b WHERE b.{sid} IN ({IN})",
+                                             proben_nrs[lo:lo + DELETE_CHUNK])
+                out.update(r[0] for r in con.execute(q, params))
+        return out
+
+    def get_deleted_sample_details(self, proben_nr: str) -> Optional[Dict]:
+        """Audit-Details im Format von AuditService.append_deleted."""
+        info = self.get_sample_audit_info(proben_nr)
+        if info is None:
+            return None
+        return {
+            "ProbenNr": info["ProbenNr"],
+            "Name": info["Name"] or "",
+            "VName": info["Vname"] or "",
+            "EntnahmeTag": (info["Abnahme"] or "")[:10],
+            "AuftragsNr": info["AuftragsNr"] or "",
+            "Einsender": info["Einsender"] or "",
+            "AnalyteList": info["Analyte"],
+        }
 
     def delete_sample(self, proben_nr: str) -> int:
         return self.delete_samples([proben_nr])
 
-    def delete_samples(self, proben_nrs: List[str]) -> int:
-        if not self._available() or not proben_nrs:
+    def delete_samples(self, proben_nrs: List[str],
+                       audit: Optional[Callable[[List[Dict]], None]] = None,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       chunk: int = DELETE_CHUNK) -> int:
+        """
+        Löscht Proben (BefTag + Befund) in EINER Transaktion, blockweise zu `chunk` Proben.
+          - ProbenNr werden in temp.del_ids vorgemerkt (kein IN mit tausenden Parametern)
+          - audit(infos): Audit-Details aller vorhandenen Proben aus einem Join, aufgerufen
+            VOR dem ersten DELETE; eine Exception dort bricht ohne Löschung ab
+          - progress(erledigt, gesamt) nach jedem Block
+        Rückgabe: Anzahl gelöschter DB-Zeilen.
+        """
+        if not self._source_available() or not proben_nrs:
             return 0
-        placeholders = ",".join("?" for _ in proben_nrs)
-        with self._conn() as con:
-            c1 = con.execute(f"DELETE FROM BefTag WHERE ProbenNr IN ({placeholders})", proben_nrs).rowcount
-            c2 = con.execute(f"DELETE FROM Befund WHERE ProbenNr IN ({placeholders})", proben_nrs).rowcount
-            con.commit()
-            return int(c1 + c2)
+        chunk = max(1, int(chunk))
+        with closing(self._write_conn()) as con:
+            con.isolation_level = None   # Transaktion selbst steuern
+            con.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            try:
+                # Schreibsperre sofort holen: wartet bis busy_timeout statt mitten im Löschen abzubrechen
+                con.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as ex:
+                raise RuntimeError(f"Datenbank ist gesperrt (anderer Schreibzugriff), bitte später erneut versuchen: {ex}") from ex
+            try:
+                con.execute("CREATE TEMP TABLE IF NOT EXISTS del_ids(seq INTEGER PRIMARY KEY, ProbenNr UNIQUE)")
+                con.execute("DELETE FROM temp.del_ids")
+                con.executemany("INSERT OR IGNORE INTO temp.del_ids(ProbenNr) VALUES (?)", ((p,) for p in proben_nrs))
+                total = con.execute("SELECT COUNT(*) FROM temp.del_ids").fetchone()[0]
+                if audit is not None:
+                    audit([self._audit_info(r) for r in con.execute(self.sql(_SQL_AUDIT_STAGED))])
+                q_lines, q_heads = self.sql(_SQL_DELETE_STAGED_LINES), self.sql(_SQL_DELETE_STAGED_HEADS)
+                deleted = 0
+                if progress is not None:
+                    progress(0, total)
+                for lo in range(0, total, chunk):
+                    hi = min(lo + chunk, total)
+                    deleted += con.execute(q_lines, (lo, hi)).rowcount
+                    deleted += con.execute(q_heads, (lo, hi)).rowcount
+                    if progress is not None:
+                        progress(hi, total)
+                con.execute("DELETE FROM temp.del_ids")
+                con.execute("COMMIT")
+            except BaseException:
+                if con.in_transaction:
+                    con.execute("ROLLBACK")
+                raise
+        self._local_writes += 1
+        return int(deleted)
 
     # --------- Singlets / Kombinationen (1–4)
-    import itertools
-    # ... Rest unverändert ...
-
-    def open_combo_stats(self, since: str, excluded: Optional[set] = None, max_k: int = 4):
+    @cached(ttl=60)
+    def open_combo_stats(self, since: str, max_k: Optional[int] = 4) -> Tuple[List[str], Dict[int, int]]:
         """
-        EXAKT-Größen-Logik:
-          - 1er: nur Proben mit GENAU 1 offenem Analyt
-          - 2er/3er/4er: nur Proben mit GENAU 2/3/4 offenen Analyten
-        WICHTIG: 'excluded' wird HIER NICHT angewendet, um die reale offene Matrix
-                 der Probe nicht zu verfälschen (keine Teilmengenbildung).
+        EXAKTE offene Matrizen als Bitmasken: (codes, {maske: anzahl_proben}).
+          - Bit i steht für codes[i] (alphabetisch, damit die Id-Reihenfolge der Code-Reihenfolge entspricht)
+          - nur Proben mit 1..max_k offenen Analyten (max_k=None: alle Größen, z. B. für logic.itemsets);
+            Strings baut erst der Controller für die Top-N
+        „Nicht entnommen?“-Proben fallen immer ganz heraus. Ausgeschlossene Analyten werden
+        hier bewusst NICHT entfernt, um die reale offene Matrix der Probe nicht zu verfälschen
+        (keine Teilmengenbildung).
         """
         if not self._available():
-            return {}, {}, {}, {}
+            return [], {}
 
-        q = """
-        SELECT b.ProbenNr, GROUP_CONCAT(DISTINCT t.TestKB) AS ks
-        FROM Befund b
-        JOIN BefTag t ON t.ProbenNr = b.ProbenNr
-        WHERE t.Ergebnis IS NULL
-          AND COALESCE(b.AbnahmeDatum, b.TimeStamp) >= ?
-        GROUP BY b.ProbenNr
-        """
-
-        singles: Dict[str, int] = {}
-        pairs: Dict[str, int] = {}
-        trips: Dict[str, int] = {}
-        quads: Dict[str, int] = {}
+        q = self.sql("""
+        SELECT b.{sid}, t.{code}
+        FROM {H} b
+        JOIN {L} t ON t.{sid} = b.{sid}
+        WHERE t.{result} IS NULL
+          AND t.{code} IS NOT NULL
+          AND {TS} >= ?
+          {EXCL_SUSPECTED}
+        """)
+        max_k = max(1, int(max_k)) if max_k is not None else None
 
-        max_k = max(1, min(4, int(max_k)))
+        # Ids in Reihenfolge des ersten Auftretens; am Ende alphabetisch umnummeriert
+        codes: List[str] = []
+        ids: Dict[str, int] = {}
+        bits: Dict[str, int] = {}            # roher TestKB -> Bit (inkl. Leerzeichen-Varianten)
+        per_sample: Dict[str, int] = {}
 
         with self._conn() as con:
-            for r in con.execute(q, (since,)):
-                raw = (r["ks"] or "")
-                # deduplizieren + sortieren
-                ks = sorted({s.strip() for s in raw.split(",") if s and s.strip()})
-                n = len(ks)
-                if n == 0:
-                    continue
-
-                if n == 1 and max_k >= 1:
-                    singles[ks[0]] = singles.get(ks[0], 0) + 1
-                elif n == 2 and max_k >= 2:
-                    key = " + ".join(ks)
-                    pairs[key] = pairs.get(key, 0) + 1
-                elif n == 3 and max_k >= 3:
-                    key = " + ".join(ks)
-                    trips[key] = trips.get(key, 0) + 1
-                elif n == 4 and max_k >= 4:
-                    key = " + ".join(ks)
-                    quads[key] = quads.get(key, 0) + 1
-
-        return singles, pairs, trips, quads
+            self._suspected(con)
+            for p, raw in con.execute(q, (since,)):
+                bit = bits.get(raw)
+                if bit is None:
+                    code = raw.strip()
+                    if not code:
+                        bits[raw] = 0
+                        continue
+                    if code not in ids:
+                        ids[code] = len(codes)
+                        codes.append(code)
+                    bit = bits[raw] = 1 << ids[code]
+                if bit:
+                    per_sample[p] = per_sample.get(p, 0) | bit
+
+        counts: Dict[int, int] = {}
+        for mask in per_sample.values():
+            counts[mask] = counts.get(mask, 0) + 1
+        if any(a > b for a, b in zip(codes, codes[1:])):
+            # Codes alphabetisch sortieren und Bits umnummerieren (Id-Reihenfolge = Code-Reihenfolge)
+            order = sorted(range(len(codes)), key=codes.__getitem__)
+            new_id = {old: new for new, old in enumerate(order)}
+            codes = [codes[i] for i in order]
+            remapped: Dict[int, int] = {}
+            for mask, n in counts.items():
+                m = sum(1 << new_id[i] for i in mask_ids(mask))
+                remapped[m] = remapped.get(m, 0) + n
+            counts = remapped
+        if max_k is None:
+            return codes, counts
+        return codes, {m: n for m, n in counts.items() if bin(m).count("1") <= max_k}
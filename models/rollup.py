@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+-- Proben je Tag und Status (empty/none/open/done)
+CREATE TABLE IF NOT EXISTS sample_daily (
+    day    TEXT NOT NULL,
+    status TEXT NOT NULL,
+    n      INTEGER NOT NULL,
+    PRIMARY KEY (day, status)
+) WITHOUT ROWID;
+-- Anforderungen (BefTag-Zeilen) je Tag × Analyt × Status der Probe
+CREATE TABLE IF NOT EXISTS analyte_daily (
+    day     TEXT NOT NULL,
+    analyte TEXT NOT NULL,
+    status  TEXT NOT NULL,
+    n       INTEGER NOT NULL,
+    PRIMARY KEY (day, analyte, status)
+) WITHOUT ROWID;
+-- Durchlaufzeit-Sketches (KLL, JSON) je Tag × Analyt
+CREATE TABLE IF NOT EXISTS tat_daily (
+    day     TEXT NOT NULL,
+    analyte TEXT NOT NULL,
+    sketch  TEXT NOT NULL,
+    PRIMARY KEY (day, analyte)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dirty_day (
+    day TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+
+class RollupStore:
+    """
+    Lokale Sidecar-SQLite mit Tages-Aggregaten der Zählstatistiken.
+    Tage sind 'YYYY-MM-DD'; Bereiche immer [start_day, end_day) (Ende exklusiv).
+    """
+    # Erhöhen, wenn neue Aggregate hinzukommen: ältere Sidecars werden dann neu aufgebaut
+    SCHEMA_VERSION = "2"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        with closing(self._connect()) as con:
+            con.executescript(_SCHEMA)
+        if self.get_meta("schema") != self.SCHEMA_VERSION:
+            self.reset()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("PRAGMA journal_mode = WAL")
+        con.execute("PRAGMA synchronous = NORMAL")
+        return con
+
+    # --------- Meta
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with closing(self._connect()) as con:
+            r = con.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return r[0] if r else default
+
+    def set_meta(self, values: Dict[str, str]) -> None:
+        with self._lock, closing(self._connect()) as con:
+            con.executemany("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", list(values.items()))
+            con.commit()
+
+    def reset(self) -> None:
+        with self._lock, closing(self._connect()) as con:
+            for table in ("meta", "sample_daily", "analyte_daily", "tat_daily", "dirty_day"):
+                con.execute(f"DELETE FROM {table}")
+            con.execute("INSERT INTO meta(key, value) VALUES ('schema', ?)", (self.SCHEMA_VERSION,))
+            con.commit()
+
+    # --------- Schreiben
+    def mark_dirty(self, days: Iterable[str]) -> None:
+        """Tage zur Neuberechnung vormerken (z. B. nach Löschungen)."""
+        rows = [(d,) for d in {d for d in days if d}]
+        if not rows:
+            return
+        with self._lock, closing(self._connect()) as con:
+            con.executemany("INSERT OR IGNORE INTO dirty_day(day) VALUES (?)", rows)
+            con.commit()
+
+    def dirty_days(self) -> List[str]:
+        with closing(self._connect()) as con:
+            return [r[0] for r in con.execute("SELECT day FROM dirty_day ORDER BY day")]
+
+    def replace_range(
+        self,
+        start_day: str,
+        end_day: str,
+        sample_rows: Iterable[Tuple[str, str, int]],
+        analyte_rows: Iterable[Tuple[str, str, str, int]],
+        tat_rows: Iterable[Tuple[str, str, str]] = (),
+    ) -> None:
+        """Ersetzt alle Aggregate in [start_day, end_day) in einer Transaktion."""
+        with self._lock, closing(self._connect()) as con:
+            for table in ("sample_daily", "analyte_daily", "tat_daily", "dirty_day"):
+                con.execute(f"DELETE FROM {table} WHERE day >= ? AND day < ?", (start_day, end_day))
+            con.executemany("INSERT INTO sample_daily(day, status, n) VALUES (?, ?, ?)", sample_rows)
+            con.executemany("INSERT INTO analyte_daily(day, analyte, status, n) VALUES (?, ?, ?, ?)", analyte_rows)
+            con.executemany("INSERT INTO tat_daily(day, analyte, sketch) VALUES (?, ?, ?)", tat_rows)
+            con.commit()
+
+    # --------- Lesen
+    def sample_status_totals(self, start_day: str, end_day: str) -> Dict[str, int]:
+        q = """
+        SELECT status, SUM(n) FROM sample_daily
+        WHERE day >= ? AND day < ?
+        GROUP BY status
+        """
+        with closing(self._connect()) as con:
+            return {r[0]: int(r[1]) for r in con.execute(q, (start_day, end_day))}
+
+    def sample_status_by_weekday(self, start_day: str, end_day: str, statuses: Iterable[str]) -> Dict[str, int]:
+        """Summe je Wochentag ('0' = Sonntag … '6' = Samstag, wie STRFTIME('%w'))."""
+        statuses = list(statuses)
+        if not statuses:
+            return {}
+        q = f"""
+        SELECT STRFTIME('%w', day) AS wd, SUM(n) FROM sample_daily
+        WHERE day >= ? AND day < ?
+          AND status IN ({",".join("?" for _ in statuses)})
+        GROUP BY wd
+        """
+        with closing(self._connect()) as con:
+            return {r[0]: int(r[1]) for r in con.execute(q, [start_day, end_day] + statuses)}
+
+    def analyte_lines(
+        self,
+        analytes: List[str],
+        start_day: str,
+        end_day: str,
+        statuses: Optional[Iterable[str]] = None,
+    ) -> Dict[str, int]:
+        if not analytes:
+            return {}
+        params: List[str] = [start_day, end_day] + list(analytes)
+        q = f"""
+        SELECT analyte, SUM(n) FROM analyte_daily
+        WHERE day >= ? AND day < ?
+          AND analyte IN ({",".join("?" for _ in analytes)})
+        """
+        if statuses is not None:
+            statuses = list(statuses)
+            if not statuses:
+                return {}
+            q += f" AND status IN ({','.join('?' for _ in statuses)})"
+            params += statuses
+        q += " GROUP BY analyte"
+        with closing(self._connect()) as con:
+            return {r[0]: int(r[1]) for r in con.execute(q, params)}
+
+    def tat_sketches(self, start_day: str, end_day: str,
+                     analytes: Optional[List[str]] = None) -> Iterator[Tuple[str, str]]:
+        """Streamt (Analyt, Sketch-JSON) je Tag im Bereich – der Aufrufer merged."""
+        q = "SELECT analyte, sketch FROM tat_daily WHERE day >= ? AND day < ?"
+        params: List[str] = [start_day, end_day]
+        if analytes:
+            q += f" AND analyte IN ({','.join('?' for _ in analytes)})"
+            params += list(analytes)
+        with closing(self._connect()) as con:
+            cur = con.execute(q, params)
+            for r in cur:
+                yield r[0], r[1]
@@ -14,3 +14,10 @@ class SampleLine:
     analyte_name: Optional[str]
     result_value: Optional[str]
     result_ts: Optional[str]
+
+@dataclass(frozen=True)
+class AnalyteInfo:
+    code: str
+    name: Optional[str]        # aus config/analytes.txt
+    first_seen: Optional[str]  # erster/letzter Order-Zeitpunkt in der DB
+    last_seen: Optional[str]
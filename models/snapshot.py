@@ -0,0 +1,211 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+BACKUP_PAGES = 4096         # Seiten je Backup-Schritt
+BACKUP_PAUSE = 0.02         # s Pause nach jedem Schritt: Schreiber der Quelle kommen dazwischen
+BACKUP_SLEEP = 0.05         # s Wartezeit, wenn die Quelle gesperrt ist (Python-Standard: 0.25)
+MAX_RESTARTS = 3            # Neustarts durch Schreiber der Quelle, danach Abbruch
+MIN_INTERVAL = 600          # s zwischen zwei Kopien (auch nach Abbruch), egal wie oft die Quelle sich ändert
+
+
+class SnapshotAborted(RuntimeError):
+    """Kopie abgebrochen, weil Schreibzugriffe auf die Quelle sie immer wieder neu starten."""
+
+
+class SnapshotMirror:
+    """
+    Lokale Kopie (Snapshot) der geteilten SLIM-Datenbank.
+
+    - Kopie per SQLite Online-Backup-API (konsistent, auch während geschrieben wird).
+    - Neu erstellt wird nur, wenn sich mtime/Größe der Quelle (inkl. -wal) ändern, und
+      höchstens alle min_interval Sekunden – SLIM schreibt laufend, ohne Grenze würde
+      bei jeder Prüfung die ganze DB über das Netz kopiert.
+    - Startet ein Schreiber die Kopie öfter als MAX_RESTARTS-mal neu, wird sie abgebrochen
+      (SnapshotAborted) und erst nach min_interval erneut versucht.
+    - Jeder Snapshot bekommt einen eigenen Dateinamen; alte Dateien werden erst
+      entfernt, wenn keine Verbindung mehr darauf zeigt (Windows sperrt offene Dateien).
+    """
+    META_FILE = "snapshot.json"
+
+    def __init__(self, source_path: str, local_dir: str, min_interval: float = MIN_INTERVAL):
+        self.source_path = source_path
+        self.local_dir = local_dir
+        self.min_interval = max(0.0, float(min_interval))
+        self._lock = threading.Lock()
+        self._busy = False
+        self._meta = self._load_meta()
+        # Ende des letzten Kopierversuchs (erfolgreich oder abgebrochen)
+        self._last_attempt: Optional[float] = self.created_at
+        self.last_error: Optional[str] = None
+
+    # --------- Status
+    @property
+    def current_path(self) -> Optional[str]:
+        """Pfad des aktuellen Snapshots (falls vorhanden und zur Quelle passend)."""
+        path = self._meta.get("path")
+        if not path or self._meta.get("source") != os.path.abspath(self.source_path):
+            return None
+        return path if os.path.exists(path) else None
+
+    @property
+    def created_at(self) -> Optional[float]:
+        return self._meta.get("created") if self.current_path else None
+
+    def age_seconds(self) -> Optional[float]:
+        created = self.created_at
+        return None if created is None else max(0.0, time.time() - created)
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    def _source_signature(self) -> Optional[Tuple[int, int, int, int]]:
+        try:
+            st = os.stat(self.source_path)
+        except OSError:
+            return None
+        try:
+            wal = os.stat(self.source_path + "-wal")
+            wal_sig = (wal.st_mtime_ns, wal.st_size)
+        except OSError:
+            wal_sig = (0, 0)
+        return st.st_mtime_ns, st.st_size, wal_sig[0], wal_sig[1]
+
+    def is_stale(self) -> bool:
+        sig = self._source_signature()
+        if sig is None:
+            return False
+        return self.current_path is None or list(sig) != self._meta.get("signature")
+
+    def due(self) -> bool:
+        """True, wenn seit dem letzten Kopierversuch min_interval vergangen ist (ohne Dateizugriff)."""
+        return self.seconds_until_due() <= 0
+
+    def seconds_until_due(self) -> float:
+        last = self._last_attempt
+        return 0.0 if last is None else max(0.0, self.min_interval - (time.time() - last))
+
+    def needs_refresh(self) -> bool:
+        return self.due() and self.is_stale()
+
+    # --------- Aktualisierung
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Erstellt einen neuen Snapshot, falls die Quelle sich geändert hat.
+        True = neuer Snapshot erstellt.
+        """
+        with self._lock:
+            if self._busy:
+                return False
+            self._busy = True
+        try:
+            if not force and not self.needs_refresh():
+                return False
+            sig = self._source_signature()
+            if sig is None:
+                return False
+
+            os.makedirs(self.local_dir, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            target = os.path.join(self.local_dir, f"snapshot-{stamp}-{os.getpid()}.db3")
+            tmp = target + ".part"
+
+            try:
+                self._backup(tmp)
+            except Exception as ex:
+                self._last_attempt = time.time()
+                self.last_error = str(ex)
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+            os.replace(tmp, target)
+
+            self._meta = {
+                "source": os.path.abspath(self.source_path),
+                "signature": list(sig),
+                "path": target,
+                "created": time.time(),
+            }
+            self._save_meta()
+            self._last_attempt = self._meta["created"]
+            self.last_error = None
+            return True
+        finally:
+            self._busy = False
+
+    def _backup(self, target: str) -> None:
+        restarts = 0
+        last_remaining = None
+
+        def progress(status, remaining, total):
+            # Nach einem Neustart (Quelle wurde geschrieben) steigt „remaining“ wieder an
+            nonlocal restarts, last_remaining
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                if restarts > MAX_RESTARTS:
+                    raise SnapshotAborted(
+                        f"Snapshot abgebrochen: Quelle wurde während der Kopie {restarts}-mal geändert")
+            last_remaining = remaining
+            if remaining:
+                time.sleep(BACKUP_PAUSE)
+
+        src_uri = Path(self.source_path).resolve().as_uri() + "?mode=ro"
+        with closing(sqlite3.connect(src_uri, uri=True)) as src, closing(sqlite3.connect(target)) as dst:
+            # In Portionen kopieren, damit Schreiber der Quelle nicht lange blockiert werden
+            src.backup(dst, pages=BACKUP_PAGES, progress=progress, sleep=BACKUP_SLEEP)
+
+    def refresh_async(self, on_done: Optional[Callable[[bool, Optional[Exception]], None]] = None) -> None:
+        """
+        Wie refresh(), aber im Hintergrund-Thread (auch die mtime/Größe-Prüfung, die auf
+        Netzlaufwerken dauern kann); on_done(created, error) danach.
+        """
+        if self._busy or not self.due():
+            return
+
+        def run():
+            created, error = False, None
+            try:
+                created = self.refresh()
+            except Exception as ex:
+                error = ex
+            if on_done is not None:
+                on_done(created, error)
+
+        threading.Thread(target=run, name="snapshot-refresh", daemon=True).start()
+
+    def cleanup(self) -> None:
+        """Entfernt ältere Snapshot-Dateien (Best effort; gesperrte Dateien bleiben liegen)."""
+        keep = self.current_path
+        for path in glob.glob(os.path.join(self.local_dir, "snapshot-*.db3*")):
+            if keep and os.path.abspath(path) == os.path.abspath(keep):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # --------- Meta
+    def _meta_path(self) -> str:
+        return os.path.join(self.local_dir, self.META_FILE)
+
+    def _load_meta(self) -> dict:
+        try:
+            with open(self._meta_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save_meta(self) -> None:
+        tmp = self._meta_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._meta, f)
+        os.replace(tmp, self._meta_path())
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Standard-Zuordnung (entspricht config/mapping.json); fehlende Einträge im Mapping fallen hierauf zurück
+DEFAULT_MAPPING: Dict = {
+    "tables": {"header": "Befund", "lines": "BefTag"},
+    "keys": {"sample_id": "ProbenNr"},
+    "header_fields": {
+        "order_timestamp": ["AbnahmeDatum", "TimeStamp", "TransDatum"],
+        "report_timestamp": ["BefDatum"],
+        "last_name": "Name",
+        "first_name": "Vname",
+        "birth_date": "GebDat",
+        "patient_id": "PatID",
+        "order_no": "AuftragsNr",
+        "sender_info": "EinsenderInfo",
+        "sender_id": "EinsenderKennung",
+    },
+    "line_fields": {
+        "analyte_code": "TestKB",
+        "analyte_name": "LDTName",
+        "result_value": "Ergebnis",
+        "result_timestamp": "ErgbDatum",
+    },
+}
+
+# Platzhalterlisten für IN (...) werden auf diese Größen aufgerundet (danach Vielfache von 256),
+# damit wenige, immer gleiche SQL-Strings im Statement-Cache von sqlite3 landen.
+_IN_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def load_mapping(path: Optional[str]) -> Dict:
+    """Liest mapping.json; fehlt die Datei oder ist sie defekt, gilt DEFAULT_MAPPING."""
+    if not path or not os.path.exists(path):
+        return DEFAULT_MAPPING
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as ex:
+        print("mapping.json konnte nicht gelesen werden:", ex)
+        return DEFAULT_MAPPING
+
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _bucket(n: int) -> int:
+    for size in _IN_BUCKETS:
+        if n <= size:
+            return size
+    return -(-n // 256) * 256
+
+
+class SqlCompiler:
+    """
+    Übersetzt SQL-Vorlagen mit Bezeichner-Platzhaltern in konkretes SQL für ein Mapping.
+
+    Platzhalter (Alias b = Kopf-, t = Zeilentabelle):
+      {H} {L}               Tabellen (Kopf/Zeilen)
+      {sid}                 Proben-Nr.
+      {TS}                  Order-/Abnahmezeit mit Fallbacks auf b, {TS_BARE} ohne Alias (Index-DDL)
+      {code} {name} {result} {result_ts}      Zeilenfelder
+      {report_ts} {last_name} {first_name} {birth_date} {patient_id} {order_no} {sender_info} {sender_id}
+      {h_name} {l_name} {ts_hash}             Bausteine für Indexnamen
+      {IN}                  Platzhalterliste (nur über with_in())
+    Fragmente (z. B. Status-CASE) sind selbst Vorlagen und werden vorab eingesetzt.
+    Ergebnisse werden je (Vorlage, Zusatz-Slots) gecacht; ein Compiler existiert einmal je Mapping-Hash.
+    """
+    def __init__(self, mapping: Dict):
+        self.mapping = mapping
+        self.mapping_hash = hashlib.sha1(json.dumps(mapping, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        self._cache: Dict[Tuple, str] = {}
+        self._lock = threading.Lock()
+        self.tokens = self._tokens(mapping)
+        self.fragments: Dict[str, str] = {}
+
+    @staticmethod
+    def _tokens(mapping: Dict) -> Dict[str, str]:
+        def section(key: str) -> Dict:
+            merged = dict(DEFAULT_MAPPING.get(key, {}))
+            merged.update(mapping.get(key) or {})
+            return merged
+
+        tables, keys = section("tables"), section("keys")
+        header, lines = section("header_fields"), section("line_fields")
+
+        def first(value) -> str:
+            return value[0] if isinstance(value, (list, tuple)) else value
+
+        order = header["order_timestamp"]
+        order = list(order) if isinstance(order, (list, tuple)) else [order]
+        ts_bare = (f"COALESCE({', '.join(_quote(c) for c in order)})" if len(order) > 1 else _quote(order[0]))
+        ts = (f"COALESCE({', '.join('b.' + _quote(c) for c in order)})" if len(order) > 1 else "b." + _quote(order[0]))
+        return {
+            "h_name": str(tables["header"]).lower(),
+            "l_name": str(tables["lines"]).lower(),
+            "ts_hash": hashlib.sha1(ts_bare.encode("utf-8")).hexdigest()[:6],
+            "H": _quote(tables["header"]),
+            "L": _quote(tables["lines"]),
+            "sid": _quote(keys["sample_id"]),
+            "TS": ts,
+            "TS_BARE": ts_bare,
+            "report_ts": _quote(first(header["report_timestamp"])),
+            "last_name": _quote(header["last_name"]),
+            "first_name": _quote(header["first_name"]),
+            "birth_date": _quote(header["birth_date"]),
+            "patient_id": _quote(header["patient_id"]),
+            "order_no": _quote(header["order_no"]),
+            "sender_info": _quote(header["sender_info"]),
+            "sender_id": _quote(header["sender_id"]),
+            "code": _quote(lines["analyte_code"]),
+            "name": _quote(lines["analyte_name"]),
+            "result": _quote(lines["result_value"]),
+            "result_ts": _quote(lines["result_timestamp"]),
+        }
+
+    def register(self, **fragments: str) -> "SqlCompiler":
+        """Fragmente (Vorlagen) registrieren, die in anderen Vorlagen als {NAME} nutzbar sind."""
+        with self._lock:
+            for name, template in fragments.items():
+                self.fragments[name] = self._format(template, {})
+            self._cache.clear()
+        return self
+
+    def _format(self, template: str, slots: Dict) -> str:
+        return template.format(**self.tokens, **self.fragments, **slots)
+
+    def __call__(self, template: str, **slots) -> str:
+        key = (template, tuple(sorted(slots.items())))
+        sql = self._cache.get(key)
+        if sql is None:
+            sql = self._format(template, slots)
+            with self._lock:
+                self._cache[key] = sql
+        return sql
+
+    def with_in(self, template: str, values: Sequence, **slots) -> Tuple[str, List]:
+        """
+        SQL mit {IN} auf eine Bucket-Größe aufgerundet + aufgefüllte Werteliste
+        (letzter Wert wiederholt – ändert weder IN noch NOT IN).
+        """
+        values = list(values)
+        size = _bucket(max(1, len(values)))
+        padded = values + [values[-1] if values else None] * (size - len(values))
+        return self(template, IN=",".join("?" * size), **slots), padded
+
+
+_COMPILERS: Dict[str, SqlCompiler] = {}
+_COMPILERS_LOCK = threading.Lock()
+
+
+def compiler_for(mapping: Optional[Dict] = None) -> SqlCompiler:
+    """Ein (gecachter) Compiler je Mapping-Hash."""
+    mapping = mapping or DEFAULT_MAPPING
+    key = hashlib.sha1(json.dumps(mapping, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    with _COMPILERS_LOCK:
+        comp = _COMPILERS.get(key)
+        if comp is None:
+            comp = _COMPILERS[key] = SqlCompiler(mapping)
+        return comp
@@ -0,0 +1,206 @@
+"""
+Kommandozeile ohne GUI (geplante Tasks, Server ohne Display):
+
+    python -m slimstatistik report counts --from 2025-01-01 --to 2025-01-31 --analytes ANA,ADNS --out counts.csv
+    python -m slimstatistik export monthly
+    python -m slimstatistik export rows --from 2025-01-01 --to 2025-03-31 --analytes ANA --out rows.parquet
+
+Importiert weder PyQt6 noch openpyxl (letzteres nur für --format xlsx), pyarrow nur für Parquet.
+"""
+import time
+
+_T0 = time.perf_counter()
+
+import argparse
+import datetime as dt
+import os
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+COUNTS_HEADER = ["Kategorie", "Wert", "Hinweis", "Details"]
+FORMATS = ("csv", "xlsx", "json")
+
+
+def _timing(enabled: bool, label: str) -> None:
+    if enabled:
+        print(f"[{(time.perf_counter() - _T0) * 1000:8.1f} ms] {label}", file=sys.stderr)
+
+
+def _parse_day(text: str) -> dt.date:
+    try:
+        return dt.date.fromisoformat(text)
+    except ValueError:
+        try:
+            return dt.datetime.strptime(text, "%d.%m.%Y").date()
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Ungültiges Datum: {text} (erwartet JJJJ-MM-TT oder TT.MM.JJJJ)")
+
+
+def _controller(args):
+    """MainController wie in app.py, optional mit abweichender settings.ini / DB."""
+    from controller.main_controller import MainController
+    from util.paths import resource_path
+
+    settings_path = args.settings or os.path.join(os.getcwd(), "config", "settings.ini")
+    # Ohne Hintergrund-Threads: der Prozess endet gleich nach der Antwort
+    ctrl = MainController(settings_path, resource_path("config/mapping.json"), background=False)
+    if args.db:
+        ctrl.set_database_path(args.db)
+    if not ctrl.paths.get("database_path"):
+        raise SystemExit("Kein Datenbankpfad konfiguriert (settings.ini [paths] database_path oder --db).")
+    return ctrl
+
+
+# ---------------------- Ausgabe
+def _output_format(fmt: Optional[str], out: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    ext = os.path.splitext(out or "")[1].lower().lstrip(".")
+    return ext if ext in FORMATS else "csv"
+
+
+def write_rows(header: Sequence[str], rows: Sequence[Sequence], fmt: str, out: Optional[str],
+               meta: Optional[Dict] = None) -> None:
+    """Tabelle als CSV (; + BOM wie die übrigen Exporte), JSON oder XLSX schreiben; ohne out -> stdout."""
+    if fmt == "json":
+        import json
+        doc = dict(meta or {})
+        doc["rows"] = [dict(zip(header, r)) for r in rows]
+        text = json.dumps(doc, ensure_ascii=False, indent=2)
+        if out:
+            with open(out, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        return
+
+    if fmt == "xlsx":
+        if not out:
+            raise SystemExit("--format xlsx benötigt --out")
+        from logic.excel_export import SheetSpec, write_workbook   # openpyxl erst hier
+        write_workbook(out, [SheetSpec("Report", header, rows)])
+        return
+
+    import csv
+    if out:
+        with open(out, "w", encoding="utf-8-sig", newline="") as f:
+            w = csv.writer(f, delimiter=";")
+            w.writerow(header)
+            w.writerows(rows)
+    else:
+        w = csv.writer(sys.stdout, delimiter=";", lineterminator="\n")
+        w.writerow(header)
+        w.writerows(rows)
+
+
+# ---------------------- Befehle
+def cmd_report_counts(args) -> int:
+    ctrl = _controller(args)
+    _timing(args.timing, "Controller bereit")
+
+    start = dt.datetime.combine(args.date_from, dt.time(0, 0, 0))
+    end = dt.datetime.combine(args.date_to, dt.time(23, 59, 59))
+    if args.analytes is None:
+        analytes = ctrl.list_included_analytes()
+    else:
+        analytes = [a.strip() for a in args.analytes.split(",") if a.strip()]
+
+    rows: List[Tuple[str, str, str, str]] = ctrl.build_counts_rows_multi(start, end, analytes, args.only_open)
+    _timing(args.timing, f"Ergebnis berechnet ({len(rows)} Zeilen)")
+
+    # Werte wieder als Zahlen ausgeben (die GUI-Zeilen sind Strings)
+    from logic.excel_export import as_number
+    typed_rows = [[label.strip()] + [as_number(v) for v in rest] for label, *rest in rows]
+    fmt = _output_format(args.format, args.out)
+    meta = {"report": "counts", "from": args.date_from.isoformat(), "to": args.date_to.isoformat(),
+            "analytes": analytes, "only_open_weekdays": args.only_open}
+    write_rows(COUNTS_HEADER, typed_rows, fmt, args.out, meta)
+    _timing(args.timing, f"geschrieben ({fmt})")
+    if args.timing:
+        print(f"Qt geladen: {'ja' if 'PyQt6' in sys.modules else 'nein'}, "
+              f"openpyxl geladen: {'ja' if 'openpyxl' in sys.modules else 'nein'}", file=sys.stderr)
+    return 0
+
+
+def cmd_export_monthly(args) -> int:
+    ctrl = _controller(args)
+    _timing(args.timing, "Controller bereit")
+    months = ctrl.monthly_export_if_first()
+    _timing(args.timing, "Monats-Export abgeschlossen")
+    if months:
+        print(f"Monats-Export {', '.join(months)} -> {ctrl.paths.get('monthly_file', '')}", file=sys.stderr)
+    else:
+        print("Monats-Export: nichts zu tun", file=sys.stderr)
+    return 0
+
+
+def cmd_export_rows(args) -> int:
+    ctrl = _controller(args)
+    _timing(args.timing, "Controller bereit")
+
+    start = dt.datetime.combine(args.date_from, dt.time(0, 0, 0))
+    end = dt.datetime.combine(args.date_to, dt.time(23, 59, 59))
+    analytes = None if args.analytes is None else [a.strip() for a in args.analytes.split(",") if a.strip()]
+    fmt = args.format or ("parquet" if args.out.lower().endswith(".parquet") else "csv")
+    try:
+        stats = ctrl.export_rows(args.out, start, end, analytes=analytes, status=args.status, fmt=fmt,
+                                 with_suspected=args.with_suspected, part_rows=args.part_rows)
+    except RuntimeError as ex:
+        raise SystemExit(str(ex))
+    _timing(args.timing, f"geschrieben ({fmt})")
+    # Durchsatz immer melden (stderr), die Dateien danach
+    print(f"Zeilen-Export: {stats.summary()}", file=sys.stderr)
+    for f in stats.files:
+        print(f"  -> {f}", file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="slimstatistik", description="SlimStatistik ohne GUI")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--settings", help="Pfad zur settings.ini (Standard: ./config/settings.ini)")
+    common.add_argument("--db", help="Datenbankpfad (überschreibt settings.ini, wird nicht gespeichert)")
+    common.add_argument("--timing", action="store_true", help="Laufzeiten seit Prozessstart auf stderr ausgeben")
+
+    sub = p.add_subparsers(dest="command", required=True)
+
+    report = sub.add_parser("report", help="Auswertungen ausgeben")
+    report_sub = report.add_subparsers(dest="report", required=True)
+    counts = report_sub.add_parser("counts", parents=[common], help="Zählungen (wie Tab „Zählungen“)")
+    counts.add_argument("--from", dest="date_from", type=_parse_day, required=True)
+    counts.add_argument("--to", dest="date_to", type=_parse_day, required=True)
+    counts.add_argument("--analytes", help="Kommagetrennte TestKB-Codes (Standard: alle nicht ausgeschlossenen)")
+    counts.add_argument("--only-open", action="store_true", help="Wochentage nur für offene Befunde")
+    counts.add_argument("--format", choices=FORMATS, help="Standard: aus der Dateiendung von --out, sonst csv")
+    counts.add_argument("--out", help="Zieldatei (Standard: stdout)")
+    counts.set_defaults(func=cmd_report_counts)
+
+    export = sub.add_parser("export", help="Exporte auslösen")
+    export_sub = export.add_subparsers(dest="export", required=True)
+    monthly = export_sub.add_parser("monthly", parents=[common], help="Monats-Export (wie beim GUI-Start)")
+    monthly.set_defaults(func=cmd_export_monthly)
+    rows = export_sub.add_parser("rows", parents=[common],
+                                 help="Befund ⋈ BefTag gefiltert als CSV/Parquet streamen (statt die DB zu kopieren)")
+    rows.add_argument("--from", dest="date_from", type=_parse_day, required=True)
+    rows.add_argument("--to", dest="date_to", type=_parse_day, required=True)
+    rows.add_argument("--analytes", help="Kommagetrennte TestKB-Codes (Standard: alle)")
+    rows.add_argument("--status", choices=("all", "open", "done"), default="all",
+                      help="Anforderungszeilen: alle, offen (ohne Ergebnis) oder mit Ergebnis")
+    rows.add_argument("--with-suspected", action="store_true", help="„Nicht entnommen?“-Proben nicht ausschließen")
+    rows.add_argument("--format", choices=("csv", "parquet"), help="Standard: aus der Dateiendung von --out, sonst csv")
+    rows.add_argument("--part-rows", type=int, default=0,
+                      help="CSV in Teildateien zu je N Zeilen aufteilen (name_001.csv, …; Standard: eine Datei)")
+    rows.add_argument("--out", required=True, help="Zieldatei")
+    rows.set_defaults(func=cmd_export_rows)
+    return p
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if getattr(args, "date_from", None) and args.date_from > args.date_to:
+        raise SystemExit("--from liegt nach --to")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QSize, QSortFilterProxyModel, Qt, QTimer
+from PyQt6.QtWidgets import (
+    QAbstractItemView, QHBoxLayout, QLabel, QLineEdit, QListView, QSizePolicy, QStyle, QVBoxLayout, QWidget
+)
+
+EXCLUDED_ROLE = Qt.ItemDataRole.UserRole + 1
+NAME_ROLE = Qt.ItemDataRole.UserRole + 2
+
+
+def analyte_tooltip(info) -> str:
+    lines = [f"{info.code} – {info.name}" if info.name else info.code]
+    if info.first_seen:
+        lines.append(f"Vorkommen: {info.first_seen[:10]} bis {(info.last_seen or '')[:10]}")
+    return "\n".join(lines)
+
+
+class AnalyteListModel(QAbstractListModel):
+    """
+    Gemeinsames Modell aller Analyten-Auswahlen: Codes aus dem Katalog + Katalog-Infos
+    + Ausschluss-Flag (Einstellungen). Häkchen und Suchtext hält jede Auswahl selbst (Proxy).
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._codes: List[str] = []
+        self._info: Dict = {}
+        self._excluded: Set[str] = set()
+        self.all_excluded = False
+
+    def set_catalog(self, codes: List[str], info: Dict, excluded: Iterable[str]) -> None:
+        self.beginResetModel()
+        self._codes = list(codes)
+        self._info = dict(info)
+        self._set_excluded(excluded)
+        self.endResetModel()
+
+    def set_excluded(self, excluded: Iterable[str]) -> None:
+        self._set_excluded(excluded)
+        if self._codes:
+            self.dataChanged.emit(self.index(0), self.index(len(self._codes) - 1), [EXCLUDED_ROLE])
+
+    def _set_excluded(self, excluded: Iterable[str]) -> None:
+        self._excluded = set(excluded)
+        # Alles ausgeschlossen -> Auswahl-Listen zeigen trotzdem alle (wie bisher)
+        self.all_excluded = bool(self._codes) and all(c in self._excluded for c in self._codes)
+
+    def codes(self) -> List[str]:
+        return self._codes
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._codes)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        code = self._codes[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return code
+        if role == Qt.ItemDataRole.ToolTipRole:
+            info = self._info.get(code)
+            return analyte_tooltip(info) if info is not None else code
+        if role == NAME_ROLE:
+            info = self._info.get(code)
+            return (info.name or "") if info is not None else ""
+        if role == EXCLUDED_ROLE:
+            return code in self._excluded
+        return None
+
+
+class AnalyteCheckProxy(QSortFilterProxyModel):
+    """
+    Sicht einer Auswahl auf das gemeinsame Modell: eigene Häkchen (Set von Codes, übersteht
+    Neuladen des Modells), Suche über Code und Anzeigename, optional ohne ausgeschlossene Analyten.
+    """
+    def __init__(self, source: AnalyteListModel, hide_excluded: bool, parent=None):
+        super().__init__(parent)
+        self.hide_excluded = hide_excluded
+        self._checked: Set[str] = set()
+        self._needle = ""
+        self.setSourceModel(source)
+        if hide_excluded:
+            source.dataChanged.connect(self._on_source_changed)
+
+    def _on_source_changed(self, _tl, _br, roles=()):
+        if EXCLUDED_ROLE in roles:
+            self.invalidateFilter()
+
+    def set_search(self, text: str) -> None:
+        self._needle = text.strip().lower()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        src: AnalyteListModel = self.sourceModel()
+        idx = src.index(source_row, 0, source_parent)
+        if self.hide_excluded and not src.all_excluded and src.data(idx, EXCLUDED_ROLE):
+            return False
+        if not self._needle:
+            return True
+        return (self._needle in src.data(idx).lower()
+                or self._needle in src.data(idx, NAME_ROLE).lower())
+
+    def flags(self, index: QModelIndex):
+        # Umschalten per Klick übernimmt AnalytePicker (ganze Zelle statt nur Kästchen)
+        return Qt.ItemFlag.ItemIsEnabled if index.isValid() else Qt.ItemFlag.NoItemFlags
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.CheckStateRole and index.isValid():
+            return Qt.CheckState.Checked if super().data(index) in self._checked else Qt.CheckState.Unchecked
+        return super().data(index, role)
+
+    # --------- Häkchen
+    def _changed_all(self) -> None:
+        n = self.rowCount()
+        if n:
+            self.dataChanged.emit(self.index(0, 0), self.index(n - 1, 0), [Qt.ItemDataRole.CheckStateRole])
+
+    def toggle(self, index: QModelIndex) -> None:
+        code = super().data(index)
+        if code is None:
+            return
+        if code in self._checked:
+            self._checked.discard(code)
+        else:
+            self._checked.add(code)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+
+    def visible_codes(self) -> List[str]:
+        return [super(AnalyteCheckProxy, self).data(self.index(r, 0)) for r in range(self.rowCount())]
+
+    def checked_codes(self, visible_only: bool = False) -> List[str]:
+        if visible_only:
+            return [c for c in self.visible_codes() if c in self._checked]
+        known = set(self.sourceModel().codes())
+        return sorted(c for c in self._checked if c in known)
+
+    def checked_count(self) -> int:
+        return len(self._checked)
+
+    def set_checked(self, codes: Iterable[str]) -> None:
+        self._checked = set(codes)
+        self._changed_all()
+
+    def set_visible_checked(self, checked: bool) -> None:
+        codes = self.visible_codes()
+        if checked:
+            self._checked.update(codes)
+        else:
+            self._checked.difference_update(codes)
+        self._changed_all()
+
+    def toggle_visible(self) -> None:
+        """Wie „Alle auswählen“ bisher: ist ein sichtbarer Analyt ohne Häkchen -> alle an, sonst alle aus."""
+        self.set_visible_checked(any(c not in self._checked for c in self.visible_codes()))
+
+
+class AnalytePicker(QWidget):
+    """
+    Suchfeld + virtualisierte Analyten-Liste (QListView im Umbruch-Modus, einheitliche
+    Zellgrößen -> nur sichtbare Zellen werden gezeichnet). Mehrere Picker teilen ein Modell.
+    """
+    def __init__(self, model: AnalyteListModel, *, hide_excluded: bool = True, cols: int = 8,
+                 rows: int = 6, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.proxy = AnalyteCheckProxy(model, hide_excluded, self)
+        self._cols = max(1, cols)
+
+        self.search = QLineEdit()
+        self.search.setPlaceholderText("Analyt suchen …")
+        self.search.setObjectName("analyteSearch")
+        self.lbl_count = QLabel("")
+
+        self.view = QListView()
+        self.view.setObjectName("analyteList")
+        self.view.setModel(self.proxy)
+        self.view.setViewMode(QListView.ViewMode.ListMode)
+        self.view.setFlow(QListView.Flow.LeftToRight)
+        self.view.setWrapping(True)
+        self.view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.view.setUniformItemSizes(True)
+        self.view.setSpacing(0)
+        self.view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.view.clicked.connect(self.proxy.toggle)
+
+        row_h = self.view.fontMetrics().height() + 4
+        self._row_h = row_h
+        self.view.setFixedHeight(rows * row_h + 2 * self.view.frameWidth() + 4)
+
+        top = QHBoxLayout()
+        top.setContentsMargins(0, 0, 0, 0)
+        top.addWidget(self.search, 1)
+        top.addWidget(self.lbl_count)
+        v = QVBoxLayout(self)
+        v.setContentsMargins(0, 0, 0, 0)
+        v.setSpacing(4)
+        v.addLayout(top)
+        v.addWidget(self.view)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+
+        # Suche entprellt: Filter erst nach kurzer Tipp-Pause neu anwenden
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(120)
+        self._search_timer.timeout.connect(lambda: self.proxy.set_search(self.search.text()))
+        self.search.textChanged.connect(lambda _t: self._search_timer.start())
+
+        for sig in (self.proxy.modelReset, self.proxy.rowsInserted, self.proxy.rowsRemoved,
+                    self.proxy.layoutChanged, self.proxy.dataChanged):
+            sig.connect(self._update_count)
+        self._update_count()
+
+    def _update_count(self, *args) -> None:
+        self.lbl_count.setText(f"{self.proxy.checked_count()} ausgewählt · {self.proxy.rowCount()} sichtbar")
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # Platz für die Scrollbar freihalten, sonst bricht die letzte Spalte um
+        extent = self.view.style().pixelMetric(QStyle.PixelMetric.PM_ScrollBarExtent)
+        width = self.view.viewport().width() - max(extent, self.view.verticalScrollBar().sizeHint().width()) - 4
+        self.view.setGridSize(QSize(max(40, width // self._cols), self._row_h))
+
+    # --------- Durchreichen
+    def _flush_search(self) -> None:
+        if self._search_timer.isActive():
+            self._search_timer.stop()
+            self.proxy.set_search(self.search.text())
+
+    def checked_codes(self, visible_only: bool = False) -> List[str]:
+        self._flush_search()
+        return self.proxy.checked_codes(visible_only)
+
+    def set_checked(self, codes: Iterable[str]) -> None:
+        self.proxy.set_checked(codes)
+
+    def set_visible_checked(self, checked: bool) -> None:
+        self._flush_search()
+        self.proxy.set_visible_checked(checked)
+
+    def toggle_visible(self) -> None:
+        self._flush_search()
+        self.proxy.toggle_visible()
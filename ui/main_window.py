@@ -2,21 +2,29 @@ from PyQt6 import QtWidgets, QtCore
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
     QGroupBox, QDateEdit, QTableWidget, QTableWidgetItem, QMessageBox,
-    QCheckBox, QTabWidget, QScrollArea, QGridLayout, QFileDialog,
-    QSizePolicy, QLineEdit, QHeaderView, QTableView, QAbstractItemView,
-    QSpinBox, QFormLayout
+    QCheckBox, QTabWidget, QFileDialog,
+    QLineEdit, QHeaderView, QAbstractItemView,
+    QSpinBox, QFormLayout, QProgressBar, QComboBox
 )
-from PyQt6.QtCore import QDate, QTimer, QEvent, Qt
-from PyQt6.QtGui import QStandardItemModel, QStandardItem
-import datetime, os, math
+from PyQt6.QtCore import QDate, QTimer, Qt
+from PyQt6.QtGui import QColor
+import datetime, os, logging, time
 
 from controller.main_controller import MainController   # LOGIC
+from logic.timeseries import GRANULARITIES
+from ui.analyte_picker import AnalyteListModel, AnalytePicker
+from ui.table_model import ColumnarTableModel, make_table_view, pair_columns
+from ui.workers import TaskRunner
 from util.paths import resource_path
 
+# Start-Zeitmessung (Debug-Log, siehe app.py: SLIMSTATISTIK_DEBUG=1)
+log = logging.getLogger("slimstatistik.startup")
+
 
 class MainWindow(QMainWindow):
     def __init__(self, controller: MainController):
         super().__init__()
+        self._t0 = time.perf_counter()
         self.ctrl = controller
         self.setWindowTitle("LabStats – Befund-Statistik")
         self.resize(1250, 800)
@@ -24,18 +32,161 @@ class MainWindow(QMainWindow):
 
         self._cols = 8  # Analyten-Gitter-Spalten
 
-        tabs = QTabWidget()
-        tabs.addTab(self._build_tab_counts(), "Zählungen")
-        tabs.addTab(self._build_tab_open(), "Offene Anforderungen")
-        tabs.addTab(self._build_tab_suspected(), "Nicht entnommen?")
-        tabs.addTab(self._build_tab_singlets(), "Singlets")
-        tabs.addTab(self._build_tab_settings(), "Einstellungen")
-        self.setCentralWidget(tabs)
+        # Analyten: ein gemeinsames Modell für alle Auswahlen, nach dem Anzeigen im Hintergrund
+        # geladen (_analytes_all None = noch nicht da)
+        self.analyte_model = AnalyteListModel(self)
+        self._analytes_all = None
+
+        # Hintergrund-Ausführung: ein Kanal je Tab, Busy-Anzeige je Kanal
+        self.runner = TaskRunner(self)
+        self._busy_indicators = {}
+        self.runner.busy_changed.connect(self._on_busy_changed)
+
+        # Tabs erst beim ersten Aktivieren aufbauen; bis dahin leerer Platzhalter
+        self._tab_builders = [
+            (self._build_tab_counts, "Zählungen"),
+            (self._build_tab_heatmap, "Wochentag × Stunde"),
+            (self._build_tab_trends, "Trends"),
+            (self._build_tab_tat, "Durchlaufzeiten"),
+            (self._build_tab_open, "Offene Anforderungen"),
+            (self._build_tab_suspected, "Nicht entnommen?"),
+            (self._build_tab_singlets, "Singlets"),
+            (self._build_tab_settings, "Einstellungen"),
+        ]
+        self._tabs_built = set()
+        self.tabs = QTabWidget()
+        for _, title in self._tab_builders:
+            holder = QWidget()
+            QVBoxLayout(holder).setContentsMargins(0, 0, 0, 0)
+            self.tabs.addTab(holder, title)
+        self.tabs.currentChanged.connect(self.ensure_tab)
+        self.setCentralWidget(self.tabs)
+        self.ensure_tab(0)
+
+        # Statuszeile: Alter des lokalen Snapshots; Timer prüft die Quelle periodisch
+        self.lbl_snapshot = QLabel("")
+        self.statusBar().addPermanentWidget(self.lbl_snapshot)
+        self._snapshot_timer = QTimer(self)
+        self._snapshot_timer.setInterval(15_000)
+        self._snapshot_timer.timeout.connect(self._tick_snapshot)
+        self._snapshot_timer.start()
+        QTimer.singleShot(0, self._tick_snapshot)
+
+        # Alles mit DB-Zugriff erst nach dem ersten Anzeigen (siehe showEvent)
+        self._startup_done = False
+        self._mark("Fenster aufgebaut")
+
+    def _mark(self, label: str):
+        log.debug("%8.1f ms  %s", (time.perf_counter() - self._t0) * 1000, label)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._startup_done:
+            self._startup_done = True
+            QTimer.singleShot(0, self._after_first_show)
+
+    def _after_first_show(self):
+        self._mark("Fenster angezeigt")
+        self._load_analytes()
+        self.runner.submit(
+            "monthly", self.ctrl.monthly_export_if_first,
+            on_error=lambda msg: print("Monthly export failed:", msg),
+        )
 
+    # ---------- Tabs (lazy)
+    def ensure_tab(self, index: int):
+        if index < 0 or index in self._tabs_built or index >= len(self._tab_builders):
+            return
+        self._tabs_built.add(index)
+        builder, title = self._tab_builders[index]
+        t = time.perf_counter()
+        self.tabs.widget(index).layout().addWidget(builder())
+        self._mark(f"Tab „{title}“ aufgebaut ({(time.perf_counter() - t) * 1000:.1f} ms)")
+
+    # ---------- Analyten-Listen (asynchron)
+    def _load_analytes(self, force: bool = False):
+        self._run_in_background(
+            "analytes", self.ctrl.analyte_lists, force=force,
+            on_result=self._on_analytes_loaded, error_title="Analyten konnten nicht geladen werden",
+        )
+
+    def _on_analytes_loaded(self, lists):
+        all_codes, included, info = lists
+        first_load = self._analytes_all is None
+        self._analytes_all = all_codes
+        self.analyte_model.set_catalog(all_codes, info, set(all_codes) - set(included))
+        if hasattr(self, "pick_filter") and first_load:
+            self.pick_filter.set_checked(self.ctrl.get_excluded_analytes())
+        self._mark(f"Analyten geladen ({len(all_codes)})")
+
+    def _tick_snapshot(self):
         try:
-            self.ctrl.monthly_export_if_first()
+            self.ctrl.refresh_snapshot_async()
         except Exception as ex:
-            print("Monthly export failed:", ex)
+            print("Snapshot refresh failed:", ex)
+        self.lbl_snapshot.setText(self.ctrl.snapshot_status())
+        # Audit-Excel nachziehen, falls sie beim Löschen gesperrt war
+        self.ctrl.refresh_audit_excel_async()
+        if hasattr(self, "lbl_cache"):
+            self.lbl_cache.setText(self.ctrl.cache_status())
+
+    # ---------- Hintergrund-Jobs
+    def _make_busy_indicator(self, channel: str) -> QProgressBar:
+        bar = QProgressBar()
+        bar.setRange(0, 0)  # unbestimmt („läuft …“)
+        bar.setFixedWidth(120)
+        bar.setTextVisible(False)
+        bar.setVisible(False)
+        self._busy_indicators.setdefault(channel, []).append(bar)
+        return bar
+
+    def _on_busy_changed(self, channel: str, busy: bool):
+        for bar in self._busy_indicators.get(channel, []):
+            if busy:
+                bar.setRange(0, 0)
+            bar.setVisible(busy)
+
+    def _show_progress(self, channel: str, done: int, total: int):
+        """Busy-Anzeige des Kanals von „läuft …“ auf Fortschritt umstellen."""
+        for bar in self._busy_indicators.get(channel, []):
+            bar.setRange(0, max(1, total))
+            bar.setValue(done)
+
+    def _run_in_background(self, channel: str, fn, *args, on_result=None, error_title: str = "Fehler",
+                           on_progress=None, **kwargs):
+        self.runner.submit(
+            channel, fn, *args,
+            on_result=on_result,
+            on_error=lambda msg: QMessageBox.critical(self, error_title, msg),
+            on_progress=on_progress,
+            **kwargs,
+        )
+
+    def _excel_button(self, handler) -> QPushButton:
+        btn = QPushButton("Als Excel speichern …")
+        btn.setEnabled(False)   # erst, wenn es ein Ergebnis gibt
+        btn.clicked.connect(handler)
+        return btn
+
+    def _save_excel(self, tab: str, default_name: str, make_sheets):
+        """
+        make_sheets() läuft mit im Hintergrund-Job: Zeilen-Generatoren lesen dort aus der DB.
+        Kanal je Reiter ("export:<tab>"): ein Export in einem Reiter verdrängt nicht den eines anderen.
+        """
+        default = os.path.join(self.ctrl.paths.get("export_dir", "export"), default_name)
+        path, _ = QFileDialog.getSaveFileName(self, "Als Excel speichern", default, "Excel (*.xlsx)")
+        if not path:
+            return
+        self._run_in_background(
+            f"export:{tab}", lambda: self.ctrl.export_xlsx(path, make_sheets()),
+            on_result=lambda p: QMessageBox.information(self, "Gespeichert", f"Excel gespeichert:\n{p}"),
+            error_title="Export fehlgeschlagen",
+        )
+
+    def closeEvent(self, event):
+        self._snapshot_timer.stop()
+        self.runner.wait(5000)
+        super().closeEvent(event)
 
     # ---------- Styling/Helpers
     def _apply_style(self):
@@ -46,120 +197,8 @@ class MainWindow(QMainWindow):
         except Exception:
             pass
 
-    def _make_checkbox_grid(self, analytes, cols: int, *, show_all: bool = False, cap_ratio: float = 0.25):
-        """
-        show_all=True  -> ScrollArea passt sich der gesamten Inhaltshöhe an (keine Scrollbar, nichts abgeschnitten).
-        show_all=False -> Höhe wird auf cap_ratio * Fensterhöhe begrenzt (Scrollbars möglich).
-        """
-        search_line = QLineEdit()
-        search_line.setPlaceholderText("Analyt suchen …")
-        search_line.setObjectName("analyteSearch")
-
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(False)
-        scroll.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
-
-        inner = QWidget()
-        grid = QGridLayout(inner)
-        grid.setContentsMargins(0, 0, 0, 0)
-        grid.setHorizontalSpacing(0)
-        grid.setVerticalSpacing(0)
-
-        chk_list = []
-        for i, a in enumerate(analytes):
-            cb = QCheckBox(a)
-            cb.setObjectName("analyteCheck")
-            cb.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Fixed)
-            r, c = divmod(i, cols)
-            grid.addWidget(cb, r, c)
-            chk_list.append(cb)
-        inner.setLayout(grid)
-        scroll.setWidget(inner)
-
-        # Scrollbar-Policy je nach Modus
-        scroll.setVerticalScrollBarPolicy(
-            Qt.ScrollBarPolicy.ScrollBarAlwaysOff if show_all else Qt.ScrollBarPolicy.ScrollBarAsNeeded
-        )
-
-        wrapper = QWidget()
-        wrapper.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
-        v = QVBoxLayout(wrapper)
-        v.setContentsMargins(0, 0, 0, 0)
-        v.setSpacing(4)
-        v.addWidget(search_line)
-        v.addWidget(scroll)
-
-        # Flags für Layout-Anpassung merken
-        wrapper._scroll = scroll
-        wrapper._search = search_line
-        wrapper._checks = chk_list
-        wrapper._cols = cols
-        wrapper._show_all = show_all
-        wrapper._cap_ratio = cap_ratio
-
-        def _filter(t: str):
-            t = t.strip().lower()
-            for cb in chk_list:
-                cb.setVisible((t in cb.text().lower()) if t else True)
-            self._fit_checkbox_wrapper(wrapper)
-
-        search_line.textChanged.connect(_filter)
-        wrapper.installEventFilter(self)
-        QTimer.singleShot(0, lambda: self._fit_checkbox_wrapper(wrapper))
-        return wrapper, scroll, chk_list
-
-    def eventFilter(self, obj: QtCore.QObject, ev: QtCore.QEvent) -> bool:
-        if hasattr(obj, "_scroll") and ev.type() in (QEvent.Type.Show, QEvent.Type.ShowToParent, QEvent.Type.Resize):
-            QTimer.singleShot(0, lambda o=obj: self._fit_checkbox_wrapper(o))
-        return super().eventFilter(obj, ev)
-
-    def _fit_checkbox_wrapper(self, wrapper: QWidget):
-        if not hasattr(wrapper, "_scroll"):
-            return
-
-        scroll = wrapper._scroll
-        search = wrapper._search
-        checks = list(getattr(wrapper, "_checks", []) or [])
-        cols = int(getattr(wrapper, "_cols", 8))
-        show_all = bool(getattr(wrapper, "_show_all", False))
-        cap_ratio = float(getattr(wrapper, "_cap_ratio", 0.25))
-
-        # --- WICHTIG: Leere Checkliste robust behandeln ---
-        if not checks:
-            # Nichts zu layouten: kleine, feste Höhe vergeben, damit der Bereich nicht kollabiert.
-            base = search.sizeHint().height()
-            h = max(48, int(self.height() * (0.05 if show_all else cap_ratio)))
-            scroll.setFixedHeight(h)
-            wrapper.setFixedHeight(base + 4 + h)
-            return
-
-        # Wenn der Filter alle ausblendet, nutze die volle Liste als Referenz für die Höhe.
-        visible = [cb for cb in checks if cb.isVisible()]
-        if not visible:
-            visible = checks
-
-        row_h = max(18, visible[0].sizeHint().height())
-
-        # Layout-/Abstandswerte exakt berücksichtigen
-        inner = scroll.widget()
-        grid = inner.layout()
-        m = grid.contentsMargins()
-        vsp = max(0, grid.verticalSpacing())
-        rows = (len(visible) + cols - 1) // cols
-
-        grid_h = rows * row_h + max(0, rows - 1) * vsp + m.top() + m.bottom()
-        frame = scroll.frameWidth() * 2
-        fudge = 10
-        desired_h = grid_h + frame + fudge
-
-        if show_all:
-            h = desired_h
-        else:
-            limit = int(self.height() * cap_ratio)
-            h = min(desired_h, max(60, limit))
-
-        scroll.setFixedHeight(h)
-        wrapper.setFixedHeight(search.sizeHint().height() + 4 + h)
+    def _make_picker(self, *, hide_excluded: bool = True, rows: int = 6) -> AnalytePicker:
+        return AnalytePicker(self.analyte_model, hide_excluded=hide_excluded, cols=self._cols, rows=rows)
 
     # ---------- Tab: Zählungen (show_all=True -> nichts abgeschnitten)
     def _build_tab_counts(self) -> QWidget:
@@ -187,54 +226,220 @@ class MainWindow(QMainWindow):
         btn_run = QPushButton("Berechnen")
         btn_run.clicked.connect(self._run_counts)
         tl.addWidget(btn_run)
+        tl.addWidget(self._make_busy_indicator("counts"))
         tl.addStretch(1)
 
         layout.addWidget(top)
 
-        analytes = self.ctrl.list_included_analytes() or self.ctrl.list_all_analytes()
-        self.wrap_counts, self.scroll_counts, self.chk_analytes_counts = self._make_checkbox_grid(
-            analytes, self._cols, show_all=True
-        )
-        layout.addWidget(self.wrap_counts)
+        self.pick_counts = self._make_picker(rows=10)
+        layout.addWidget(self.pick_counts)
 
+        btn_row = QHBoxLayout()
         btn_all = QPushButton("Alle auswählen")
-        def _sel_all():
-            any_unchecked = any(not cb.isChecked() and cb.isVisible() for cb in self.chk_analytes_counts)
-            for cb in self.chk_analytes_counts:
-                if cb.isVisible():
-                    cb.setChecked(any_unchecked)
-        btn_all.clicked.connect(_sel_all)
-        layout.addWidget(btn_all)
-
-        self.model_counts = QStandardItemModel(0, 4, self)
-        self.model_counts.setHorizontalHeaderLabels(["Kategorie", "Wert", "Hinweis", "Details"])
-        self.view_counts = QTableView(); self.view_counts.setModel(self.model_counts)
-        hdr = self.view_counts.horizontalHeader()
-        hdr.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)  # auto nach Inhalt
-        hdr.setStretchLastSection(False)
-        self.view_counts.setAlternatingRowColors(True)
-        self.view_counts.setSortingEnabled(False)
+        btn_all.clicked.connect(self.pick_counts.toggle_visible)
+        btn_row.addWidget(btn_all, 1)
+        self.btn_counts_xlsx = self._excel_button(
+            lambda: self._save_excel("counts", "Zaehlungen.xlsx", lambda rows=self._counts_rows: [self.ctrl.counts_sheet(rows)]))
+        btn_row.addWidget(self.btn_counts_xlsx)
+        btn_row.addWidget(self._make_busy_indicator("export:counts"))
+        layout.addLayout(btn_row)
+        self._counts_rows = []
+
+        self.model_counts = ColumnarTableModel(["Kategorie", "Wert", "Hinweis", "Details"], self)
+        self.view_counts = make_table_view(self.model_counts)  # Spaltenbreite auto nach Inhalt
         layout.addWidget(self.view_counts)
         return w
 
     def _run_counts(self):
         start = datetime.datetime(self.start_date.date().year(), self.start_date.date().month(), self.start_date.date().day())
         end   = datetime.datetime(self.end_date.date().year(),   self.end_date.date().month(),   self.end_date.date().day(), 23,59,59)
-        analytes = [cb.text() for cb in self.chk_analytes_counts if cb.isChecked() and cb.isVisible()]
+        analytes = self.pick_counts.checked_codes(visible_only=True)
+        self._run_in_background(
+            "counts", self.ctrl.build_counts_rows_multi, start, end, analytes, self.status_only_open.isChecked(),
+            on_result=self._show_counts, error_title="Fehler beim Berechnen",
+        )
+
+    def _show_counts(self, rows):
+        self._counts_rows = rows
+        self.model_counts.set_rows(rows)
+        self.btn_counts_xlsx.setEnabled(bool(rows))
+
+    # ---------- Tab: Wochentag × Stunde (Heatmap)
+    def _build_tab_heatmap(self) -> QWidget:
+        w = QWidget(); layout = QVBoxLayout(w)
+        line = QHBoxLayout()
+        self.heat_start = QDateEdit(); self.heat_start.setCalendarPopup(True)
+        self.heat_end = QDateEdit(); self.heat_end.setCalendarPopup(True)
+        today = datetime.date.today(); first = today.replace(day=1)
+        self.heat_start.setDate(QDate(first.year, first.month, first.day))
+        self.heat_end.setDate(QDate(today.year, today.month, today.day))
+        line.addWidget(QLabel("Start:")); line.addWidget(self.heat_start)
+        line.addWidget(QLabel("Ende:")); line.addWidget(self.heat_end)
+
+        self.heat_only_open = QCheckBox("Nur offene")
+        line.addWidget(self.heat_only_open)
+        self.heat_value = QComboBox()
+        self.heat_value.addItem("Anzahl", "counts")
+        self.heat_value.addItem("Ø pro Tag", "avg")
+        self.heat_value.currentIndexChanged.connect(lambda _: self._fill_heatmap())
+        line.addWidget(QLabel("Anzeige:")); line.addWidget(self.heat_value)
+
+        btn = QPushButton("Berechnen"); btn.clicked.connect(self._run_heatmap)
+        line.addWidget(btn); line.addWidget(self._make_busy_indicator("heatmap")); line.addStretch(1)
+        layout.addLayout(line)
+
+        self.tbl_heat = QTableWidget(7, 24)
+        self.tbl_heat.setHorizontalHeaderLabels([f"{h:02d}" for h in range(24)])
+        self.tbl_heat.setVerticalHeaderLabels(["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"])
+        self.tbl_heat.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.tbl_heat.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.tbl_heat.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.tbl_heat)
+
+        self.lbl_heat = QLabel("")
+        layout.addWidget(self.lbl_heat)
+        self._heatmap = None
+        return w
+
+    def _run_heatmap(self):
+        start = datetime.datetime(self.heat_start.date().year(), self.heat_start.date().month(), self.heat_start.date().day())
+        end   = datetime.datetime(self.heat_end.date().year(),   self.heat_end.date().month(),   self.heat_end.date().day(), 23,59,59)
+        self._run_in_background(
+            "heatmap", self.ctrl.weekday_hour_heatmap, start, end, self.heat_only_open.isChecked(),
+            on_result=self._show_heatmap, error_title="Fehler beim Berechnen",
+        )
+
+    def _show_heatmap(self, result):
+        self._heatmap = result
+        self._fill_heatmap()
+
+    def _fill_heatmap(self):
+        if not self._heatmap:
+            return
+        key = self.heat_value.currentData()
+        values = self._heatmap[key]
+        peak = max((v for row in values for v in row), default=0) or 1
+        tbl = self.tbl_heat
+        tbl.setUpdatesEnabled(False)
+        try:
+            for wd in range(7):
+                for hh in range(24):
+                    v = values[wd][hh]
+                    it = QTableWidgetItem(str(v) if key == "counts" else f"{v:.1f}")
+                    it.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                    # weiß -> kräftiges Blau je nach Anteil am Maximum
+                    f = v / peak
+                    it.setBackground(QColor(int(255 - 200 * f), int(255 - 150 * f), 255))
+                    if f > 0.6:
+                        it.setForeground(QColor(255, 255, 255))
+                    tbl.setItem(wd, hh, it)
+        finally:
+            tbl.setUpdatesEnabled(True)
+        occ = self._heatmap["occurrences"]
+        self.lbl_heat.setText("Vorkommen im Zeitraum: " + ", ".join(
+            f"{d} {n}" for d, n in zip(["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"], occ)))
+
+    # ---------- Tab: Trends (Analyt × Zeit-Bucket)
+    def _build_tab_trends(self) -> QWidget:
+        w = QWidget(); layout = QVBoxLayout(w)
+        line = QHBoxLayout()
+        self.trend_start = QDateEdit(); self.trend_start.setCalendarPopup(True)
+        self.trend_end = QDateEdit(); self.trend_end.setCalendarPopup(True)
+        today = datetime.date.today(); first = today.replace(day=1)
+        year_ago = datetime.date(first.year - 1, first.month, 1)
+        self.trend_start.setDate(QDate(year_ago.year, year_ago.month, year_ago.day))
+        self.trend_end.setDate(QDate(today.year, today.month, today.day))
+        line.addWidget(QLabel("Start:")); line.addWidget(self.trend_start)
+        line.addWidget(QLabel("Ende:")); line.addWidget(self.trend_end)
+
+        self.trend_gran = QComboBox()
+        for key, label in GRANULARITIES.items():
+            self.trend_gran.addItem(label, key)
+        self.trend_gran.setCurrentIndex(self.trend_gran.findData("month"))
+        line.addWidget(QLabel("Raster:")); line.addWidget(self.trend_gran)
+
+        btn = QPushButton("Berechnen"); btn.clicked.connect(self._run_trends)
+        line.addWidget(btn); line.addWidget(self._make_busy_indicator("trends"))
+        self.btn_trend_csv = QPushButton("Als CSV speichern …"); self.btn_trend_csv.setEnabled(False)
+        self.btn_trend_csv.clicked.connect(self._export_trends)
+        line.addWidget(self.btn_trend_csv)
+        self.btn_trend_xlsx = self._excel_button(
+            lambda: self._save_excel("trends", "Trends.xlsx", lambda ts=self._trends: [self.ctrl.timeseries_sheet(ts)]))
+        line.addWidget(self.btn_trend_xlsx); line.addWidget(self._make_busy_indicator("export:trends"))
+        line.addStretch(1)
+        layout.addLayout(line)
+
+        self.pick_trends = self._make_picker()
+        layout.addWidget(self.pick_trends)
+
+        self.model_trends = ColumnarTableModel(["Analyt"], self)
+        self.view_trends = make_table_view(self.model_trends)
+        layout.addWidget(self.view_trends)
+        self._trends = None
+        return w
+
+    def _run_trends(self):
+        analytes = self.pick_trends.checked_codes(visible_only=True)
+        if not analytes:
+            QMessageBox.warning(self, "Hinweis", "Bitte mindestens einen Analyt auswählen."); return
+        start = datetime.datetime(self.trend_start.date().year(), self.trend_start.date().month(), self.trend_start.date().day())
+        end   = datetime.datetime(self.trend_end.date().year(),   self.trend_end.date().month(),   self.trend_end.date().day(), 23,59,59)
+        self._run_in_background(
+            "trends", self.ctrl.analyte_timeseries, analytes, start, end, self.trend_gran.currentData(),
+            on_result=self._show_trends, error_title="Fehler beim Berechnen",
+        )
+
+    def _show_trends(self, ts):
+        self._trends = ts
+        # Spalten direkt aus der Matrix; Zellen formatiert erst der View beim Zeichnen
+        header, columns = ts.to_columns()
+        self.model_trends.set_columns(columns, headers=header)
+        self.btn_trend_csv.setEnabled(True)
+        self.btn_trend_xlsx.setEnabled(True)
+
+    def _export_trends(self):
+        if self._trends is None:
+            return
+        default = os.path.join(self.ctrl.paths.get("export_dir", "export"), "Trends.csv")
+        path, _ = QFileDialog.getSaveFileName(self, "Trends speichern", default, "CSV (*.csv)")
+        if not path:
+            return
         try:
-            rows = self.ctrl.build_counts_rows_multi(start, end, analytes, self.status_only_open.isChecked())
+            self.ctrl.export_timeseries_csv(self._trends, path)
         except Exception as ex:
-            QMessageBox.critical(self, "Fehler beim Berechnen", str(ex)); return
-
-        new_model = QStandardItemModel(0, 4, self)
-        new_model.setHorizontalHeaderLabels(["Kategorie", "Wert", "Hinweis", "Details"])
-        for a,b,c,d in rows:
-            items = [QStandardItem(str(x)) for x in (a,b,c,d)]
-            for it in items: it.setEditable(False)
-            new_model.appendRow(items)
-        old = self.view_counts.model(); self.view_counts.setModel(None); self.view_counts.setModel(new_model)
-        if old is not None and old is not new_model: old.deleteLater()
-        self.model_counts = new_model
+            QMessageBox.critical(self, "Fehler", str(ex))
+
+    # ---------- Tab: Durchlaufzeiten (Abnahme -> Ergebnis)
+    def _build_tab_tat(self) -> QWidget:
+        w = QWidget(); layout = QVBoxLayout(w)
+        line = QHBoxLayout()
+        self.tat_start = QDateEdit(); self.tat_start.setCalendarPopup(True)
+        self.tat_end = QDateEdit(); self.tat_end.setCalendarPopup(True)
+        today = datetime.date.today(); first = today.replace(day=1)
+        self.tat_start.setDate(QDate(first.year, first.month, first.day))
+        self.tat_end.setDate(QDate(today.year, today.month, today.day))
+        line.addWidget(QLabel("Start:")); line.addWidget(self.tat_start)
+        line.addWidget(QLabel("Ende:")); line.addWidget(self.tat_end)
+        btn = QPushButton("Berechnen"); btn.clicked.connect(self._run_tat)
+        line.addWidget(btn); line.addWidget(self._make_busy_indicator("tat")); line.addStretch(1)
+        layout.addLayout(line)
+
+        self.model_tat = ColumnarTableModel(["Analyt", "Ergebnisse", "Median (h)", "P90 (h)", "P99 (h)"], self)
+        self.tbl_tat = make_table_view(self.model_tat)
+        self.tbl_tat.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.tbl_tat.verticalHeader().setVisible(False)
+        layout.addWidget(self.tbl_tat)
+        return w
+
+    def _run_tat(self):
+        start = datetime.datetime(self.tat_start.date().year(), self.tat_start.date().month(), self.tat_start.date().day())
+        end   = datetime.datetime(self.tat_end.date().year(),   self.tat_end.date().month(),   self.tat_end.date().day(), 23,59,59)
+        self._run_in_background("tat", self.ctrl.turnaround_stats, start, end,
+                                on_result=self._show_tat, error_title="Fehler beim Berechnen")
+
+    def _show_tat(self, rows):
+        # Zahlen bleiben Zahlen: das Modell formatiert (1 Nachkommastelle) und richtet rechts aus
+        self.model_tat.set_rows(rows)
 
     # ---------- Tab: Offene Anforderungen
     def _build_tab_open(self) -> QWidget:
@@ -246,87 +451,119 @@ class MainWindow(QMainWindow):
         self.since_date.setDate(QDate(first.year, first.month, first.day))
         line.addWidget(self.since_date)
         self.btn_open_count = QPushButton("Zählen"); self.btn_open_count.clicked.connect(self._run_open); line.addWidget(self.btn_open_count)
+        line.addWidget(self._make_busy_indicator("open"))
         btn_reload = QPushButton("Analyten aktualisieren"); btn_reload.clicked.connect(self._reload_analyte_controls); line.addWidget(btn_reload)
         line.addStretch(1); layout.addLayout(line)
 
-        analytes = self.ctrl.list_included_analytes() or self.ctrl.list_all_analytes()
-        self.wrap_open, self.scroll_analytes, self.chk_analytes = self._make_checkbox_grid(analytes, self._cols)
-        layout.addWidget(self.wrap_open)
+        self.pick_open = self._make_picker()
+        layout.addWidget(self.pick_open)
 
         btn_row = QHBoxLayout()
         btn_all = QPushButton("Alle auswählen")
-        def _select_all():
-            any_unchecked = any(not cb.isChecked() and cb.isVisible() for cb in self.chk_analytes)
-            for cb in self.chk_analytes:
-                if cb.isVisible(): cb.setChecked(any_unchecked)
-        btn_all.clicked.connect(_select_all)
-        btn_row.addWidget(btn_all); btn_row.addStretch(1); layout.addLayout(btn_row)
-
-        self.table_open = QTableWidget(0, 4)
-        self.table_open.setHorizontalHeaderLabels(["Analyt (1)", "Offene (1)", "Analyt (2)", "Offene (2)"])
+        btn_all.clicked.connect(self.pick_open.toggle_visible)
+        btn_row.addWidget(btn_all); btn_row.addStretch(1)
+        self.btn_open_xlsx = self._excel_button(
+            lambda: self._save_excel("open", "OffeneAnforderungen.xlsx",
+                                     lambda rows=self._open_rows: [self.ctrl.open_counts_sheet(rows)]))
+        btn_row.addWidget(self.btn_open_xlsx); btn_row.addWidget(self._make_busy_indicator("export:open"))
+        layout.addLayout(btn_row)
+        self._open_rows = []
+
+        self.model_open = ColumnarTableModel(["Analyt (1)", "Offene (1)", "Analyt (2)", "Offene (2)"], self)
+        self.table_open = make_table_view(self.model_open)
         self.table_open.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)  # alle gleich breit
-        self.table_open.setAlternatingRowColors(True); self.table_open.setSortingEnabled(False)
         layout.addWidget(self.table_open)
         return w
 
     def _run_open(self):
-        analytes = [cb.text() for cb in self.chk_analytes if cb.isChecked() and cb.isVisible()]
+        analytes = self.pick_open.checked_codes(visible_only=True)
         if not analytes:
             QMessageBox.warning(self, "Hinweis", "Bitte mindestens einen Analyt auswählen."); return
         since = datetime.datetime(self.since_date.date().year(), self.since_date.date().month(), self.since_date.date().day())
-        rows = self.ctrl.build_open_counts_since(analytes, since)
+        self._run_in_background("open", self.ctrl.build_open_counts_since, analytes, since, on_result=self._show_open)
 
-        self.table_open.setUpdatesEnabled(False)
-        try:
-            n_pairs = math.ceil(len(rows)/2); self.table_open.clearContents(); self.table_open.setRowCount(n_pairs)
-            for i in range(n_pairs):
-                code1, cnt1 = rows[2*i]; self.table_open.setItem(i, 0, QTableWidgetItem(code1)); self.table_open.setItem(i, 1, QTableWidgetItem(str(cnt1)))
-                if 2*i+1 < len(rows):
-                    code2, cnt2 = rows[2*i+1]; self.table_open.setItem(i, 2, QTableWidgetItem(code2)); self.table_open.setItem(i, 3, QTableWidgetItem(str(cnt2)))
-                else:
-                    self.table_open.setItem(i, 2, QTableWidgetItem("")); self.table_open.setItem(i, 3, QTableWidgetItem(""))
-        finally:
-            self.table_open.setUpdatesEnabled(True)
+    def _show_open(self, rows):
+        self._open_rows = rows
+        self.model_open.set_columns(pair_columns(rows))
+        self.btn_open_xlsx.setEnabled(bool(rows))
 
     # ---------- Tab: Nicht entnommen?
     def _build_tab_suspected(self) -> QWidget:
         w = QWidget(); layout = QVBoxLayout(w)
 
+        top = QHBoxLayout()
         btn_refresh = QPushButton("Liste aktualisieren")
         btn_refresh.clicked.connect(self._refresh_suspected)
-        layout.addWidget(btn_refresh)
-
-        self.table_susp = QTableWidget(0, 4)
-        self.table_susp.setHorizontalHeaderLabels(["ProbenNr", "Order-Zeit", "Anzahl Anforderungen", "Analyte"])
-        hdr = self.table_susp.horizontalHeader()
-        hdr.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)  # auto nach Inhalt
-        hdr.setStretchLastSection(False)
-        self.table_susp.setAlternatingRowColors(True)
-        self.table_susp.setSortingEnabled(False)
+        top.addWidget(btn_refresh, 1)
+        top.addWidget(self._make_busy_indicator("suspected"))
+        top.addWidget(self._make_busy_indicator("delete"))
+        layout.addLayout(top)
+        self.lbl_susp = QLabel("")
+        layout.addWidget(self.lbl_susp)
+
+        # Seitenweise: erste Seite sofort, weitere beim Scrollen ans Ende
+        self._susp_next = None
+        self.model_susp = ColumnarTableModel(["ProbenNr", "Order-Zeit", "Anzahl Anforderungen", "Analyte"], self)
+        self.model_susp.more_requested.connect(self._more_suspected)
+        self.table_susp = make_table_view(self.model_susp)  # Spaltenbreite auto nach Inhalt
         self.table_susp.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table_susp.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         layout.addWidget(self.table_susp)
 
+        bottom = QHBoxLayout()
         btn_delete = QPushButton("Ausgewählte Probe(n) löschen (mit Audit)")
         btn_delete.clicked.connect(self._delete_selected_samples)
-        layout.addWidget(btn_delete)
+        bottom.addWidget(btn_delete, 1)
+        btn_susp_xlsx = self._excel_button(lambda: self._save_excel("suspected", "NichtEntnommen.xlsx",
+                                                                    lambda: [self.ctrl.suspected_sheet()]))
+        btn_susp_xlsx.setEnabled(True)   # exportiert das ganze Fenster, nicht nur die geladenen Seiten
+        bottom.addWidget(btn_susp_xlsx)
+        bottom.addWidget(self._make_busy_indicator("export:suspected"))
+        btn_audit = QPushButton("Audit-Excel schreiben")
+        btn_audit.clicked.connect(self._export_audit_excel)
+        btn_audit.setToolTip("Schreibt das Blatt „Deleted Suspects“ neu. Andere Blätter der Datei behalten "
+                             "nur Werte – Formatierung, Tabellen und Spaltenbreiten gehen dort verloren.")
+        bottom.addWidget(btn_audit)
+        bottom.addWidget(self._make_busy_indicator("audit"))
+        layout.addLayout(bottom)
         return w
 
+    def _export_audit_excel(self):
+        def done(path):
+            QMessageBox.information(self, "Audit", f"Audit-Excel geschrieben:\n{path}")
+        self._run_in_background("audit", self.ctrl.export_audit_excel, on_result=done,
+                                error_title="Audit-Excel nicht geschrieben (Datei in Excel geöffnet?)")
+
     def _refresh_suspected(self):
-        try:
-            rows = self.ctrl.suspected_missing_blood_draw()
-        except Exception as ex:
-            QMessageBox.critical(self, "Fehler", str(ex)); return
-        self.table_susp.setUpdatesEnabled(False)
-        try:
-            self.table_susp.clearContents(); self.table_susp.setRowCount(len(rows))
-            for r, row in enumerate(rows):
-                self.table_susp.setItem(r, 0, QTableWidgetItem(str(row.get("ProbenNr",""))))
-                self.table_susp.setItem(r, 1, QTableWidgetItem(str(row.get("OrderTime",""))))
-                self.table_susp.setItem(r, 2, QTableWidgetItem(str(row.get("NumReq",""))))
-                self.table_susp.setItem(r, 3, QTableWidgetItem(str(row.get("Analytes",""))))
-        finally:
-            self.table_susp.setUpdatesEnabled(True)
+        self._run_in_background("suspected", self.ctrl.suspected_missing_page, on_result=self._show_suspected)
+
+    def _more_suspected(self):
+        # Neuladen läuft -> dessen Ergebnis abwarten (gleicher Kanal würde es verwerfen)
+        if self._susp_next is None or self.runner.is_busy("suspected"):
+            return
+        self._run_in_background("suspected", self.ctrl.suspected_missing_page, self._susp_next,
+                                on_result=self._append_suspected)
+
+    def _show_suspected(self, page):
+        columns, self._susp_next = page
+        self.model_susp.set_columns(columns, has_more=self._susp_next is not None)
+        self._update_susp_label()
+        if not self.model_susp.rowCount() and self._susp_next is not None:
+            self._more_suspected()
+
+    def _append_suspected(self, page):
+        columns, self._susp_next = page
+        self.model_susp.append_columns(columns, has_more=self._susp_next is not None)
+        self._update_susp_label()
+        if not columns[0] and self._susp_next is not None:
+            # Seite vollständig herausgefiltert (gerade gelöscht) -> gleich die nächste
+            self._more_suspected()
+
+    def _update_susp_label(self):
+        days = int(self.ctrl.suspected_settings.get("lookback_days") or 0)
+        window = f"letzte {days} Tage" if days > 0 else "gesamter Zeitraum"
+        more = " – weitere beim Scrollen" if self._susp_next is not None else ""
+        self.lbl_susp.setText(f"{self.model_susp.total_rows} Proben geladen ({window}){more}")
 
     def _delete_selected_samples(self):
         sel = self.table_susp.selectionModel().selectedRows()
@@ -336,11 +573,9 @@ class MainWindow(QMainWindow):
 
         proben = []
         for idx in sel:
-            item = self.table_susp.item(idx.row(), 0)
-            if item:
-                p = (item.text() or "").strip()
-                if p:
-                    proben.append(p)
+            p = str(self.model_susp.value(idx.row(), 0) or "").strip()
+            if p:
+                proben.append(p)
 
         if not proben:
             return
@@ -351,12 +586,17 @@ class MainWindow(QMainWindow):
         ) != QMessageBox.StandardButton.Yes:
             return
 
-        try:
-            deleted = self.ctrl.delete_samples_with_audit(proben)
+        if self.runner.is_busy("delete"):
+            QMessageBox.information(self, "Hinweis", "Es läuft bereits eine Löschung.")
+            return
+
+        def done(deleted):
             QMessageBox.information(self, "Gelöscht", f"Gelöschte DB-Zeilen: {deleted}")
             self._refresh_suspected()
-        except Exception as ex:
-            QMessageBox.critical(self, "Fehler", str(ex))
+
+        self._run_in_background("delete", self.ctrl.delete_samples_with_audit, proben, on_result=done,
+                                error_title="Löschen fehlgeschlagen",
+                                on_progress=lambda n, total: self._show_progress("delete", n, total))
 
     # ---------- Tab: Singlets (Top-N, 2 Spaltenpaare, 1er–4er)
     def _build_tab_singlets(self) -> QWidget:
@@ -375,76 +615,98 @@ class MainWindow(QMainWindow):
         self.sing_top = QSpinBox(); self.sing_top.setRange(1, 1000); self.sing_top.setValue(10)
         line.addWidget(self.sing_top)
 
+        line.addSpacing(12)
+        line.addWidget(QLabel("Modus:"))
+        self.sing_mode = QComboBox()
+        self.sing_mode.addItem("Exakte Matrix (1er–4er)", "matrix4")
+        for key, label in self.ctrl.COMBO_MODES.items():
+            self.sing_mode.addItem(label, key)
+        line.addWidget(self.sing_mode)
+
+        line.addSpacing(12)
+        line.addWidget(QLabel("Min. Anzahl:"))
+        self.sing_min_support = QSpinBox(); self.sing_min_support.setRange(1, 1000000); self.sing_min_support.setValue(2)
+        line.addWidget(self.sing_min_support)
+        line.addWidget(QLabel("Max. Größe:"))
+        self.sing_max_len = QSpinBox(); self.sing_max_len.setRange(0, 50); self.sing_max_len.setValue(0)
+        self.sing_max_len.setSpecialValueText("beliebig")
+        line.addWidget(self.sing_max_len)
+
         btn = QPushButton("Analysieren"); btn.clicked.connect(self._run_singlets)
-        line.addWidget(btn); line.addStretch(1)
+        line.addWidget(btn); line.addWidget(self._make_busy_indicator("singlets"))
+        self._combo_sheets = []
+        self.btn_sing_xlsx = self._excel_button(
+            lambda: self._save_excel("singlets", "Kombinationen.xlsx", lambda sheets=self._combo_sheets: sheets))
+        line.addWidget(self.btn_sing_xlsx); line.addWidget(self._make_busy_indicator("export:singlets")); line.addStretch(1)
         layout.addLayout(line)
 
         # Helper: Tabelle mit zwei Spaltenpaaren, flexible Breite
         def make_table():
-            tbl = QTableWidget(0, 4)
-            tbl.setHorizontalHeaderLabels(["Eintrag (1)", "Anzahl (1)", "Eintrag (2)", "Anzahl (2)"])
-            hdr = tbl.horizontalHeader()
-            hdr.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-            hdr.setStretchLastSection(False)
-            tbl.setAlternatingRowColors(True)
-            tbl.setSortingEnabled(False)
-            return tbl
+            model = ColumnarTableModel(["Eintrag (1)", "Anzahl (1)", "Eintrag (2)", "Anzahl (2)"], self)
+            return make_table_view(model)
 
         # Vier Bereiche: 1er, 2er, 3er, 4er
+        self.sing_exact_box = QWidget(); exact = QVBoxLayout(self.sing_exact_box)
+        exact.setContentsMargins(0, 0, 0, 0)
         self.tbl_sing = make_table()
-        layout.addWidget(QLabel("Einzelne offene Analyten (Singlets)"))
-        layout.addWidget(self.tbl_sing)
+        exact.addWidget(QLabel("Einzelne offene Analyten (Singlets)"))
+        exact.addWidget(self.tbl_sing)
 
         self.tbl_pairs = make_table()
-        layout.addWidget(QLabel("Häufige 2er-Kombinationen offener Analyten"))
-        layout.addWidget(self.tbl_pairs)
+        exact.addWidget(QLabel("Häufige 2er-Kombinationen offener Analyten"))
+        exact.addWidget(self.tbl_pairs)
 
         self.tbl_trips = make_table()
-        layout.addWidget(QLabel("Häufige 3er-Kombinationen offener Analyten"))
-        layout.addWidget(self.tbl_trips)
+        exact.addWidget(QLabel("Häufige 3er-Kombinationen offener Analyten"))
+        exact.addWidget(self.tbl_trips)
 
         self.tbl_quads = make_table()
-        layout.addWidget(QLabel("Häufige 4er-Kombinationen offener Analyten"))
-        layout.addWidget(self.tbl_quads)
-
+        exact.addWidget(QLabel("Häufige 4er-Kombinationen offener Analyten"))
+        exact.addWidget(self.tbl_quads)
+        layout.addWidget(self.sing_exact_box)
+
+        # Kombinationen beliebiger Größe (exakt oder als Teilmenge)
+        self.model_itemsets = ColumnarTableModel(["Kombination", "Größe", "Anzahl Proben"], self)
+        self.tbl_itemsets = make_table_view(self.model_itemsets, stretch_first=True)
+        self.tbl_itemsets.verticalHeader().setVisible(False)
+        layout.addWidget(self.tbl_itemsets)
+
+        self.sing_mode.currentIndexChanged.connect(self._on_singlets_mode)
+        self._on_singlets_mode()
         return w
 
+    def _on_singlets_mode(self):
+        mode = self.sing_mode.currentData()
+        self.sing_exact_box.setVisible(mode == "matrix4")
+        self.tbl_itemsets.setVisible(mode != "matrix4")
+        self.sing_min_support.setEnabled(mode != "matrix4")
+        self.sing_max_len.setEnabled(mode == "subset")
+
     def _run_singlets(self):
         since = datetime.datetime(self.sing_since.date().year(), self.sing_since.date().month(), self.sing_since.date().day())
         top_n = int(self.sing_top.value())
-        sing, pairs, trips, quads = self.ctrl.combo_stats_since(since, top=top_n)
-
-        def fill_pairs_table(tbl: QTableWidget, rows):
-            tbl.setUpdatesEnabled(False)
-            try:
-                tbl.clearContents()
-                n_pairs = math.ceil(len(rows) / 2)
-                tbl.setRowCount(n_pairs)
-                for i in range(n_pairs):
-                    # linkes Paar
-                    k1, v1 = rows[2*i]
-                    tbl.setItem(i, 0, QTableWidgetItem(str(k1)))
-                    tbl.setItem(i, 1, QTableWidgetItem(str(v1)))
-                    # rechtes Paar (optional)
-                    if 2*i + 1 < len(rows):
-                        k2, v2 = rows[2*i + 1]
-                        tbl.setItem(i, 2, QTableWidgetItem(str(k2)))
-                        tbl.setItem(i, 3, QTableWidgetItem(str(v2)))
-                    else:
-                        tbl.setItem(i, 2, QTableWidgetItem(""))
-                        tbl.setItem(i, 3, QTableWidgetItem(""))
-
-                # Nach dem Befüllen erneut an Inhalte anpassen
-                hdr = tbl.horizontalHeader()
-                for c in range(4):
-                    hdr.setSectionResizeMode(c, QHeaderView.ResizeMode.ResizeToContents)
-            finally:
-                tbl.setUpdatesEnabled(True)
-
-        fill_pairs_table(self.tbl_sing,  sing)
-        fill_pairs_table(self.tbl_pairs, pairs)
-        fill_pairs_table(self.tbl_trips, trips)
-        fill_pairs_table(self.tbl_quads, quads)
+        mode = self.sing_mode.currentData()
+        if mode == "matrix4":
+            self._run_in_background("singlets", self.ctrl.combo_stats_since, since, top=top_n, on_result=self._show_singlets)
+        else:
+            self._run_in_background("singlets", self.ctrl.combo_itemsets_since, since, mode=mode, top=top_n,
+                                    min_support=int(self.sing_min_support.value()),
+                                    max_len=int(self.sing_max_len.value()) or None,
+                                    on_result=self._show_itemsets)
+
+    def _show_itemsets(self, rows):
+        self.model_itemsets.set_rows(rows)
+        self._combo_sheets = [self.ctrl.itemsets_sheet(rows)]
+        self.btn_sing_xlsx.setEnabled(True)
+
+    def _show_singlets(self, result):
+        sing, pairs, trips, quads = result
+
+        for tbl, rows in ((self.tbl_sing, sing), (self.tbl_pairs, pairs),
+                          (self.tbl_trips, trips), (self.tbl_quads, quads)):
+            tbl.model().set_columns(pair_columns(rows))
+        self._combo_sheets = self.ctrl.combo_sheets(sing, pairs, trips, quads)
+        self.btn_sing_xlsx.setEnabled(True)
 
     # ---------- Settings (kompakter Pfade-Bereich via QFormLayout)
     def _build_tab_settings(self) -> QWidget:
@@ -486,46 +748,77 @@ class MainWindow(QMainWindow):
 
         row_db, self.le_db = mk_path_row(self.ctrl.paths.get("database_path", ""), pick_file=True)
         row_xl, self.le_excel = mk_path_row(self.ctrl.paths.get("excel_file", ""), pick_file=True)
+        row_mo, self.le_monthly = mk_path_row(self.ctrl.paths.get("monthly_file", ""), pick_file=True)
         row_ex, self.le_export = mk_path_row(self.ctrl.paths.get("export_dir", ""), pick_dir=True)
 
         form.addRow("Datenbank:", row_db)
         form.addRow("Excel (Audit):", row_xl)
+        form.addRow("Excel (Monat):", row_mo)
         form.addRow("Export-Ordner:", row_ex)
 
+        # Lokale Kopie der (geteilten) DB für alle Auswertungen; Löschen geht an die Quelle
+        self.chk_mirror = QCheckBox("Lokale Kopie (Snapshot) für Auswertungen verwenden")
+        self.chk_mirror.setChecked(self.ctrl.mirror_enabled())
+        row_mirror, self.le_mirror_dir = mk_path_row(self.ctrl.mirror_settings.get("local_dir", ""), pick_dir=True)
+        form.addRow("", self.chk_mirror)
+        form.addRow("Snapshot-Ordner:", row_mirror)
+
         # ----- Analyten-Filter ----------------------------------------------
         gf = QGroupBox("Analyten-Filter (Häkchen = aus Suche ausschließen)")
         layout.addWidget(gf)
         v = QVBoxLayout(gf)
         v.setContentsMargins(8, 8, 8, 8)
         v.setSpacing(8)
-        self.filter_layout = v
 
         info = QHBoxLayout()
         info.setContentsMargins(0, 0, 0, 0)
         info.setSpacing(8)
-        info.addWidget(QLabel("Liste aus Datenbank (BefTag.TestKB)."))
+        info.addWidget(QLabel("Liste aus dem Analyten-Katalog (BefTag.TestKB, inkrementell; „Neu laden“ liest alles neu)."))
         btn_reload = QPushButton("Neu laden"); btn_reload.clicked.connect(self._reload_filter_list)
         info.addWidget(btn_reload); info.addStretch(1)
         v.addLayout(info)
 
-        analytes = self.ctrl.list_all_analytes()
-        self.wrap_filter, self.scroll_filter, self.chk_filter = self._make_checkbox_grid(analytes, self._cols)
-        v.addWidget(self.wrap_filter)
-
-        excluded = set(self.ctrl.get_excluded_analytes())
-        for cb in self.chk_filter:
-            cb.setChecked(cb.text() in excluded)
+        # Alle Codes (auch ausgeschlossene); Häkchen = ausgeschlossen
+        self.pick_filter = self._make_picker(hide_excluded=False)
+        self.pick_filter.set_checked(self.ctrl.get_excluded_analytes())
+        v.addWidget(self.pick_filter)
 
         btns = QHBoxLayout()
         btns.setContentsMargins(0, 0, 0, 0)
         btns.setSpacing(8)
         btn_all = QPushButton("Alle ausschließen")
         btn_none = QPushButton("Alle einschließen")
-        btn_all.clicked.connect(lambda: [cb.setChecked(True) for cb in self.chk_filter if cb.isVisible()])
-        btn_none.clicked.connect(lambda: [cb.setChecked(False) for cb in self.chk_filter if cb.isVisible()])
+        btn_all.clicked.connect(lambda: self.pick_filter.set_visible_checked(True))
+        btn_none.clicked.connect(lambda: self.pick_filter.set_visible_checked(False))
         btns.addWidget(btn_all); btns.addWidget(btn_none); btns.addStretch(1)
         v.addLayout(btns)
 
+        # ----- Datenbank-Wartung ---------------------------------------------
+        gd = QGroupBox("Datenbank-Wartung")
+        layout.addWidget(gd)
+        hd = QHBoxLayout(gd)
+        hd.setContentsMargins(8, 8, 8, 8)
+        hd.setSpacing(8)
+        hd.addWidget(QLabel("Indizes für Zeitraum-Filter und Analyt-Joins anlegen (schreibt in die DB)."))
+        self.btn_opt = QPushButton("Datenbank optimieren")
+        self.btn_opt.clicked.connect(self._optimize_database)
+        hd.addWidget(self.btn_opt)
+        hd.addWidget(self._make_busy_indicator("optimize")); hd.addStretch(1)
+
+        gc = QGroupBox("Ergebnis-Cache")
+        layout.addWidget(gc)
+        hc = QHBoxLayout(gc)
+        hc.setContentsMargins(8, 8, 8, 8)
+        hc.setSpacing(8)
+        self.lbl_cache = QLabel(self.ctrl.cache_status())
+        hc.addWidget(self.lbl_cache)
+        btn_clear_cache = QPushButton("Cache leeren")
+        def _clear_cache():
+            self.ctrl.clear_cache()
+            self.lbl_cache.setText(self.ctrl.cache_status())
+        btn_clear_cache.clicked.connect(_clear_cache)
+        hc.addWidget(btn_clear_cache); hc.addStretch(1)
+
         # ----- Speichern -----------------------------------------------------
         btn_save = QPushButton("Einstellungen speichern")
         btn_save.clicked.connect(self._save_settings)
@@ -534,43 +827,48 @@ class MainWindow(QMainWindow):
         return w
 
     def _reload_filter_list(self):
-        analytes = self.ctrl.list_all_analytes()
-        self.filter_layout.removeWidget(self.wrap_filter); self.wrap_filter.setParent(None)
-        self.wrap_filter, self.scroll_filter, self.chk_filter = self._make_checkbox_grid(analytes, self._cols)
-        self.filter_layout.insertWidget(1, self.wrap_filter)
-        excluded = set(self.ctrl.get_excluded_analytes())
-        for cb in self.chk_filter:
-            cb.setChecked(cb.text() in excluded)
+        self._load_analytes(force=True)   # Katalog komplett neu aus der DB
 
     def _reload_analyte_controls(self):
-        analytes = self.ctrl.list_included_analytes() or self.ctrl.list_all_analytes()
+        self._load_analytes()
 
-        # Zählungen -> show_all=True
-        parent_counts = self.wrap_counts.parent(); self.wrap_counts.setParent(None)
-        self.wrap_counts, self.scroll_counts, self.chk_analytes_counts = self._make_checkbox_grid(
-            analytes, self._cols, show_all=True
-        )
-        parent_counts.layout().insertWidget(1, self.wrap_counts)
+    def _optimize_database(self):
+        if QMessageBox.question(
+                self, "Datenbank optimieren",
+                "Es werden Indizes in der Datenbank angelegt (einmalig, kann bei großen DBs dauern). Fortfahren?"
+        ) != QMessageBox.StandardButton.Yes:
+            return
+        # Indizes, ANALYZE und Query-Pläne können auf großen DBs Minuten dauern -> Hintergrund
+        self.btn_opt.setEnabled(False)
 
-        # Offene Anforderungen -> begrenzt (Standard)
-        parent_open = self.wrap_open.parent(); self.wrap_open.setParent(None)
-        self.wrap_open, self.scroll_analytes, self.chk_analytes = self._make_checkbox_grid(analytes, self._cols)
-        parent_open.layout().insertWidget(1, self.wrap_open)
+        def done(result):
+            self.btn_opt.setEnabled(True)
+            summary, report = result
+            box = QMessageBox(self)
+            box.setWindowTitle("Datenbank optimiert")
+            box.setText(summary)
+            box.setDetailedText(report)
+            box.exec()
+
+        def failed(msg):
+            self.btn_opt.setEnabled(True)
+            QMessageBox.critical(self, "Fehler", msg)
+
+        self.runner.submit("optimize", self.ctrl.optimize_database, on_result=done, on_error=failed)
 
     def _save_settings(self):
-        self.ctrl.paths["database_path"] = self.le_db.text()
+        self.ctrl.set_database_path(self.le_db.text())
+        self.ctrl.set_mirror(self.chk_mirror.isChecked(), self.le_mirror_dir.text())
         self.ctrl.paths["excel_file"]   = self.le_excel.text()
+        self.ctrl.paths["monthly_file"] = self.le_monthly.text()
         self.ctrl.paths["export_dir"]   = self.le_export.text()
-        excluded = [cb.text() for cb in self.chk_filter if cb.isChecked()]
-        self.ctrl.update_excluded_analytes(excluded)
+        if self._analytes_all is not None:   # sonst ist die Filterliste noch leer -> bisherigen Filter behalten
+            excluded = self.pick_filter.checked_codes()
+            self.ctrl.update_excluded_analytes(excluded)
+            self.analyte_model.set_excluded(excluded)   # Auswahl-Listen der Tabs sofort anpassen
         self.ctrl.save_settings()
+        self._tick_snapshot()
         QtWidgets.QMessageBox.information(
             self, "Gespeichert",
             "Einstellungen gespeichert. Über „Analyten aktualisieren“ die Listen neu laden."
         )
-
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        for wrap in (getattr(self,"wrap_counts",None), getattr(self,"wrap_open",None), getattr(self,"wrap_filter",None)):
-            if wrap is not None:
-                self._fit_checkbox_wrapper(wrap)
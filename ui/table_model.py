@@ -0,0 +1,154 @@
+from typing import List, Optional, Sequence, Tuple
+
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+from PyQt6.QtWidgets import QAbstractItemView, QHeaderView, QTableView
+
+_RIGHT = Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+
+
+class ColumnarTableModel(QAbstractTableModel):
+    """
+    Schreibgeschütztes Tabellenmodell über Spalten-Arrays (eine Liste je Spalte).
+    Zellen werden erst beim Zeichnen formatiert; der View bekommt die Zeilen in
+    Blöcken von `batch` (canFetchMore/fetchMore), große Listen kosten daher weder
+    ein Objekt pro Zelle noch ein Layout über alle Zeilen.
+
+    Seitenweise Quellen: set_columns(..., has_more=True) – ist alles Geladene sichtbar,
+    meldet fetchMore `more_requested`; die nächste Seite kommt per append_columns().
+    """
+    more_requested = pyqtSignal()
+
+    def __init__(self, headers: Sequence[str], parent=None, batch: int = 1000, float_fmt: str = "{:.1f}"):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.batch = max(1, int(batch))
+        self.float_fmt = float_fmt
+        self._columns: List[list] = [[] for _ in self.headers]
+        self._total = 0
+        self._loaded = 0
+        self._has_more = False
+
+    # --------- Befüllen
+    def set_columns(self, columns: Sequence[Sequence], headers: Optional[Sequence[str]] = None,
+                    has_more: bool = False) -> None:
+        self.beginResetModel()
+        if headers is not None:
+            self.headers = list(headers)
+        # Listen werden übernommen (nicht kopiert); append_columns() hängt an sie an
+        self._columns = [c if isinstance(c, list) else list(c) for c in columns] or [[] for _ in self.headers]
+        self._total = min((len(c) for c in self._columns), default=0)
+        self._loaded = min(self._total, self.batch)
+        self._has_more = has_more
+        self.endResetModel()
+
+    def append_columns(self, columns: Sequence[Sequence], has_more: bool = False) -> None:
+        """Nächste Seite anhängen (gleiche Spaltenzahl); neue Zeilen sind sofort sichtbar."""
+        self._has_more = has_more
+        n = min((len(c) for c in columns), default=0)
+        if n == 0:
+            return
+        if self._loaded < self._total:
+            # Vorherige Blöcke noch nicht alle sichtbar: nur anhängen, fetchMore deckt auf
+            self._extend(columns, n)
+            return
+        self.beginInsertRows(QModelIndex(), self._total, self._total + n - 1)
+        self._extend(columns, n)
+        self._loaded = self._total
+        self.endInsertRows()
+
+    def _extend(self, columns: Sequence[Sequence], n: int) -> None:
+        for old, new in zip(self._columns, columns):
+            old.extend(new[:n])
+        self._total += n
+
+    def set_rows(self, rows: Sequence[Sequence]) -> None:
+        """Bequemlichkeit für kurze Zeilenlisten (z. B. Zählungen): einmal transponieren."""
+        self.set_columns([list(c) for c in zip(*rows)] if rows else [[] for _ in self.headers])
+
+    def clear(self) -> None:
+        self.set_columns([[] for _ in self.headers])
+
+    @property
+    def total_rows(self) -> int:
+        return self._total
+
+    @property
+    def has_more(self) -> bool:
+        return self._has_more
+
+    def value(self, row: int, col: int):
+        return self._columns[col][row]
+
+    def column(self, col: int) -> Sequence:
+        return self._columns[col]
+
+    # --------- Qt
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and (self._loaded < self._total or self._has_more)
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        if parent.isValid():
+            return
+        n = min(self.batch, self._total - self._loaded)
+        if n <= 0:
+            if self._has_more:
+                self.more_requested.emit()
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + n - 1)
+        self._loaded += n
+        self.endInsertRows()
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            v = self._columns[index.column()][index.row()]
+            if v is None:
+                return ""
+            if isinstance(v, float):
+                return self.float_fmt.format(v)
+            return str(v)
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            v = self._columns[index.column()][index.row()]
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                return _RIGHT
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return super().headerData(section, orientation, role)
+
+
+def pair_columns(rows: Sequence[Tuple]) -> List[List]:
+    """[(Eintrag, Anzahl), …] als zwei Spaltenpaare nebeneinander (1., 3., … links; 2., 4., … rechts)."""
+    left, right = rows[0::2], rows[1::2]
+    pad = [None] * (len(left) - len(right))
+    return [
+        [k for k, _ in left], [v for _, v in left],
+        [k for k, _ in right] + pad, [v for _, v in right] + pad,
+    ]
+
+
+def make_table_view(model: ColumnarTableModel, *, stretch_first: bool = False) -> QTableView:
+    """QTableView mit den Standard-Einstellungen der Ergebnis-Tabellen."""
+    view = QTableView()
+    view.setModel(model)
+    view.setAlternatingRowColors(True)
+    view.setSortingEnabled(False)
+    view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    view.verticalHeader().setDefaultSectionSize(view.fontMetrics().height() + 6)
+    hdr = view.horizontalHeader()
+    hdr.setStretchLastSection(False)
+    # Spaltenbreite nach Inhalt, aber nur über die ersten Zeilen gemessen (sonst O(n) je Block)
+    hdr.setResizeContentsPrecision(200)
+    hdr.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+    if stretch_first:
+        hdr.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+    return view
@@ -0,0 +1,118 @@
+from typing import Any, Callable, Dict, Optional
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class _JobSignals(QObject):
+    finished = pyqtSignal(str, int, object)   # channel, token, result
+    failed = pyqtSignal(str, int, str)        # channel, token, message
+    progress = pyqtSignal(str, int, object)   # channel, token, (werte, …)
+
+
+class _Job(QRunnable):
+    def __init__(self, channel: str, token: int, fn: Callable, args, kwargs):
+        super().__init__()
+        self.channel = channel
+        self.token = token
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = _JobSignals()
+
+    def report_progress(self, *values):
+        # Aus dem Pool-Thread; die Verbindung zum Runner ist queued -> Auslieferung im GUI-Thread
+        self.signals.progress.emit(self.channel, self.token, values)
+
+    def run(self):
+        # Läuft im Pool-Thread; das Repository öffnet dort seine eigene Lese-Verbindung.
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as ex:
+            self.signals.failed.emit(self.channel, self.token, str(ex) or ex.__class__.__name__)
+        else:
+            self.signals.finished.emit(self.channel, self.token, result)
+
+
+class TaskRunner(QObject):
+    """
+    Führt Controller-Aufrufe im QThreadPool aus und liefert Ergebnisse im GUI-Thread.
+
+    Jeder Kanal (z. B. ein Tab) hat einen Zähler: wird erneut gestartet, bevor der
+    vorige Job fertig ist, wird dessen Ergebnis verworfen (nur der letzte Klick zählt).
+    Verschiedene Kanäle laufen parallel.
+    Mit on_progress bekommt die Funktion ein Keyword `progress(*werte)`; die Werte kommen
+    im GUI-Thread bei on_progress an (nur für den jeweils letzten Job des Kanals).
+    """
+    busy_changed = pyqtSignal(str, bool)  # channel, busy
+
+    def __init__(self, parent: Optional[QObject] = None, max_threads: int = 4):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, max_threads))
+        self._latest: Dict[str, int] = {}
+        self._running: Dict[str, int] = {}
+        self._callbacks: Dict[tuple, tuple] = {}
+        self._jobs: Dict[tuple, _Job] = {}
+
+    def is_busy(self, channel: str) -> bool:
+        return self._running.get(channel, 0) > 0
+
+    def submit(
+        self,
+        channel: str,
+        fn: Callable,
+        *args,
+        on_result: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[..., None]] = None,
+        **kwargs,
+    ) -> int:
+        token = self._latest.get(channel, 0) + 1
+        self._latest[channel] = token
+
+        job = _Job(channel, token, fn, args, kwargs)
+        job.setAutoDelete(False)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        if on_progress is not None:
+            job.kwargs["progress"] = job.report_progress
+            job.signals.progress.connect(self._on_progress)
+        self._callbacks[(channel, token)] = (on_result, on_error, on_progress)
+        self._jobs[(channel, token)] = job
+
+        self._running[channel] = self._running.get(channel, 0) + 1
+        if self._running[channel] == 1:
+            self.busy_changed.emit(channel, True)
+        self.pool.start(job)
+        return token
+
+    def _finish(self, channel: str, token: int):
+        self._jobs.pop((channel, token), None)
+        callbacks = self._callbacks.pop((channel, token), (None, None, None))[:2]
+        self._running[channel] = max(0, self._running.get(channel, 0) - 1)
+        if self._running[channel] == 0:
+            self.busy_changed.emit(channel, False)
+        # Überholte Ergebnisse verwerfen
+        if token != self._latest.get(channel):
+            return None, None
+        return callbacks
+
+    def _on_finished(self, channel: str, token: int, result: object):
+        on_result, _ = self._finish(channel, token)
+        if on_result is not None:
+            on_result(result)
+
+    def _on_progress(self, channel: str, token: int, values: tuple):
+        if token != self._latest.get(channel):
+            return
+        on_progress = self._callbacks.get((channel, token), (None, None, None))[2]
+        if on_progress is not None:
+            on_progress(*values)
+
+    def _on_failed(self, channel: str, token: int, message: str):
+        _, on_error = self._finish(channel, token)
+        if on_error is not None:
+            on_error(message)
+
+    def wait(self, msecs: int = -1) -> bool:
+        return self.pool.waitForDone(msecs)